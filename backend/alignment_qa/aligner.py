@@ -2,9 +2,13 @@ from typing import List, Dict, Any, Tuple
 import re
 import numpy as np
 
-from .config import EMBED_MODEL, ALIGNMENT_MIN_SCORE, USE_GPU
+from .config import (
+    EMBED_MODEL, ALIGNMENT_MIN_SCORE, USE_GPU,
+    EMBED_MODEL_REVISION, EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB, EMBED_SERVICE_URL, EMBED_BACKEND, EMBED_ONNX_DIR, EMBED_ONNX_THREADS,
+)
 
 _model = None
+_client = None
 
 
 def _device() -> str:
@@ -20,8 +24,15 @@ def _device() -> str:
 def _load_model():
     global _model
     if _model is None:
-        from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer(EMBED_MODEL, device=_device())
+        try:
+            from common.embedding_backends import load_backend
+        except ImportError:  # backend/common not mounted into this image
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(EMBED_MODEL, device=_device())
+        else:
+            _model = load_backend(
+                EMBED_MODEL, EMBED_BACKEND, device=_device(), onnx_dir=EMBED_ONNX_DIR, threads=EMBED_ONNX_THREADS
+            )
     return _model
 
 
@@ -31,10 +42,47 @@ def split_sentences(text: str) -> List[str]:
     return [p.strip() for p in parts if p.strip()]
 
 
-def embed_texts(texts: List[str]) -> np.ndarray:
+def _encode_local(texts: List[str], normalize: bool = True) -> np.ndarray:
     model = _load_model()
-    vecs = model.encode(texts, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False)
-    return vecs
+    return model.encode(texts, convert_to_numpy=True, normalize_embeddings=normalize, show_progress_bar=False)
+
+
+def _get_client():
+    global _client
+    try:
+        from common.embedding_client import EmbeddingClient
+    except ImportError:  # backend/common not mounted into this image
+        return None
+    if _client is None:
+        _client = EmbeddingClient(EMBED_SERVICE_URL, EMBED_MODEL, fallback=_encode_local, fallback_backend=EMBED_BACKEND)
+    return _client
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    """Encode through the shared embedding service, falling back to the local model."""
+    client = _get_client()
+    if client is None:
+        return _encode_local(texts)
+    return client.encode(texts, normalize=True)
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    try:
+        from common.embedding_cache import cache_namespace, cached_encode, open_cache
+    except ImportError:  # backend/common not mounted into this image
+        return _encode(texts)
+    cache = open_cache(EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB)
+
+    def namespace(backend: str) -> str:
+        return cache_namespace(EMBED_MODEL, EMBED_MODEL_REVISION, normalize=True, backend=backend)
+
+    client = _get_client()
+    if client is None:
+        return cached_encode(cache, namespace(EMBED_BACKEND), texts, _encode)
+    # Cache under the backend that produced the vectors: the service's or the fallback's
+    return cached_encode(
+        cache, namespace(client.backend), texts, _encode, store_namespace=lambda: namespace(client.last_backend)
+    )
 
 
 def align_answer_to_chunks(answer_text: str, chunks: List[Dict[str, Any]], top_k: int = 3) -> Dict[str, Any]:
@@ -10,3 +10,16 @@ EMBED_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-large-en-v1.5")
 ALIGNMENT_MIN_SCORE = float(os.getenv("ALIGNMENT_MIN_SCORE", "0.8"))
 USE_GPU = os.getenv("USE_GPU", "true").lower() == "true"
 PORT = int(os.getenv("PORT", "8012"))
+
+# Persistent embedding cache shared across services (empty dir disables)
+EMBED_MODEL_REVISION = os.getenv("EMBED_MODEL_REVISION", "main")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "/data/cache/embeddings")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "4096"))
+
+# Shared embedding service (backend/embedding_service); empty = encode in-process
+EMBED_SERVICE_URL = os.getenv("EMBED_SERVICE_URL", "")
+
+# In-process embedding backend: torch | onnx | onnx-int8 (see common/embedding_backends.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "/data/models/onnx")
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 = all cores
@@ -0,0 +1,119 @@
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+# Columnar chunk store: one Arrow IPC file per source under <root>/<run_tag>/<source>.arrow.
+# The IPC file format is memory-mapped on read, so a scan that projects `chunk_id` and
+# `text` touches only those column buffers instead of parsing whole JSON documents.
+
+SUFFIX = ".arrow"
+# List-valued chunk fields are stored as JSON strings to keep the schema flat
+JSON_COLUMNS = ("topic_tags", "entities")
+
+
+def _schema():
+    import pyarrow as pa
+
+    fields = [
+        pa.field("chunk_id", pa.string()),
+        pa.field("source_id", pa.string()),
+        pa.field("source_key", pa.string()),
+        pa.field("start_time", pa.float64()),
+        pa.field("end_time", pa.float64()),
+        pa.field("speaker", pa.string()),
+        pa.field("text", pa.large_string()),
+        pa.field("text_hash", pa.string()),
+        pa.field("validation_confidence", pa.float64()),
+        pa.field("topic_tags", pa.string()),
+        pa.field("entities", pa.string()),
+    ]
+    return pa.schema(fields)
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+def write_chunks(
+    root: Path,
+    run_tag: str,
+    stem: str,
+    chunks: List[Dict[str, Any]],
+) -> Path:
+    """Write one source's chunks as an Arrow IPC file."""
+    import pyarrow as pa
+
+    schema = _schema()
+    columns: Dict[str, Any] = {
+        "chunk_id": [_text(c.get("chunk_id")) for c in chunks],
+        "source_id": [_text(c.get("source_id")) for c in chunks],
+        "source_key": [_text(c.get("source_key")) for c in chunks],
+        "start_time": [c.get("start_time") for c in chunks],
+        "end_time": [c.get("end_time") for c in chunks],
+        "speaker": [_text(c.get("speaker")) for c in chunks],
+        "text": [c.get("text") or "" for c in chunks],
+        "text_hash": [_text(c.get("text_hash")) for c in chunks],
+        "validation_confidence": [c.get("validation_confidence") for c in chunks],
+    }
+    for name in JSON_COLUMNS:
+        columns[name] = [json.dumps(c.get(name, [])) for c in chunks]
+    arrays = [pa.array(columns[f.name], type=f.type) for f in schema]
+    table = pa.Table.from_arrays(arrays, schema=schema)
+
+    out_dir = Path(root) / run_tag
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / f"{stem}{SUFFIX}"
+    tmp = out_path.with_name(f"{out_path.name}.tmp-{os.getpid()}")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, out_path)
+    return out_path
+
+
+def chunk_files(root: Path, run_tag: Optional[str] = None) -> List[Path]:
+    base = Path(root) / run_tag if run_tag else Path(root)
+    if not base.exists():
+        return []
+    return sorted(base.rglob(f"*{SUFFIX}"))
+
+
+def read_table(path: Path, columns: Optional[Sequence[str]] = None):
+    """Memory-map one chunk file and project `columns` (missing columns are skipped)."""
+    import pyarrow as pa
+
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([c for c in columns if c in table.column_names])
+    return table
+
+
+def _decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    for name in JSON_COLUMNS:
+        if isinstance(row.get(name), str):
+            row[name] = json.loads(row[name])
+    return row
+
+
+def read_records(path: Path, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+    """All rows of one chunk file as dicts with only `columns`."""
+    return [_decode(row) for row in read_table(path, columns).to_pylist()]
+
+
+def iter_records(
+    root: Path,
+    columns: Optional[Sequence[str]] = None,
+    run_tag: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield chunk dicts with only `columns`, decoding the JSON-encoded list columns."""
+    for path in chunk_files(root, run_tag):
+        try:
+            table = read_table(path, columns)
+        except Exception:
+            continue
+        for batch in table.to_batches():
+            for row in batch.to_pylist():
+                yield _decode(row)
+
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import unicodedata
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Content-addressed store of normalized segment text shared by validation and chunking.
+# Creators repeat the same intros, disclaimers and sponsor reads across many videos;
+# keying on the normalized text lets those segments be validated once and optionally
+# excluded from (or collapsed in) the index.
+# Validation results are keyed on the exact text plus the validator version instead:
+# entity offsets depend on case and punctuation, and a result computed without spaCy
+# (or by an older validator) must not be reused once the pipeline changes.
+
+_WS = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^\w\s]")
+
+
+def normalize_text(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text or "").lower()
+    t = _PUNCT.sub(" ", t)
+    return _WS.sub(" ", t).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def result_key(text: str, version: str) -> str:
+    """Key for a validation result: the exact text under validator `version`."""
+    return hashlib.sha256(f"{version}\0{text or ''}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class DedupStats:
+    segments: int = 0
+    tokens: int = 0
+
+    def add(self, tokens: int):
+        self.segments += 1
+        self.tokens += int(tokens)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"dedup_segments": self.segments, "dedup_tokens": self.tokens}
+
+
+class SegmentDedupStore:
+    """SQLite-backed map of normalized text hash -> sources seen, plus validation results
+    keyed by `result_key`."""
+
+    def __init__(self, path: str):
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(p), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segment_text ("
+            " text_hash TEXT PRIMARY KEY,"
+            " owner TEXT"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segment_results ("
+            " result_key TEXT PRIMARY KEY,"
+            " tokens INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS segment_sources ("
+            " text_hash TEXT NOT NULL,"
+            " source TEXT NOT NULL,"
+            " PRIMARY KEY (text_hash, source)"
+            ")"
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_result(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM segment_results WHERE result_key = ?", (key,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        try:
+            return json.loads(row[0])
+        except Exception:
+            return None
+
+    def put_result(self, key: str, result: Dict[str, Any], tokens: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO segment_results (result_key, tokens, result) VALUES (?, ?, ?) "
+                "ON CONFLICT(result_key) DO UPDATE SET result = excluded.result, tokens = excluded.tokens",
+                (key, int(tokens), json.dumps(result)),
+            )
+
+    def record_source(self, key: str, source: str) -> str:
+        """Register that `source` contains `key`; returns the source that first claimed it."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO segment_text (text_hash, owner) VALUES (?, ?) "
+                "ON CONFLICT(text_hash) DO UPDATE SET owner = COALESCE(segment_text.owner, excluded.owner)",
+                (key, source),
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO segment_sources (text_hash, source) VALUES (?, ?)",
+                (key, source),
+            )
+            row = self._conn.execute("SELECT owner FROM segment_text WHERE text_hash = ?", (key,)).fetchone()
+        return row[0] if row and row[0] else source
+
+    def source_count(self, key: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM segment_sources WHERE text_hash = ?", (key,)
+            ).fetchone()
+        return int(row[0]) if row else 0
+
+
+_stores: Dict[str, SegmentDedupStore] = {}
+
+
+def open_store(path: Optional[str]) -> Optional[SegmentDedupStore]:
+    """Process-wide store for `path`; returns None when dedup is disabled or unavailable."""
+    if not path:
+        return None
+    if path not in _stores:
+        try:
+            _stores[path] = SegmentDedupStore(path)
+        except Exception:
+            return None
+    return _stores[path]
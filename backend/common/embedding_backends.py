@@ -0,0 +1,218 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Pluggable in-process embedding backends. Every backend exposes the subset of
+# SentenceTransformer.encode the services call, so call sites only change how the
+# model is loaded:
+#   torch      SentenceTransformer on CUDA or CPU (the original behaviour)
+#   onnx       the same transformer exported once to ONNX, run with ONNX Runtime
+#   onnx-int8  the ONNX export with dynamic int8 weight quantization, for CPU nodes
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def backend_tag(backend: Optional[str]) -> str:
+    """Canonical backend name (empty means "torch").
+
+    Unknown names raise ValueError rather than falling back to torch: a typo would
+    otherwise serve torch vectors while caching them under the misspelled name.
+    """
+    key = (backend or "torch").strip().lower()
+    if key not in BACKENDS:
+        raise ValueError(f"unknown embedding backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    return key
+
+
+def pool(hidden: np.ndarray, attention_mask: np.ndarray, mode: str) -> np.ndarray:
+    """Reduce token states (batch, seq, dim) to sentence vectors like ST's Pooling module."""
+    if mode == "cls":
+        return hidden[:, 0]
+    mask = attention_mask[..., None].astype(hidden.dtype)
+    summed = (hidden * mask).sum(axis=1)
+    counts = np.clip(mask.sum(axis=1), 1e-9, None)
+    return summed / counts
+
+
+def l2_normalize(vecs: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.clip(norms, 1e-12, None)
+
+
+class TorchBackend:
+    def __init__(self, model_name: str, device: str = "cpu"):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device=device)
+        self.device = device
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        return self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=normalize_embeddings,
+            show_progress_bar=False,
+        )
+
+
+def _export_dir(root: str, model_name: str) -> Path:
+    return Path(root) / model_name.replace("/", "__")
+
+
+def _pooling_config(st_model) -> Dict[str, Any]:
+    mode = "mean"
+    normalize = False
+    for module in st_model:
+        name = type(module).__name__
+        if name == "Pooling":
+            cfg = module.get_config_dict()
+            if cfg.get("pooling_mode_cls_token"):
+                mode = "cls"
+        elif name == "Normalize":
+            normalize = True
+    return {"pooling": mode, "normalize": normalize, "max_seq_length": int(st_model.max_seq_length or 512)}
+
+
+@contextmanager
+def _export_lock(target: Path):
+    """Exclusive cross-process lock for exporting into `target`."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with open(target.with_name(f"{target.name}.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _exported(target: Path, quantize: bool) -> bool:
+    return (target / "model.onnx").exists() and (not quantize or (target / "model.int8.onnx").exists())
+
+
+def export_onnx(model_name: str, root: str, quantize: bool = True) -> Path:
+    """Export `model_name` to ONNX under `root` once, plus an int8 copy when `quantize`.
+
+    Exports are serialized by a lock file next to the export directory. Each export is
+    written to a temporary directory and renamed into place, so services never load a
+    half-written model.
+    """
+    target = _export_dir(root, model_name)
+    if _exported(target, quantize):
+        return target
+    with _export_lock(target):
+        # Another process may have finished the export while we waited
+        if not _exported(target, quantize):
+            _export(model_name, target, quantize)
+    return target
+
+
+def _export(model_name: str, target: Path, quantize: bool):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["export sample text"], return_tensors="pt", padding=True)
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class _Wrapper(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(input_names, args)), return_dict=True).last_hidden_state
+
+    tmp = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    axes = {n: {0: "batch", 1: "seq"} for n in input_names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Wrapper(auto_model),
+            tuple(sample[n] for n in input_names),
+            str(tmp / "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=17,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(str(tmp / "model.onnx"), str(tmp / "model.int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(str(tmp))
+    meta = {"model": model_name, **_pooling_config(st_model)}
+    (tmp / "backend.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    if target.exists():
+        # An incomplete earlier export (e.g. without the int8 copy): move it aside first,
+        # os.replace only renames a directory onto an absent or empty one
+        old = target.with_name(f"{target.name}.old-{os.getpid()}")
+        shutil.rmtree(old, ignore_errors=True)
+        os.replace(target, old)
+        os.replace(tmp, target)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, target)
+
+
+class OnnxBackend:
+    def __init__(self, model_name: str, root: str, quantized: bool = True, threads: int = 0):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = export_onnx(model_name, root, quantize=quantized)
+        meta = json.loads((path / "backend.json").read_text(encoding="utf-8"))
+        self.pooling = meta.get("pooling", "mean")
+        self.normalize_module = bool(meta.get("normalize"))
+        self.max_length = int(meta.get("max_seq_length") or 512)
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path))
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = threads if threads > 0 else (os.cpu_count() or 1)
+        opts.inter_op_num_threads = 1
+        opts.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(str(path / model_file), opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.device = "cpu"
+
+    def _run(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        return pool(hidden, enc["attention_mask"], self.pooling)
+
+    def encode(self, texts: List[str], batch_size: int = 32, normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Length-sorted batches keep padding (and wasted CPU) to a minimum
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: Optional[np.ndarray] = None
+        for lo in range(0, len(order), batch_size):
+            idx = order[lo:lo + batch_size]
+            vecs = self._run([texts[i] for i in idx])
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=np.float32)
+            out[idx] = vecs
+        if self.normalize_module or normalize_embeddings:
+            out = l2_normalize(out)
+        return out
+
+
+def load_backend(model_name: str, backend: Optional[str] = "torch", device: str = "cpu", onnx_dir: str = "", threads: int = 0):
+    kind = backend_tag(backend)
+    if kind == "torch":
+        return TorchBackend(model_name, device=device)
+    return OnnxBackend(model_name, onnx_dir or "/data/models/onnx", quantized=kind == "onnx-int8", threads=threads)
@@ -0,0 +1,232 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .embedding_backends import backend_tag
+
+# Persistent embedding cache shared by chunking, the retriever and the QA services.
+# Vectors live in one memory-mapped float32 file per dimension; a SQLite index maps
+# (model, revision, normalize, text hash) to a slot in that file and tracks recency so
+# the least recently used slots are recycled once the size budget is reached.
+# Each slot also carries a tag (the first bytes of its key) in a parallel file. Writers
+# clear the tag before overwriting a slot and set it afterwards; readers re-check it
+# after copying the vector, so a slot recycled by another process between the SQLite
+# lookup and the read is a miss rather than a wrong vector.
+
+logger = logging.getLogger(__name__)
+
+_TAG_BYTES = 16
+# Keys per IN (...) clause, below SQLite's default 999 bound-variable limit
+_SQL_BATCH = 900
+
+
+def cache_namespace(model: str, revision: str = "main", normalize: bool = True, backend: str = "torch") -> str:
+    ns = f"{model}@{revision}|norm={int(bool(normalize))}"
+    # ONNX / int8 vectors are close to but not identical with the torch ones
+    tag = backend_tag(backend)
+    if tag != "torch":
+        ns += f"|{tag}"
+    return ns
+
+
+def _key(namespace: str, text: str) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{namespace}|{text_hash}".encode("utf-8")).hexdigest()
+
+
+def _tag(key: str) -> np.ndarray:
+    return np.frombuffer(bytes.fromhex(key[:2 * _TAG_BYTES]), dtype=np.uint8)
+
+
+class EmbeddingCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._arrays: Dict[int, np.memmap] = {}
+        self._tags: Dict[int, np.memmap] = {}
+        self._conn = sqlite3.connect(str(self.root / "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY,"
+            " dim INTEGER NOT NULL,"
+            " slot INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " UNIQUE (dim, slot)"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries (dim, last_used)")
+
+    def capacity(self, dim: int) -> int:
+        return max(1, self.max_bytes // (dim * 4))
+
+    def _array(self, dim: int) -> np.memmap:
+        arr = self._arrays.get(dim)
+        if arr is None:
+            cap = self.capacity(dim)
+            path = self.root / f"vectors-{dim}.f32"
+            size = cap * dim * 4
+            with open(path, "ab") as f:
+                if f.tell() < size:
+                    f.truncate(size)
+            # Slots beyond a shrunken budget are no longer addressable
+            self._conn.execute("DELETE FROM entries WHERE dim = ? AND slot >= ?", (dim, cap))
+            arr = np.memmap(path, dtype=np.float32, mode="r+", shape=(cap, dim))
+            tag_path = self.root / f"tags-{dim}.u8"
+            with open(tag_path, "ab") as f:
+                if f.tell() < cap * _TAG_BYTES:
+                    f.truncate(cap * _TAG_BYTES)
+            self._tags[dim] = np.memmap(tag_path, dtype=np.uint8, mode="r+", shape=(cap, _TAG_BYTES))
+            self._arrays[dim] = arr
+        return arr
+
+    def _read(self, key: str, dim: int, slot: int) -> Optional[np.ndarray]:
+        vec = np.array(self._array(dim)[slot])
+        if not np.array_equal(self._tags[dim][slot], _tag(key)):
+            return None
+        return vec
+
+    def get_many(self, namespace: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        keys = [_key(namespace, t) for t in texts]
+        found: Dict[str, tuple] = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                part = keys[i:i + _SQL_BATCH]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT key, dim, slot FROM entries WHERE key IN ({marks})", part
+                ).fetchall()
+                for key, dim, slot in rows:
+                    found[key] = (dim, slot)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found]
+                )
+            out: List[Optional[np.ndarray]] = []
+            for k in keys:
+                hit = found.get(k)
+                out.append(self._read(k, *hit) if hit else None)
+        return out
+
+    def put_many(self, namespace: str, texts: Sequence[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or not len(texts):
+            return
+        dim = int(vectors.shape[1])
+        cap = self.capacity(dim)
+        pending: Dict[str, np.ndarray] = {}
+        for t, v in zip(texts, vectors):
+            pending[_key(namespace, t)] = v
+        items = list(pending.items())[:cap]
+        with self._lock:
+            arr = self._array(dim)
+            tags = self._tags[dim]
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                present: Dict[str, int] = {}
+                for i in range(0, len(items), _SQL_BATCH):
+                    part = [k for k, _ in items[i:i + _SQL_BATCH]]
+                    marks = ",".join("?" * len(part))
+                    present.update(self._conn.execute(
+                        f"SELECT key, slot FROM entries WHERE key IN ({marks})", part
+                    ).fetchall())
+                used = self._conn.execute("SELECT COUNT(*) FROM entries WHERE dim = ?", (dim,)).fetchone()[0]
+                need = sum(1 for k, _ in items if k not in present)
+                free = list(range(used, min(cap, used + need)))
+                short = need - len(free)
+                if short > 0:
+                    victims = [
+                        (k, s) for k, s in self._conn.execute(
+                            "SELECT key, slot FROM entries WHERE dim = ? ORDER BY last_used LIMIT ?",
+                            (dim, short + len(present)),
+                        ).fetchall() if k not in present
+                    ][:short]
+                    self._conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+                    free.extend(s for _, s in victims)
+                now = time.time()
+                rows = []
+                writes = []
+                for k, v in items:
+                    slot = present.get(k)
+                    if slot is None:
+                        if not free:
+                            break
+                        slot = free.pop()
+                        rows.append((k, dim, slot, now))
+                    writes.append((k, slot, v))
+                # Tags off, vectors in, tags on: a concurrent reader of a recycled slot
+                # sees a tag mismatch for as long as the vector may be half-written
+                for _, slot, _ in writes:
+                    tags[slot] = 0
+                for _, slot, v in writes:
+                    arr[slot] = v
+                for k, slot, _ in writes:
+                    tags[slot] = _tag(k)
+                arr.flush()
+                tags.flush()
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, dim, slot, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+def cached_encode(
+    cache: Optional[EmbeddingCache],
+    namespace: str,
+    texts: Sequence[str],
+    encode: Callable[[List[str]], np.ndarray],
+    store_namespace: Optional[Callable[[], str]] = None,
+) -> np.ndarray:
+    """Encode `texts`, calling `encode` only for texts missing from the cache.
+
+    `store_namespace`, when given, is asked after encoding which namespace the fresh
+    vectors belong to (e.g. the embedding service fell back to a local backend).
+    """
+    texts = list(texts)
+    if cache is None:
+        return np.asarray(encode(texts), dtype=np.float32)
+    try:
+        found = cache.get_many(namespace, texts)
+    except Exception:
+        logger.warning("embedding cache lookup failed; encoding all %d texts", len(texts), exc_info=True)
+        found = [None] * len(texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+    if missing:
+        vecs = np.asarray(encode(missing), dtype=np.float32)
+        try:
+            cache.put_many(store_namespace() if store_namespace else namespace, missing, vecs)
+        except Exception:
+            logger.warning("embedding cache write of %d vectors failed", len(missing), exc_info=True)
+        fresh = dict(zip(missing, vecs))
+        found = [v if v is not None else fresh[t] for t, v in zip(texts, found)]
+    if not found:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(found).astype(np.float32, copy=False)
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+
+
+def open_cache(root: Optional[str], max_mb: int) -> Optional[EmbeddingCache]:
+    """Process-wide cache under `root`; None when caching is disabled or unavailable."""
+    if not root or max_mb <= 0:
+        return None
+    if root not in _caches:
+        try:
+            _caches[root] = EmbeddingCache(root, max_mb * 1024 * 1024)
+        except Exception:
+            return None
+    return _caches[root]
@@ -0,0 +1,94 @@
+import base64
+import json
+import threading
+import time
+import urllib.request
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from .embedding_backends import backend_tag
+
+# Client for backend/embedding_service. When the service is not configured, unreachable
+# or serving a different model, encoding falls back to the caller's in-process model;
+# after a failure the service is skipped for `retry_after` seconds.
+# The service and the fallback may run different backends (torch vs onnx/int8), whose
+# vectors must not share an embedding-cache namespace; `backend` / `last_backend` say
+# which one serves, or served, a call.
+
+
+class EmbeddingClient:
+    def __init__(
+        self,
+        url: Optional[str],
+        model: str,
+        fallback: Callable[[List[str], bool], np.ndarray],
+        timeout: float = 30.0,
+        retry_after: float = 30.0,
+        fallback_backend: str = "torch",
+    ):
+        self.url = (url or "").rstrip("/")
+        self.model = model
+        self.fallback = fallback
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.fallback_backend = backend_tag(fallback_backend)
+        # Unknown until the service reports it (/health on first use, then each /encode),
+        # so no cache lookup is keyed on a guessed backend
+        self.service_backend: Optional[str] = None
+        self._down_until = 0.0
+        self._last = threading.local()
+
+    @property
+    def remote_available(self) -> bool:
+        return bool(self.url) and time.monotonic() >= self._down_until
+
+    @property
+    def backend(self) -> str:
+        """Backend expected to serve the next call."""
+        if self.remote_available and self.service_backend is None:
+            self._probe()
+        return self.service_backend if self.remote_available else self.fallback_backend
+
+    def _probe(self):
+        """Read the service's backend from /health; an unreachable service is marked down."""
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=self.timeout) as resp:  # nosec B310
+                self._set_service_backend(json.loads(resp.read()).get("backend"))
+        except Exception:
+            self._down_until = time.monotonic() + self.retry_after
+
+    def _set_service_backend(self, backend: Optional[str]):
+        # Services that predate the field only ever ran torch
+        self.service_backend = backend_tag(backend)
+
+    @property
+    def last_backend(self) -> str:
+        """Backend that produced this thread's most recent `encode` result."""
+        return getattr(self._last, "backend", self.backend)
+
+    def _remote(self, texts: List[str], normalize: bool) -> np.ndarray:
+        body = json.dumps({"texts": texts, "normalize": normalize, "model": self.model}).encode("utf-8")
+        req = urllib.request.Request(
+            f"{self.url}/encode", data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:  # nosec B310 - internal service URL
+            out = json.loads(resp.read())
+        self._set_service_backend(out.get("backend"))
+        if not out.get("count"):
+            return np.zeros((0, int(out.get("dim") or 0)), dtype=np.float32)
+        raw = base64.b64decode(out["data"])
+        return np.frombuffer(raw, dtype="<f4").reshape(int(out["count"]), int(out["dim"]))
+
+    def encode(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+        texts = list(texts)
+        if self.remote_available:
+            try:
+                vecs = self._remote(texts, normalize)
+                self._last.backend = self.service_backend
+                return vecs
+            except Exception:
+                self._down_until = time.monotonic() + self.retry_after
+        vecs = np.asarray(self.fallback(texts, normalize), dtype=np.float32)
+        self._last.backend = self.fallback_backend
+        return vecs
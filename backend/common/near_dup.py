@@ -0,0 +1,245 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .dedup_store import normalize_text
+
+# MinHash + LSH near-duplicate detection for chunks. Signatures and LSH band buckets
+# are persisted in SQLite, so each new file is checked against everything indexed so
+# far by probing its chunks' buckets instead of rescanning the corpus.
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def shingles(text: str, size: int = 5) -> List[str]:
+    words = normalize_text(text).split()
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+class MinHasher:
+    """Vectorised MinHash over 32-bit shingle hashes with `num_perm` universal hashes."""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self._a = rng.randint(1, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, (1 << 61) - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str, shingle_size: int = 5) -> np.ndarray:
+        grams = shingles(text, shingle_size)
+        if not grams:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hv = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams),
+            dtype=np.uint64,
+            count=len(grams),
+        )
+        # Overflow wraps mod 2^64 before the Mersenne reduction, as in the usual MinHash
+        with np.errstate(over="ignore"):
+            phv = (np.outer(hv, self._a) + self._b) % _MERSENNE & _MAX_HASH
+        return phv.min(axis=0)
+
+
+def jaccard_estimate(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+@dataclass
+class NearDupResult:
+    kept: List[Dict[str, Any]] = field(default_factory=list)
+    # canonical chunk_id -> alias records added while processing this batch
+    aliases: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    # canonical chunk_id -> alias chunk_ids dropped because their source was re-chunked
+    dropped: Dict[str, List[str]] = field(default_factory=dict)
+    duplicates: int = 0
+
+
+class NearDupIndex:
+    """Persistent LSH index mapping chunks to the canonical chunk of their group."""
+
+    def __init__(self, path: str, threshold: float = 0.85, num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        p = Path(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(p), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS signatures ("
+            " chunk_id TEXT PRIMARY KEY,"
+            " canonical TEXT NOT NULL,"
+            " alias TEXT,"
+            " sig BLOB NOT NULL"
+            ")"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            " band INTEGER NOT NULL,"
+            " bucket INTEGER NOT NULL,"
+            " chunk_id TEXT NOT NULL,"
+            " PRIMARY KEY (band, bucket, chunk_id)"
+            ")"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS signatures_canonical ON signatures (canonical)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _buckets(self, sig: np.ndarray) -> List[Tuple[int, int]]:
+        out = []
+        for band in range(self.bands):
+            raw = sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            bucket = int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little", signed=True)
+            out.append((band, bucket))
+        return out
+
+    def _best_match(self, sig: np.ndarray, buckets: Sequence[Tuple[int, int]]) -> Optional[str]:
+        candidates = set()
+        for band, bucket in buckets:
+            for (cid,) in self._conn.execute(
+                "SELECT chunk_id FROM bands WHERE band = ? AND bucket = ?", (band, bucket)
+            ):
+                candidates.add(cid)
+        best, best_sim = None, self.threshold
+        for cid in candidates:
+            row = self._conn.execute("SELECT canonical, sig FROM signatures WHERE chunk_id = ?", (cid,)).fetchone()
+            if not row:
+                continue
+            sim = jaccard_estimate(sig, np.frombuffer(row[1], dtype=np.uint64))
+            if sim >= best_sim:
+                best, best_sim = row[0], sim
+        return best
+
+    def assign(self, chunks: List[Dict[str, Any]]) -> NearDupResult:
+        """Keep canonical chunks and fold near-duplicates into their group's aliases.
+
+        Chunks already known (same deterministic chunk_id) keep their earlier decision,
+        so re-running an unchanged file is stable. Alias rows of the batch's sources whose
+        chunk is no longer in the batch (the source was re-chunked) are dropped and listed
+        in `dropped`, so their canonicals' alias payloads can be rewritten.
+        """
+        result = NearDupResult()
+        batch_ids = {str(c.get("chunk_id")) for c in chunks}
+        source_keys = {c.get("source_key") for c in chunks} - {None}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for key in source_keys:
+                    rows = self._conn.execute(
+                        "SELECT chunk_id, canonical FROM signatures"
+                        " WHERE alias IS NOT NULL AND json_extract(alias, '$.source_key') = ?",
+                        (key,),
+                    ).fetchall()
+                    for cid, canonical in rows:
+                        if cid in batch_ids:
+                            continue
+                        self._conn.execute("DELETE FROM signatures WHERE chunk_id = ?", (cid,))
+                        result.dropped.setdefault(canonical, []).append(cid)
+                for c in chunks:
+                    cid = str(c.get("chunk_id"))
+                    row = self._conn.execute("SELECT canonical FROM signatures WHERE chunk_id = ?", (cid,)).fetchone()
+                    if row is not None:
+                        if row[0] == cid:
+                            result.kept.append(c)
+                        else:
+                            result.duplicates += 1
+                        continue
+                    sig = self.hasher.signature(c.get("text") or "", self.shingle_size)
+                    buckets = self._buckets(sig)
+                    canonical = self._best_match(sig, buckets)
+                    if canonical is None:
+                        self._conn.execute(
+                            "INSERT INTO signatures (chunk_id, canonical, sig) VALUES (?, ?, ?)",
+                            (cid, cid, sig.tobytes()),
+                        )
+                        self._conn.executemany(
+                            "INSERT OR IGNORE INTO bands (band, bucket, chunk_id) VALUES (?, ?, ?)",
+                            [(band, bucket, cid) for band, bucket in buckets],
+                        )
+                        result.kept.append(c)
+                        continue
+                    alias = {
+                        "chunk_id": cid,
+                        "source_id": c.get("source_id"),
+                        "source_key": c.get("source_key"),
+                        "start_time": c.get("start_time"),
+                        "end_time": c.get("end_time"),
+                    }
+                    # Aliases are not added to the bands: probing the canonical is enough
+                    self._conn.execute(
+                        "INSERT INTO signatures (chunk_id, canonical, alias, sig) VALUES (?, ?, ?, ?)",
+                        (cid, canonical, json.dumps(alias), sig.tobytes()),
+                    )
+                    result.aliases.setdefault(canonical, []).append(alias)
+                    result.duplicates += 1
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def aliases_of(self, canonical: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alias FROM signatures WHERE canonical = ? AND chunk_id != canonical", (canonical,)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows if r[0]]
+
+    def forget(self, chunk_ids: Sequence[str]) -> List[Dict[str, Any]]:
+        """Drop deleted chunks and return the alias records that pointed at them.
+
+        Aliases of a dropped canonical are forgotten too: they were never embedded, so
+        the caller must chunk their sources again, where they are indexed afresh (one of
+        them becoming the group's new canonical).
+        """
+        ids = [str(c) for c in chunk_ids]
+        if not ids:
+            return []
+        orphaned: List[Dict[str, Any]] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for cid in ids:
+                    rows = self._conn.execute(
+                        "SELECT alias FROM signatures WHERE canonical = ? AND chunk_id != canonical", (cid,)
+                    ).fetchall()
+                    orphaned.extend(json.loads(r[0]) for r in rows if r[0])
+                    self._conn.execute("DELETE FROM bands WHERE chunk_id = ?", (cid,))
+                    self._conn.execute("DELETE FROM signatures WHERE canonical = ? OR chunk_id = ?", (cid, cid))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return orphaned
+
+
+_indexes: Dict[str, NearDupIndex] = {}
+
+
+def open_index(path: Optional[str], **kwargs) -> Optional[NearDupIndex]:
+    """Process-wide index for `path`; returns None when near-dup detection is disabled."""
+    if not path:
+        return None
+    if path not in _indexes:
+        try:
+            _indexes[path] = NearDupIndex(path, **kwargs)
+        except Exception:
+            return None
+    return _indexes[path]
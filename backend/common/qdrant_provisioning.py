@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Declarative Qdrant collection profiles. Chunking applies the profile when it creates
+# the collection and the retriever reconciles an existing collection to it at startup,
+# so HNSW, quantization and on-disk settings are changed by editing a profile name.
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    name: str
+    hnsw_m: int = 16
+    hnsw_ef_construct: int = 100
+    quantization: Optional[str] = None  # None | "int8" | "binary"
+    quantization_always_ram: bool = True
+    quantization_quantile: float = 0.99
+    # Query-time settings for quantized collections: fetch limit * oversampling candidates
+    # from the quantized vectors, then rescore them with the full-precision originals
+    search_oversampling: float = 1.0
+    search_rescore: bool = True
+    vectors_on_disk: bool = False
+    payload_on_disk: bool = False
+    keyword_indexes: Tuple[str, ...] = ("source_id", "source_key", "speaker", "parent_type", "topic_tags")
+    # Range filters on the chunk's time window (retriever time_from/time_to)
+    float_indexes: Tuple[str, ...] = ("start_time", "end_time")
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    # Matches the collections created before profiles existed, plus payload indexes
+    "default": CollectionProfile("default"),
+    # int8 vectors in RAM, float32 originals and payload on disk: ~4x less RAM per point
+    "compact": CollectionProfile(
+        "compact",
+        hnsw_ef_construct=128,
+        quantization="int8",
+        search_oversampling=2.0,
+        vectors_on_disk=True,
+        payload_on_disk=True,
+    ),
+    # Denser graph for larger corpora where recall at small ef matters more than build time
+    "large": CollectionProfile(
+        "large",
+        hnsw_m=32,
+        hnsw_ef_construct=256,
+        quantization="int8",
+        search_oversampling=2.0,
+        vectors_on_disk=True,
+        payload_on_disk=True,
+    ),
+    # 1 bit per dimension in RAM (1024-dim: 128 B vs 4 KB); needs heavier oversampling
+    "binary": CollectionProfile(
+        "binary",
+        hnsw_ef_construct=128,
+        quantization="binary",
+        search_oversampling=4.0,
+        vectors_on_disk=True,
+        payload_on_disk=True,
+    ),
+}
+
+
+def get_profile(name: Optional[str]) -> CollectionProfile:
+    """Profile called `name` (empty means "default").
+
+    Unknown names raise ValueError rather than falling back: reconciling a live
+    collection to the wrong profile rewrites its quantization and storage.
+    """
+    key = (name or "default").strip().lower()
+    if key not in PROFILES:
+        raise ValueError(f"unknown Qdrant profile {name!r}; expected one of {', '.join(sorted(PROFILES))}")
+    return PROFILES[key]
+
+
+def _quantization_config(profile: CollectionProfile):
+    from qdrant_client import models
+
+    if profile.quantization == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=profile.quantization_quantile,
+                always_ram=profile.quantization_always_ram,
+            )
+        )
+    if profile.quantization == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=profile.quantization_always_ram)
+        )
+    return None
+
+
+def search_params(profile: CollectionProfile, oversampling: Optional[float] = None, rescore: Optional[bool] = None):
+    """Qdrant SearchParams for querying a collection provisioned with `profile`.
+
+    None for unquantized profiles. `oversampling`/`rescore` override the profile.
+    """
+    if profile.quantization is None:
+        return None
+    from qdrant_client import models
+
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(
+            ignore=False,
+            rescore=profile.search_rescore if rescore is None else rescore,
+            oversampling=profile.search_oversampling if oversampling is None else oversampling,
+        )
+    )
+
+
+def _quantization_kind(cfg: Any) -> Optional[str]:
+    if cfg is None:
+        return None
+    if getattr(cfg, "scalar", None) is not None:
+        return "int8"
+    if getattr(cfg, "binary", None) is not None:
+        return "binary"
+    return "other"
+
+
+def _create(client, name: str, dim: int, profile: CollectionProfile):
+    from qdrant_client import models
+
+    client.create_collection(
+        collection_name=name,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE, on_disk=profile.vectors_on_disk),
+        hnsw_config=models.HnswConfigDiff(m=profile.hnsw_m, ef_construct=profile.hnsw_ef_construct),
+        quantization_config=_quantization_config(profile),
+        on_disk_payload=profile.payload_on_disk,
+    )
+
+
+def _reconcile(client, name: str, info: Any, profile: CollectionProfile) -> List[str]:
+    from qdrant_client import models
+
+    changes: List[str] = []
+    cfg = info.config
+    kwargs: Dict[str, Any] = {}
+
+    hnsw = cfg.hnsw_config
+    if hnsw.m != profile.hnsw_m or hnsw.ef_construct != profile.hnsw_ef_construct:
+        kwargs["hnsw_config"] = models.HnswConfigDiff(m=profile.hnsw_m, ef_construct=profile.hnsw_ef_construct)
+        changes.append(f"hnsw m={profile.hnsw_m} ef_construct={profile.hnsw_ef_construct}")
+
+    if _quantization_kind(cfg.quantization_config) != profile.quantization:
+        kwargs["quantization_config"] = _quantization_config(profile) or models.Disabled.DISABLED
+        changes.append(f"quantization={profile.quantization or 'disabled'}")
+
+    vectors = cfg.params.vectors
+    if bool(getattr(vectors, "on_disk", False)) != profile.vectors_on_disk:
+        kwargs["vectors_config"] = {"": models.VectorParamsDiff(on_disk=profile.vectors_on_disk)}
+        changes.append(f"vectors_on_disk={profile.vectors_on_disk}")
+
+    if bool(cfg.params.on_disk_payload) != profile.payload_on_disk:
+        kwargs["collection_params"] = models.CollectionParamsDiff(on_disk_payload=profile.payload_on_disk)
+        changes.append(f"payload_on_disk={profile.payload_on_disk}")
+
+    if kwargs:
+        client.update_collection(collection_name=name, **kwargs)
+    return changes
+
+
+def ensure_collection(client, name: str, dim: Optional[int], profile: CollectionProfile) -> Dict[str, Any]:
+    """Create `name` with `profile`, or reconcile an existing collection to it.
+
+    With `dim=None` a missing collection is left alone (the caller does not know the
+    vector size yet). Returns a report of what was created or changed.
+    """
+    from qdrant_client import models
+
+    report: Dict[str, Any] = {"collection": name, "profile": profile.name, "created": False, "changes": [], "indexes": []}
+    try:
+        info = client.get_collection(name)
+    except Exception:
+        info = None
+
+    if info is None:
+        if dim is None:
+            return report
+        try:
+            _create(client, name, dim, profile)
+            report["created"] = True
+        except Exception:
+            # Created concurrently by another worker
+            pass
+        info = client.get_collection(name)
+    else:
+        report["changes"] = _reconcile(client, name, info, profile)
+
+    existing = set((info.payload_schema or {}).keys())
+    wanted = [(f, models.PayloadSchemaType.KEYWORD) for f in profile.keyword_indexes]
+    wanted += [(f, models.PayloadSchemaType.FLOAT) for f in profile.float_indexes]
+    for field_name, schema in wanted:
+        if field_name in existing:
+            continue
+        try:
+            client.create_payload_index(name, field_name=field_name, field_schema=schema)
+            report["indexes"].append(field_name)
+        except Exception:
+            pass
+    return report
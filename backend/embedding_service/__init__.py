@@ -0,0 +1,3 @@
+"""Shared embedding inference FastAPI service package."""
+
+__all__ = ["main"]
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import numpy as np
+
+
+@dataclass
+class _Request:
+    texts: List[str]
+    normalize: bool
+    future: asyncio.Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class DynamicBatcher:
+    """Coalesces concurrent encode requests into model batches.
+
+    A batch is dispatched once it holds `max_batch` texts or the oldest request in it
+    has waited `max_wait_ms`. Encoding runs on a single worker thread so the device
+    only ever sees one batch at a time.
+    """
+
+    def __init__(
+        self,
+        encode: Callable[[List[str], bool], np.ndarray],
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 4096,
+        on_batch: Optional[Callable[[int, float], None]] = None,
+    ):
+        self._encode = encode
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+        self._task: Optional[asyncio.Task] = None
+        self._on_batch = on_batch
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, texts: List[str], normalize: bool = True) -> np.ndarray:
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Request(list(texts), normalize, fut))
+        return await fut
+
+    async def _collect(self) -> List[_Request]:
+        first = await self._queue.get()
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued + self.max_wait
+        while size < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                req = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(req)
+            size += len(req.texts)
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Requests with different normalize flags cannot share one encode call
+            for normalize in (True, False):
+                group = [r for r in batch if r.normalize is normalize and not r.future.done()]
+                if not group:
+                    continue
+                texts = [t for r in group for t in r.texts]
+                waited = time.monotonic() - min(r.enqueued for r in group)
+                try:
+                    vecs = await loop.run_in_executor(self._executor, self._encode, texts, normalize)
+                except Exception as exc:
+                    for r in group:
+                        if not r.future.done():
+                            r.future.set_exception(exc)
+                    continue
+                if self._on_batch is not None:
+                    self._on_batch(len(texts), waited)
+                offset = 0
+                for r in group:
+                    n = len(r.texts)
+                    if not r.future.done():
+                        r.future.set_result(vecs[offset:offset + n])
+                    offset += n
@@ -0,0 +1,14 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+EMBED_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-large-en-v1.5")
+USE_GPU = os.getenv("USE_GPU", "true").lower() == "true"
+PORT = int(os.getenv("PORT", "8022"))
+
+# Dynamic batching: a batch is dispatched when it holds EMBED_MAX_BATCH texts or the
+# oldest queued request has waited EMBED_MAX_WAIT_MS, whichever comes first
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_MAX_QUEUE = int(os.getenv("EMBED_MAX_QUEUE", "4096"))
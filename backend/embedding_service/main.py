@@ -0,0 +1,136 @@
+import base64
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from fastapi import Body, FastAPI, HTTPException, Response
+from pydantic import BaseModel
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+
+from .batcher import DynamicBatcher
+from .config import EMBED_MAX_BATCH, EMBED_MAX_QUEUE, EMBED_MAX_WAIT_MS, EMBED_MODEL, PORT, USE_GPU
+
+registry = CollectorRegistry()
+metric_batch_size = Histogram(
+    'embed_batch_size', 'Texts per dispatched model batch', registry=registry,
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+metric_queue_wait = Histogram('embed_queue_wait_ms', 'Time the oldest request waited for its batch (ms)', registry=registry)
+metric_texts = Counter('embed_texts_total', 'Texts encoded', registry=registry)
+
+# Reported to clients, which key their embedding-cache namespace on it
+BACKEND = "torch"
+
+_state: Dict[str, Any] = {"model": None, "device": None, "load_seconds": None, "batcher": None}
+
+
+class EncodeIn(BaseModel):
+    texts: List[str]
+    normalize: bool = True
+    model: Optional[str] = None
+
+
+class EncodeOut(BaseModel):
+    model: str
+    backend: str = BACKEND
+    dim: int
+    dtype: str
+    count: int
+    data: str  # base64 of row-major little-endian float32
+
+
+def _device() -> str:
+    if USE_GPU:
+        try:
+            import torch
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        except Exception:
+            return "cpu"
+    return "cpu"
+
+
+def _encode(texts: List[str], normalize: bool) -> np.ndarray:
+    model = _state["model"]
+    return model.encode(
+        texts,
+        batch_size=EMBED_MAX_BATCH,
+        convert_to_numpy=True,
+        normalize_embeddings=normalize,
+        show_progress_bar=False,
+    )
+
+
+def _observe(size: int, waited: float):
+    metric_batch_size.observe(size)
+    metric_queue_wait.observe(waited * 1000.0)
+    metric_texts.inc(size)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from sentence_transformers import SentenceTransformer
+    start = time.perf_counter()
+    _state["device"] = _device()
+    _state["model"] = SentenceTransformer(EMBED_MODEL, device=_state["device"])
+    _state["load_seconds"] = time.perf_counter() - start
+    batcher = DynamicBatcher(
+        _encode,
+        max_batch=EMBED_MAX_BATCH,
+        max_wait_ms=EMBED_MAX_WAIT_MS,
+        max_queue=EMBED_MAX_QUEUE,
+        on_batch=_observe,
+    )
+    batcher.start()
+    _state["batcher"] = batcher
+    try:
+        yield
+    finally:
+        await batcher.stop()
+        _state["batcher"] = None
+
+
+app = FastAPI(title="CIRS Embedding Service", version="0.1.0", lifespan=lifespan)
+
+
+@app.get('/health')
+async def health():
+    batcher = _state["batcher"]
+    return {
+        "ok": _state["model"] is not None,
+        "model": EMBED_MODEL,
+        "backend": BACKEND,
+        "device": _state["device"],
+        "load_seconds": _state["load_seconds"],
+        "queue_depth": batcher.depth if batcher else 0,
+    }
+
+
+@app.get('/metrics')
+async def metrics():
+    data = generate_latest(registry)
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+
+
+@app.post('/encode', response_model=EncodeOut)
+async def encode(body: EncodeIn = Body(...)):
+    if _state["batcher"] is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if body.model and body.model != EMBED_MODEL:
+        raise HTTPException(status_code=409, detail=f"Service serves {EMBED_MODEL}, not {body.model}")
+    if not body.texts:
+        return EncodeOut(model=EMBED_MODEL, dim=0, dtype="float32", count=0, data="")
+    vecs = await _state["batcher"].submit(body.texts, normalize=body.normalize)
+    vecs = np.ascontiguousarray(vecs, dtype="<f4")
+    return EncodeOut(
+        model=EMBED_MODEL,
+        dim=int(vecs.shape[1]),
+        dtype="float32",
+        count=int(vecs.shape[0]),
+        data=base64.b64encode(vecs.tobytes()).decode("ascii"),
+    )
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=PORT)
@@ -1,9 +1,33 @@
+import hashlib
 import json
+import re
+from bisect import bisect_left, bisect_right
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import uuid
 
-from config import CHUNK_SIZE_TOKENS, CHUNK_OVERLAP_TOKENS
+from config import (
+    CHUNK_SIZE_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_TOKENIZER,
+    DEDUP_INDEX_MODE,
+    DEDUP_MIN_SOURCES,
+)
+
+try:
+    from common.dedup_store import text_key
+except ImportError:  # backend/common not mounted into this image
+    text_key = None
+
+_SENT_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\S+")
+
+_tokenizer = None
+_tokenizer_loaded = False
+
+# Bump when the packing algorithm changes so chunk IDs from older layouts are replaced
+CHUNKER_VERSION = "2"
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c7f0e-5b9a-4c55-9a7e-2f3d1c0b8a41")
 
 
 def _token_count(text: str) -> int:
@@ -11,84 +35,220 @@ def _token_count(text: str) -> int:
     return len(text.split())
 
 
+def _load_tokenizer():
+    """Fast tokenizer of the embedding model; None falls back to whitespace tokens."""
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        _tokenizer_loaded = True
+        if CHUNK_TOKENIZER.lower() != "whitespace":
+            try:
+                from transformers import AutoTokenizer
+                tok = AutoTokenizer.from_pretrained(CHUNK_TOKENIZER, use_fast=True)
+                if getattr(tok, "is_fast", False):
+                    # Only counting here; silence the over-length warning for long pages
+                    tok.model_max_length = 10 ** 9
+                    _tokenizer = tok
+            except Exception:
+                _tokenizer = None
+    return _tokenizer
+
+
+def _token_starts(texts: List[str]) -> List[List[int]]:
+    """Character offset of every token in each text, from a single batched tokenizer call."""
+    tok = _load_tokenizer()
+    if tok is not None and texts:
+        enc = tok(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return [[start for start, _ in offsets] for offsets in enc["offset_mapping"]]
+    return [[m.start() for m in _WORD.finditer(t)] for t in texts]
+
+
+def _split_oversized(text: str, starts: List[int], limit: int) -> List[Tuple[int, int]]:
+    """Token ranges of at most `limit` tokens, cut on sentence boundaries where possible."""
+    n = len(starts)
+    bounds = [0]
+    for m in _SENT_END.finditer(text):
+        b = bisect_left(starts, m.end())
+        if bounds[-1] < b < n:
+            bounds.append(b)
+    bounds.append(n)
+
+    pieces: List[Tuple[int, int]] = []
+    lo = 0
+    for k in range(1, len(bounds)):
+        hi = bounds[k]
+        if hi - lo > limit and bounds[k - 1] > lo:
+            pieces.append((lo, bounds[k - 1]))
+            lo = bounds[k - 1]
+        # A single sentence longer than the limit is cut at token boundaries
+        while hi - lo > limit:
+            pieces.append((lo, lo + limit))
+            lo += limit
+    if lo < n:
+        pieces.append((lo, n))
+    return pieces
+
+
+def _build_units(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Normalize segments into token-counted units, splitting any larger than a chunk."""
+    rows: List[Tuple[Dict[str, Any], str]] = []
+    for seg in segments:
+        txt = seg.get("text_validated") or seg.get("text") or ""
+        if txt.strip():
+            rows.append((seg, txt))
+    all_starts = _token_starts([txt for _, txt in rows])
+
+    units: List[Dict[str, Any]] = []
+    speaker = None
+    for (seg, txt), starts in zip(rows, all_starts):
+        speaker = seg.get("speaker") or speaker or "SPEAKER_00"
+        st = float(seg.get("start_time", seg.get("start")) or 0.0)
+        et = float(seg.get("end_time", seg.get("end")) or st)
+        base = {
+            "speaker": speaker,
+            "confidence_medical": seg.get("confidence_medical", 0.9),
+            "confidence_contextual": seg.get("confidence_contextual", 0.9),
+        }
+        n = len(starts)
+        if n <= CHUNK_SIZE_TOKENS:
+            units.append({**base, "start_time": st, "end_time": et, "text_validated": txt, "tokens": max(1, n)})
+            continue
+        for lo, hi in _split_oversized(txt, starts, CHUNK_SIZE_TOKENS):
+            piece = txt[starts[lo]:starts[hi] if hi < n else len(txt)].strip()
+            if not piece:
+                continue
+            units.append({
+                **base,
+                "start_time": st + (et - st) * lo / n,
+                "end_time": st + (et - st) * hi / n,
+                "text_validated": piece,
+                "tokens": hi - lo,
+            })
+    return units
+
+
 def _join_with_overlap(buffer: List[Dict[str, Any]]) -> str:
     return " ".join(seg["text_validated"].strip() for seg in buffer if seg.get("text_validated"))
 
 
-def chunk_validated_segments(
+def chunker_signature() -> str:
+    """Stable digest of every setting that changes chunk boundaries."""
+    raw = f"{CHUNKER_VERSION}|{CHUNK_SIZE_TOKENS}|{CHUNK_OVERLAP_TOKENS}|{CHUNK_TOKENIZER}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def chunk_id_for(source: str, span: Tuple[int, int], start_time: float, end_time: float, text_hash: str) -> str:
+    """Content-addressed chunk ID: identical input and config always yield the same ID."""
+    name = f"{source}|{span[0]}-{span[1]}|{start_time:.3f}-{end_time:.3f}|{text_hash}|{chunker_signature()}"
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, name))
+
+
+def _make_chunk(
+    buf: List[Dict[str, Any]],
+    source_id: Optional[str],
+    source_key: Optional[str],
+    span: Tuple[int, int],
+) -> Dict[str, Any]:
+    text = _join_with_overlap(buf)
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    start_time = float(buf[0]["start_time"])
+    end_time = float(buf[-1]["end_time"])
+    source = source_id or source_key or ""
+    return {
+        "chunk_id": chunk_id_for(source, span, start_time, end_time, text_hash),
+        "source_id": source_id,
+        "source_key": source,
+        "start_time": start_time,
+        "end_time": end_time,
+        "speaker": buf[0]["speaker"],
+        "text": text,
+        "text_hash": text_hash,
+        "validation_confidence": float(sum(
+            (s.get("confidence_medical", 0.9) + s.get("confidence_contextual", 0.9)) / 2.0 for s in buf
+        ) / max(1, len(buf))),
+        "topic_tags": [],
+        "entities": [],
+    }
+
+
+def filter_duplicate_segments(
     segments: List[Dict[str, Any]],
-    source_id: Optional[str] = None,
+    store,
+    source_key: str,
+    mode: str = DEDUP_INDEX_MODE,
+    stats=None,
 ) -> List[Dict[str, Any]]:
-    chunks: List[Dict[str, Any]] = []
-    buf: List[Dict[str, Any]] = []
-    tokens = 0
-    current_speaker = None
+    """Drop repeated boilerplate according to `mode` (keep | collapse | exclude).
 
+    collapse keeps a segment only in the first source that contained it; exclude drops
+    any text already seen in at least DEDUP_MIN_SOURCES sources.
+    """
+    if store is None or text_key is None:
+        return segments
+    kept: List[Dict[str, Any]] = []
     for seg in segments:
         txt = seg.get("text_validated") or seg.get("text") or ""
         if not txt.strip():
             continue
-        seg_tokens = _token_count(txt)
-        speaker = seg.get("speaker", current_speaker)
-
-        # Start new chunk when exceeding target size or speaker changed
-        if buf and (tokens + seg_tokens > CHUNK_SIZE_TOKENS or (current_speaker is not None and speaker != current_speaker)):
-            chunk_text = _join_with_overlap(buf)
-            chunks.append({
-                "chunk_id": str(uuid.uuid4()),
-                "source_id": source_id,
-                "start_time": float(buf[0].get("start_time", buf[0].get("start", 0.0))),
-                "end_time": float(buf[-1].get("end_time", buf[-1].get("end", 0.0))),
-                "speaker": current_speaker or buf[0].get("speaker", "SPEAKER_00"),
-                "text": chunk_text,
-                "validation_confidence": float(sum(
-                    (s.get("confidence_medical", 0.9) + s.get("confidence_contextual", 0.9)) / 2.0 for s in buf
-                ) / max(1, len(buf))),
-                "topic_tags": [],
-                "entities": [],
-            })
-            # Overlap
-            if CHUNK_OVERLAP_TOKENS > 0:
-                # retain tail tokens for continuity
-                retained: List[Dict[str, Any]] = []
-                t = 0
-                for s in reversed(buf):
-                    t += _token_count(s.get("text_validated", ""))
-                    retained.insert(0, s)
-                    if t >= CHUNK_OVERLAP_TOKENS:
-                        break
-                buf = retained
-                tokens = sum(_token_count(s.get("text_validated", "")) for s in buf)
-            else:
-                buf = []
-                tokens = 0
-        # Append current seg
-        buf.append({
-            "start_time": seg.get("start_time", seg.get("start")),
-            "end_time": seg.get("end_time", seg.get("end")),
-            "speaker": seg.get("speaker", "SPEAKER_00"),
-            "text_validated": txt,
-            "confidence_medical": seg.get("confidence_medical", 0.9),
-            "confidence_contextual": seg.get("confidence_contextual", 0.9),
-        })
-        tokens += seg_tokens
-        current_speaker = speaker
-
-    if buf:
-        chunk_text = _join_with_overlap(buf)
-        chunks.append({
-            "chunk_id": str(uuid.uuid4()),
-            "source_id": source_id,
-            "start_time": float(buf[0].get("start_time", buf[0].get("start", 0.0))),
-            "end_time": float(buf[-1].get("end_time", buf[-1].get("end", 0.0))),
-            "speaker": current_speaker or buf[0].get("speaker", "SPEAKER_00"),
-            "text": chunk_text,
-            "validation_confidence": float(sum(
-                (s.get("confidence_medical", 0.9) + s.get("confidence_contextual", 0.9)) / 2.0 for s in buf
-            ) / max(1, len(buf))),
-            "topic_tags": [],
-            "entities": [],
-        })
+        key = seg.get("text_hash") or text_key(txt)
+        owner = store.record_source(key, source_key)
+        if mode == "collapse" and owner != source_key:
+            drop = True
+        elif mode == "exclude" and store.source_count(key) >= DEDUP_MIN_SOURCES:
+            drop = True
+        else:
+            drop = False
+        if drop:
+            if stats is not None:
+                stats.add(_token_count(txt))
+            continue
+        kept.append(seg)
+    return kept
+
+
+def chunk_validated_segments(
+    segments: List[Dict[str, Any]],
+    source_id: Optional[str] = None,
+    source_key: Optional[str] = None,
+    dedup_store=None,
+    dedup_stats=None,
+) -> List[Dict[str, Any]]:
+    """Pack validated segments into windows of at most CHUNK_SIZE_TOKENS model tokens.
+
+    Segments are tokenized once; a prefix sum over unit token counts sizes each window
+    and its overlap tail in O(1)/O(log n), so the whole pass is linear in the input.
+    Windows never span a speaker change and overlap is only carried within a speaker.
+    """
+    if dedup_store is not None and source_key:
+        segments = filter_duplicate_segments(segments, dedup_store, source_key, stats=dedup_stats)
+    units = _build_units(segments)
+    n = len(units)
+    prefix = [0] * (n + 1)
+    for k, u in enumerate(units):
+        prefix[k + 1] = prefix[k] + u["tokens"]
+
+    chunks: List[Dict[str, Any]] = []
+    i = 0
+    while i < n:
+        speaker = units[i]["speaker"]
+        j = i + 1
+        while j < n and units[j]["speaker"] == speaker and prefix[j + 1] - prefix[i] <= CHUNK_SIZE_TOKENS:
+            j += 1
+        chunks.append(_make_chunk(units[i:j], source_id, source_key, (i, j)))
+        if j >= n or CHUNK_OVERLAP_TOKENS <= 0 or units[j]["speaker"] != speaker:
+            i = j
+            continue
+        # Latest start k in (i, j) whose tail [k, j) still holds >= CHUNK_OVERLAP_TOKENS
+        k = max(i + 1, bisect_right(prefix, prefix[j] - CHUNK_OVERLAP_TOKENS, i + 1, j) - 1)
+        # The next window must reach past j, otherwise drop the overlap
+        if k >= j or prefix[j + 1] - prefix[k] > CHUNK_SIZE_TOKENS:
+            k = j
+        i = k
 
     return chunks
 
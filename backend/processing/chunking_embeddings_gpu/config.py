@@ -7,23 +7,67 @@ load_dotenv()
 CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "350"))
 CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
 
+# Segment dedup (shared with validation); empty path disables
+SEGMENT_DEDUP_DB = os.getenv("SEGMENT_DEDUP_DB", "/data/dedup/segments.sqlite")
+# keep = index every occurrence, collapse = index only the first source seen,
+# exclude = drop text seen in >= DEDUP_MIN_SOURCES sources (boilerplate)
+DEDUP_INDEX_MODE = os.getenv("DEDUP_INDEX_MODE", "keep").lower()
+DEDUP_MIN_SOURCES = int(os.getenv("DEDUP_MIN_SOURCES", "3"))
+
+# Near-duplicate chunks (MinHash LSH, common/near_dup.py); empty path disables
+NEAR_DUP_DB = os.getenv("NEAR_DUP_DB", "/data/dedup/near_dup.sqlite")
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+NEAR_DUP_NUM_PERM = int(os.getenv("NEAR_DUP_NUM_PERM", "128"))
+NEAR_DUP_BANDS = int(os.getenv("NEAR_DUP_BANDS", "16"))
+
 # Embedding
 EMBED_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-large-en-v1.5")
+# Tokenizer used to size chunks; "whitespace" skips the HF tokenizer
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", EMBED_MODEL)
 EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "16"))
+# Chunks from many files are pooled into one encode call; flush on count or age
+EMBED_FLUSH_CHUNKS = int(os.getenv("EMBED_FLUSH_CHUNKS", "1024"))
+EMBED_FLUSH_SECONDS = float(os.getenv("EMBED_FLUSH_SECONDS", "30"))
 USE_GPU = os.getenv("USE_GPU", "true").lower() == "true"
 
+# In-process embedding backend: torch | onnx | onnx-int8 (see common/embedding_backends.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "/data/models/onnx")
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 = all cores
+
+# Persistent embedding cache shared across services (empty dir disables)
+EMBED_MODEL_REVISION = os.getenv("EMBED_MODEL_REVISION", "main")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "/data/cache/embeddings")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "4096"))
+
+# Shared embedding service (backend/embedding_service); empty = encode in-process
+EMBED_SERVICE_URL = os.getenv("EMBED_SERVICE_URL", "")
+
 # IO
 INPUT_PATH = os.getenv("INPUT_PATH", "/data/validated")
 OUTPUT_PATH = os.getenv("OUTPUT_PATH", "/data/chunks")
 RUN_TAG = os.getenv("RUN_TAG")
+# Chunk output: arrow (columnar store, common/chunk_store.py) or json (legacy per-file dumps)
+CHUNK_STORE_FORMAT = os.getenv("CHUNK_STORE_FORMAT", "arrow").lower()
 
 # Qdrant
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "cirs_chunks_v1")
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+# Provisioning profile from common/qdrant_provisioning.py (default|compact|large|binary)
+QDRANT_PROFILE = os.getenv("QDRANT_PROFILE", "default")
+# Points per upload request and max requests in flight while the next slice encodes
+QDRANT_UPLOAD_BATCH = int(os.getenv("QDRANT_UPLOAD_BATCH", "256"))
+QDRANT_UPLOAD_PARALLEL = int(os.getenv("QDRANT_UPLOAD_PARALLEL", "4"))
+
+# Pipeline controller status updates
+PIPELINE_API = os.getenv("PIPELINE_API", "http://pipeline_controller:8021")
 
 # Postgres (optional)
 DB_URL = os.getenv("DB_URL")
+# Rows per COPY batch when staging chunks and embeddings
+DB_COPY_BATCH = int(os.getenv("DB_COPY_BATCH", "5000"))
 
 # Resumability
 EMBEDDED_INDEX = os.getenv("EMBEDDED_INDEX", os.path.join(OUTPUT_PATH, ".embedded_index.json"))
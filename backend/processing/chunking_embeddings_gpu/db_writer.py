@@ -0,0 +1,134 @@
+import io
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# Bulk Postgres writer for cirs.chunks / cirs.embeddings. Rows are streamed with COPY
+# into temp staging tables and merged with one INSERT ... SELECT ... ON CONFLICT per
+# table, so a file costs a handful of round trips instead of two per chunk.
+
+CHUNK_COLUMNS = (
+    "chunk_id", "parent_type", "parent_id", "source_id", "text", "start_time", "end_time",
+    "page", "section_path", "topic_tags", "entities",
+)
+EMBEDDING_COLUMNS = ("chunk_id", "model", "dim")
+
+
+def _copy_value(value: Any) -> str:
+    """Render one field in COPY text format (\\N for NULL, backslash escapes)."""
+    if value is None:
+        return "\\N"
+    s = str(value)
+    return (
+        s.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copy_buffer(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(_copy_value(v) for v in row))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+
+def _chunk_row(c: Dict[str, Any]) -> tuple:
+    return (
+        c.get("chunk_id"),
+        "transcript",
+        None,
+        c.get("source_id"),
+        c.get("text"),
+        c.get("start_time"),
+        c.get("end_time"),
+        None,
+        None,
+        json.dumps(c.get("topic_tags", [])),
+        json.dumps(c.get("entities", [])),
+    )
+
+
+class ChunkDBWriter:
+    """Writes chunk and embedding rows over one connection reused for the whole run.
+
+    Each `write` is a single transaction: staged COPY batches of `batch_rows`, the
+    merges into both tables and the deletion of stale chunk IDs commit or roll back
+    together.
+    """
+
+    def __init__(self, db_url: str, batch_rows: int = 5000):
+        self.db_url = db_url
+        self.batch_rows = max(1, batch_rows)
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            import psycopg2
+            self._conn = psycopg2.connect(self.db_url)
+        return self._conn
+
+    def _merge(self, cur, chunks: List[Dict[str, Any]], model: str, dim: int):
+        cols = ", ".join(CHUNK_COLUMNS)
+        emb_cols = ", ".join(EMBEDDING_COLUMNS)
+        cur.copy_expert(
+            f"COPY _chunks_stage ({cols}) FROM STDIN",
+            _copy_buffer(_chunk_row(c) for c in chunks),
+        )
+        cur.copy_expert(
+            f"COPY _embeddings_stage ({emb_cols}) FROM STDIN",
+            _copy_buffer((c.get("chunk_id"), model, dim) for c in chunks),
+        )
+        cur.execute(
+            f"INSERT INTO cirs.chunks ({cols}) SELECT {cols} FROM _chunks_stage "
+            "ON CONFLICT (chunk_id) DO NOTHING"
+        )
+        cur.execute(
+            f"INSERT INTO cirs.embeddings ({emb_cols}) SELECT {emb_cols} FROM _embeddings_stage "
+            "ON CONFLICT (chunk_id) DO NOTHING"
+        )
+        cur.execute("TRUNCATE _chunks_stage, _embeddings_stage")
+
+    def write(
+        self,
+        chunks: List[Dict[str, Any]],
+        model: str,
+        dim: int,
+        stale_ids: Optional[List[str]] = None,
+    ):
+        """Merge `chunks` and delete `stale_ids` in one transaction.
+
+        Errors are raised after rolling back, so the caller can fail the file and retry
+        it on the next run instead of recording rows that never reached Postgres.
+        """
+        if not chunks and not stale_ids:
+            return
+        conn = self._connection()
+        try:
+            with conn.cursor() as cur:
+                if chunks:
+                    cur.execute("CREATE TEMP TABLE _chunks_stage (LIKE cirs.chunks INCLUDING DEFAULTS) ON COMMIT DROP")
+                    cur.execute("CREATE TEMP TABLE _embeddings_stage (LIKE cirs.embeddings INCLUDING DEFAULTS) ON COMMIT DROP")
+                    for i in range(0, len(chunks), self.batch_rows):
+                        self._merge(cur, chunks[i:i + self.batch_rows], model, dim)
+                if stale_ids:
+                    cur.execute("DELETE FROM cirs.embeddings WHERE chunk_id::text = ANY(%s)", (list(stale_ids),))
+                    cur.execute("DELETE FROM cirs.chunks WHERE chunk_id::text = ANY(%s)", (list(stale_ids),))
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                # Broken connection; reconnect on the next write
+                self.close()
+            raise
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
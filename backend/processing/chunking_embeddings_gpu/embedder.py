@@ -1,13 +1,50 @@
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Callable
+from dataclasses import dataclass, field
 
-from .config import EMBED_MODEL, EMBED_BATCH_SIZE, QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION, USE_GPU
+import numpy as np
+
+from config import (
+    EMBED_MODEL, EMBED_BATCH_SIZE, QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION, USE_GPU,
+    EMBED_MODEL_REVISION, EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB, EMBED_SERVICE_URL,
+    EMBED_FLUSH_CHUNKS, EMBED_FLUSH_SECONDS, EMBED_BACKEND, EMBED_ONNX_DIR, EMBED_ONNX_THREADS,
+    QDRANT_PREFER_GRPC, QDRANT_UPLOAD_BATCH, QDRANT_UPLOAD_PARALLEL, QDRANT_PROFILE,
+)
+
+try:
+    from common.embedding_cache import cache_namespace, cached_encode, open_cache
+except ImportError:  # backend/common not mounted into this image
+    cache_namespace = cached_encode = open_cache = None
+
+try:
+    from common.embedding_client import EmbeddingClient
+except ImportError:
+    EmbeddingClient = None
+
+try:
+    from common.embedding_backends import load_backend
+except ImportError:
+    load_backend = None
+
+try:
+    from common.qdrant_provisioning import ensure_collection, get_profile
+except ImportError:
+    ensure_collection = get_profile = None
+
+_client = None
+_model = None
+_qdrant = None
 
 
 @dataclass
 class EmbedResult:
     count: int
     dim: int
+    encoded: int = 0
+    deleted: int = 0
+    stale_ids: List[str] = field(default_factory=list)
 
 
 def _device() -> str:
@@ -21,21 +58,77 @@ def _device() -> str:
 
 
 def _load_model():
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(EMBED_MODEL, device=_device())
-    return model
+    global _model
+    if _model is None:
+        if load_backend is not None:
+            _model = load_backend(
+                EMBED_MODEL, EMBED_BACKEND, device=_device(), onnx_dir=EMBED_ONNX_DIR, threads=EMBED_ONNX_THREADS
+            )
+        else:
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer(EMBED_MODEL, device=_device())
+    return _model
+
+
+def get_qdrant():
+    global _qdrant
+    if _qdrant is None:
+        from qdrant_client import QdrantClient
+        _qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY, prefer_grpc=QDRANT_PREFER_GRPC)
+    return _qdrant
+
+
+def _encode_local(texts: List[str], normalize: bool = True):
+    model = _load_model()
+    return model.encode(texts, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=normalize)
+
+
+def _get_client():
+    global _client
+    if EmbeddingClient is None:
+        return None
+    if _client is None:
+        _client = EmbeddingClient(EMBED_SERVICE_URL, EMBED_MODEL, fallback=_encode_local, fallback_backend=EMBED_BACKEND)
+    return _client
+
+
+def _encode(texts: List[str]):
+    """Encode through the shared embedding service, falling back to the local model."""
+    client = _get_client()
+    if client is None:
+        return _encode_local(texts)
+    return client.encode(texts, normalize=True)
+
+
+def _namespace(backend: str) -> str:
+    return cache_namespace(EMBED_MODEL, EMBED_MODEL_REVISION, normalize=True, backend=backend)
+
+
+def encode_texts(texts: List[str]):
+    if open_cache is None:
+        return _encode(texts)
+    cache = open_cache(EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB)
+    client = _get_client()
+    if client is None:
+        return cached_encode(cache, _namespace(EMBED_BACKEND), texts, _encode)
+    # Cache under the backend that produced the vectors: the service's or the fallback's
+    return cached_encode(
+        cache, _namespace(client.backend), texts, _encode, store_namespace=lambda: _namespace(client.last_backend)
+    )
 
 
 def _ensure_collection(client, name: str, dim: int):
-    from qdrant_client.models import Distance, VectorParams
+    if ensure_collection is not None:
+        ensure_collection(client, name, dim, get_profile(QDRANT_PROFILE))
+        return
+    from qdrant_client.models import Distance, VectorParams, PayloadSchemaType
     try:
         collections = client.get_collections().collections
-        if any(c.name == name for c in collections):
-            return
-        client.create_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
-        )
+        if not any(c.name == name for c in collections):
+            client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+            )
     except Exception:
         # Attempt idempotent creation
         try:
@@ -45,49 +138,284 @@ def _ensure_collection(client, name: str, dim: int):
             )
         except Exception:
             pass
+    # Diffing scrolls by source_key on every file
+    try:
+        client.create_payload_index(name, field_name="source_key", field_schema=PayloadSchemaType.KEYWORD)
+    except Exception:
+        pass
+
+
+def _collection_dim(client, name: str) -> Optional[int]:
+    try:
+        params = client.get_collection(name).config.params.vectors
+        return int(params.size)
+    except Exception:
+        return None
+
+
+def existing_chunk_ids(client, collection: str, source_key: str) -> Set[str]:
+    """IDs of points already stored for `source_key`."""
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+    flt = Filter(must=[FieldCondition(key="source_key", match=MatchValue(value=source_key))])
+    ids: Set[str] = set()
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=flt,
+            limit=1024,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(p.id) for p in points)
+        if offset is None:
+            break
+    return ids
+
+
+def set_aliases(client, collection: str, aliases: Dict[str, List[Dict[str, Any]]]):
+    """Overwrite the `aliases` payload of canonical points in one batched request."""
+    if not aliases:
+        return
+    from qdrant_client.models import SetPayload, SetPayloadOperation
+    ops = [
+        SetPayloadOperation(set_payload=SetPayload(payload={"aliases": records}, points=[cid]))
+        for cid, records in aliases.items()
+    ]
+    client.batch_update_points(collection_name=collection, update_operations=ops, wait=False)
+
+
+def bump_corpus_generation(client, collection: str) -> Optional[int]:
+    """Stamp the collection so retriever result caches keyed on it are invalidated."""
+    try:
+        meta = dict(client.get_collection(collection).config.metadata or {})
+        meta["corpus_generation"] = int(meta.get("corpus_generation") or 0) + 1
+        meta["updated_at"] = time.time()
+        client.update_collection(collection_name=collection, metadata=meta)
+        return meta["corpus_generation"]
+    except Exception:
+        # Older Qdrant without collection metadata; point count still changes
+        return None
+
+
+def _payload(c: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "chunk_id": c.get("chunk_id"),
+        "source_id": c.get("source_id"),
+        "source_key": c.get("source_key"),
+        "text_hash": c.get("text_hash"),
+        "parent_type": "transcript",
+        "parent_id": None,
+        "start_time": c.get("start_time"),
+        "end_time": c.get("end_time"),
+        "page": None,
+        "text": c.get("text", ""),
+        "speaker": c.get("speaker"),
+        "topic_tags": c.get("topic_tags", []),
+        "entities": c.get("entities", []),
+        "validation_confidence": c.get("validation_confidence"),
+    }
+
+
+@dataclass
+class _FileState:
+    chunks: List[Dict[str, Any]]
+    stale: List[str]
+    encoded: int
+    remaining: int
+    on_done: Callable[[EmbedResult], None]
+    on_error: Optional[Callable[[Exception], None]] = None
+
+
+class EmbedPipeline:
+    """Accumulates chunks from many files into full encode batches.
+
+    The model and Qdrant client stay resident for the run. Pending chunks are flushed
+    once EMBED_FLUSH_CHUNKS are queued or the oldest has waited EMBED_FLUSH_SECONDS,
+    the latter checked by a background timer so a partial batch does not wait for the
+    next file; a file's `on_done` runs only after all of its points are upserted, and its
+    stale points are deleted at that moment. Flushes, and so the callbacks, run under one
+    lock, whether triggered by `add`, the timer or `flush`.
+    """
+
+    def __init__(
+        self,
+        collection: Optional[str] = None,
+        flush_chunks: int = EMBED_FLUSH_CHUNKS,
+        flush_seconds: float = EMBED_FLUSH_SECONDS,
+    ):
+        self.client = get_qdrant()
+        self.collection = collection or QDRANT_COLLECTION
+        self.flush_chunks = max(1, flush_chunks)
+        self.flush_seconds = flush_seconds
+        self.dim = _collection_dim(self.client, self.collection)
+        self._files: Dict[str, _FileState] = {}
+        self._pending: List[tuple] = []  # (file_key, chunk)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, QDRANT_UPLOAD_PARALLEL), thread_name_prefix="qdrant-upload")
+        self._first_pending: Optional[float] = None
+        self._lock = threading.RLock()
+        self._closed = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+        if self.flush_seconds > 0:
+            self._timer = threading.Thread(target=self._flush_when_due, name="embed-flush", daemon=True)
+            self._timer.start()
+
+    def _flush_when_due(self):
+        while not self._closed.wait(max(0.1, self.flush_seconds / 4)):
+            with self._lock:
+                if self._first_pending is not None and time.monotonic() - self._first_pending >= self.flush_seconds:
+                    self.flush()
+
+    def add(
+        self,
+        file_key: str,
+        chunks: List[Dict[str, Any]],
+        on_done: Callable[[EmbedResult], None],
+        on_error: Optional[Callable[[Exception], None]] = None,
+    ):
+        existing: Set[str] = set()
+        if self.dim is not None:
+            for source_key in {c.get("source_key") for c in chunks if c.get("source_key")}:
+                existing |= existing_chunk_ids(self.client, self.collection, source_key)
+        wanted = {c.get("chunk_id") for c in chunks}
+        stale = sorted(existing - wanted)
+        fresh = [c for c in chunks if c.get("chunk_id") not in existing]
+
+        state = _FileState(
+            chunks=chunks, stale=stale, encoded=len(fresh), remaining=len(fresh), on_done=on_done, on_error=on_error,
+        )
+        with self._lock:
+            if not fresh:
+                self._complete(state)
+                return
+            self._files[file_key] = state
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+            self._pending.extend((file_key, c) for c in fresh)
+            if len(self._pending) >= self.flush_chunks or time.monotonic() - self._first_pending >= self.flush_seconds:
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending, self._first_pending = self._pending, [], None
+            try:
+                self._encode_and_upload(pending)
+            except Exception as exc:
+                for key in dict.fromkeys(k for k, _ in pending):
+                    state = self._files.pop(key, None)
+                    if state is not None and state.on_error is not None:
+                        state.on_error(exc)
+                return
+
+            for key, _ in pending:
+                state = self._files.get(key)
+                if state is None:
+                    continue
+                state.remaining -= 1
+                if state.remaining == 0:
+                    del self._files[key]
+                    self._complete(state)
+
+    def _upload(self, chunks: List[Dict[str, Any]], vectors, wait: bool):
+        self.client.upload_collection(
+            collection_name=self.collection,
+            vectors=vectors,
+            payload=[_payload(c) for c in chunks],
+            ids=[c.get("chunk_id") for c in chunks],
+            batch_size=len(chunks),
+            parallel=1,
+            wait=wait,
+        )
+
+    def _encode_and_upload(self, pending: List[tuple]):
+        """Encode slice N+1 while slice N uploads; uploads run in a bounded thread pool.
+
+        Vectors go to Qdrant as NumPy arrays. All slices but the last are sent with
+        wait=False; the last is sent with wait=True only after the others have been
+        acknowledged, which acts as the barrier for the whole flush.
+        """
+        chunks = [c for _, c in pending]
+        step = max(1, QDRANT_UPLOAD_BATCH)
+        slices = [(i, min(i + step, len(chunks))) for i in range(0, len(chunks), step)]
+        inflight = threading.BoundedSemaphore(max(1, QDRANT_UPLOAD_PARALLEL))
+        futures = []
+
+        def upload(part, vecs):
+            try:
+                self._upload(part, vecs, wait=False)
+            finally:
+                inflight.release()
+
+        try:
+            for n, (lo, hi) in enumerate(slices):
+                vecs = np.ascontiguousarray(encode_texts([c.get("text", "") for c in chunks[lo:hi]]), dtype=np.float32)
+                if self.dim is None:
+                    self.dim = int(vecs.shape[1])
+                    _ensure_collection(self.client, self.collection, self.dim)
+                if n == len(slices) - 1:
+                    for f in futures:
+                        f.result()
+                    self._upload(chunks[lo:hi], vecs, wait=True)
+                else:
+                    inflight.acquire()
+                    futures.append(self._executor.submit(upload, chunks[lo:hi], vecs))
+        finally:
+            for f in futures:
+                f.exception()
+
+    def _complete(self, state: _FileState):
+        try:
+            if state.stale:
+                from qdrant_client.models import PointIdsList
+                self.client.delete(collection_name=self.collection, points_selector=PointIdsList(points=state.stale))
+        except Exception as exc:
+            if state.on_error is not None:
+                state.on_error(exc)
+            return
+        result = EmbedResult(
+            count=len(state.chunks),
+            dim=self.dim or 0,
+            encoded=state.encoded,
+            deleted=len(state.stale),
+            stale_ids=state.stale,
+        )
+        # A failing callback (DB write, index save) fails that file, not the flush that
+        # completed it on behalf of other files
+        if state.on_error is None:
+            state.on_done(result)
+            return
+        try:
+            state.on_done(result)
+        except Exception as exc:
+            state.on_error(exc)
+
+    def close(self):
+        self._closed.set()
+        if self._timer is not None:
+            self._timer.join()
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
 
 
 def embed_and_upsert(chunks: List[Dict[str, Any]], collection: Optional[str] = None) -> EmbedResult:
+    """Encode and upsert only chunks not already stored for their source; delete stale ones.
+
+    Chunk IDs are content-addressed, so an unchanged source diffs to nothing and the
+    model is never loaded.
+    """
     if not chunks:
         return EmbedResult(count=0, dim=0)
-
-    from qdrant_client import QdrantClient
-    from qdrant_client.models import PointStruct
-
-    model = _load_model()
-    dim = model.get_sentence_embedding_dimension()
-
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
-    coll = collection or QDRANT_COLLECTION
-    _ensure_collection(client, coll, dim)
-
-    texts = [c.get("text", "") for c in chunks]
-
-    # Batch encode
-    embeddings = model.encode(texts, batch_size=EMBED_BATCH_SIZE, show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True)
-
-    points = []
-    for i, (c, vec) in enumerate(zip(chunks, embeddings)):
-        cid = c.get("chunk_id")
-        payload = {
-            "chunk_id": cid,
-            "source_id": c.get("source_id"),
-            "parent_type": "transcript",
-            "parent_id": None,
-            "start_time": c.get("start_time"),
-            "end_time": c.get("end_time"),
-            "page": None,
-            "text": c.get("text", ""),
-            "speaker": c.get("speaker"),
-            "topic_tags": c.get("topic_tags", []),
-            "entities": c.get("entities", []),
-            "validation_confidence": c.get("validation_confidence"),
-        }
-        points.append(PointStruct(id=cid, vector=vec.tolist(), payload=payload))
-
-    # Upsert in batches
-    batch = 512
-    for i in range(0, len(points), batch):
-        client.upsert(collection_name=coll, points=points[i:i+batch])
-
-    return EmbedResult(count=len(points), dim=dim)
+    results: List[EmbedResult] = []
+    errors: List[Exception] = []
+    pipeline = EmbedPipeline(collection, flush_chunks=len(chunks))
+    pipeline.add("", chunks, on_done=results.append, on_error=errors.append)
+    pipeline.close()
+    if errors:
+        raise errors[0]
+    return results[0]
@@ -1,5 +1,6 @@
 import argparse
 import json
+import logging
 import os
 import sys
 import hashlib
@@ -23,10 +24,45 @@ from config import (
     QDRANT_URL,
     QDRANT_COLLECTION,
     DB_URL,
+    DB_COPY_BATCH,
     EMBEDDED_INDEX,
+    SEGMENT_DEDUP_DB,
+    DEDUP_INDEX_MODE,
+    PIPELINE_API,
+    CHUNK_STORE_FORMAT,
+    NEAR_DUP_DB,
+    NEAR_DUP_THRESHOLD,
+    NEAR_DUP_NUM_PERM,
+    NEAR_DUP_BANDS,
 )
 from chunker import chunk_validated_segments, write_chunks_json
-from embedder import embed_and_upsert
+from embedder import EmbedPipeline, set_aliases, bump_corpus_generation
+from db_writer import ChunkDBWriter
+
+try:
+    from common.dedup_store import DedupStats, open_store
+except ImportError:  # backend/common not mounted into this image
+    DedupStats = open_store = None
+
+try:
+    from common.chunk_store import write_chunks as write_chunk_store
+except ImportError:
+    write_chunk_store = None
+
+try:
+    from common.near_dup import open_index as open_near_dup
+except ImportError:
+    open_near_dup = None
+
+logger = logging.getLogger(__name__)
+
+
+def _near_dup_index():
+    if open_near_dup is None:
+        return None
+    return open_near_dup(
+        NEAR_DUP_DB, threshold=NEAR_DUP_THRESHOLD, num_perm=NEAR_DUP_NUM_PERM, bands=NEAR_DUP_BANDS
+    )
 
 
 def ensure_dir(p: Path):
@@ -70,101 +106,153 @@ def scan_validated(root: Path) -> List[Path]:
     return sorted(files)
 
 
-def maybe_write_db(chunks: List[Dict[str, Any]], model: str, dim: int) -> bool:
-    if not DB_URL:
-        return False
+def source_key_for(path: Path, in_root: Optional[Path]) -> str:
+    """Per-source key: the path relative to the input root, without its extension.
+
+    The bare file stem is not unique (every run directory has its own `intro.json`), and
+    chunk IDs and stale-point diffs are scoped by this key.
+    """
+    rel = Path(path.name)
+    if in_root is not None:
+        try:
+            rel = path.resolve().relative_to(in_root.resolve())
+        except ValueError:
+            pass
+    return rel.with_suffix("").as_posix()
+
+
+def evict_alias_sources(
+    aliases: List[Dict[str, Any]],
+    own_key: str,
+    idx: Dict[str, Any],
+    in_root: Optional[Path],
+) -> List[Path]:
+    """Drop the index entries of sources holding `aliases` of a forgotten canonical.
+
+    Alias chunks are never embedded, so once their canonical is gone their sources must
+    be chunked again; returns those source paths.
+    """
+    keys = {a.get("source_key") for a in aliases} - {own_key, None}
+    if not keys:
+        return []
+    evicted: List[Path] = []
+    for h, entry in list(idx.items()):
+        src = Path(entry.get("in") or "")
+        if source_key_for(src, in_root) in keys:
+            del idx[h]
+            evicted.append(src)
+    return evicted
+
+
+def notify_status(path: Path, run_tag: str, done: bool, error: Optional[str] = None):
     try:
-        import psycopg2
-        conn = psycopg2.connect(DB_URL)
-        conn.autocommit = True
-        cur = conn.cursor()
-        # Insert chunks if not exist (idempotent on primary key)
-        for c in chunks:
-            sql_chunks = (
-                "INSERT INTO cirs.chunks (chunk_id, parent_type, parent_id, source_id, text, start_time, end_time, page, section_path, topic_tags, entities) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) "
-                "ON CONFLICT (chunk_id) DO NOTHING"
-            )
-            cur.execute(
-                sql_chunks,
-                (
-                    c.get("chunk_id"),
-                    "transcript",
-                    None,
-                    c.get("source_id"),
-                    c.get("text"),
-                    c.get("start_time"),
-                    c.get("end_time"),
-                    None,
-                    None,
-                    json.dumps(c.get("topic_tags", [])),
-                    json.dumps(c.get("entities", [])),
-                ),
-            )
-            sql_emb = (
-                "INSERT INTO cirs.embeddings (chunk_id, model, dim) VALUES (%s, %s, %s) "
-                "ON CONFLICT (chunk_id) DO NOTHING"
-            )
-            cur.execute(sql_emb, (c.get("chunk_id"), model, dim))
-        cur.close()
-        conn.close()
-        return True
+        import uuid as _uuid
+        file_id = str(_uuid.uuid5(_uuid.NAMESPACE_URL, str(path)))
+        requests.post(f"{PIPELINE_API}/status/update", json={
+            "file_id": file_id,
+            "stage": "embed",
+            "done": done,
+            "error": error,
+            "filename": str(path),
+            "file_type": "document",
+            "run_tag": run_tag,
+        }, timeout=2)
     except Exception:
-        return False
+        pass
 
 
-def process_file(path: Path, run_tag: str) -> Optional[Dict[str, Any]]:
-    idx = load_index()
+def process_file(
+    path: Path,
+    run_tag: str,
+    pipeline: EmbedPipeline,
+    idx: Dict[str, Any],
+    totals: Dict[str, int],
+    dedup_stats=None,
+    db_writer: Optional[ChunkDBWriter] = None,
+    in_root: Optional[Path] = None,
+    requeue: Optional[List[Path]] = None,
+) -> bool:
+    """Chunk one file and queue it on the run's embed pipeline.
+
+    The index entry, DB rows and success status are written from the pipeline callback,
+    i.e. only once this file's points are upserted. Any failure, including the Qdrant
+    diff in `pipeline.add`, fails this file only. Sources whose alias chunks lost their
+    canonical here are evicted from `idx` and appended to `requeue`.
+    """
     h = file_hash(path)
     if idx.get(h):
-        return None
+        return False
+
+    def on_done(emb_res):
+        # Optional DB rows; a failed write raises, so the pipeline fails this file and
+        # it stays out of `idx` to be retried on the next run
+        if db_writer is not None:
+            db_writer.write(chunks, model=EMBED_MODEL, dim=emb_res.dim, stale_ids=emb_res.stale_ids)
+        if near_dup is not None:
+            # Chunks of this file folded into aliases are not stale, just collapsed
+            orphaned = near_dup.forget([cid for cid in emb_res.stale_ids if cid not in file_ids])
+            evicted = evict_alias_sources(orphaned, source_key, idx, in_root)
+            if requeue is not None:
+                requeue.extend(evicted)
+            try:
+                set_aliases(pipeline.client, pipeline.collection, alias_updates)
+            except Exception:
+                # The points are stored; only their alias payloads are behind
+                logger.warning("alias payload update for %s failed", path, exc_info=True)
+        idx[h] = {
+            "in": str(path),
+            "chunks": str(out_path),
+            "count": len(chunks),
+            "encoded": emb_res.encoded,
+            "deleted": emb_res.deleted,
+            "dim": emb_res.dim,
+            "run_tag": run_tag,
+        }
+        save_index(idx)
+        totals["chunks"] += len(chunks)
+        totals["encoded"] += emb_res.encoded
+        totals["deleted"] += emb_res.deleted
+        notify_status(path, run_tag, done=True)
+
+    def on_error(exc: Exception):
+        notify_status(path, run_tag, done=False, error=str(exc))
+
     try:
-        # notify start
-        try:
-            import uuid as _uuid
-            file_id = str(_uuid.uuid5(_uuid.NAMESPACE_URL, str(path)))
-            requests.post(f"{PIPELINE_API}/status/update", json={
-                "file_id": file_id,
-                "stage": "embed",
-                "done": False,
-                "error": None,
-                "filename": str(path),
-                "file_type": "document",
-                "run_tag": run_tag,
-            }, timeout=2)
-        except Exception:
-            pass
+        notify_status(path, run_tag, done=False)
         segments = json.loads(path.read_text(encoding="utf-8"))
         if isinstance(segments, dict) and "segments" in segments:
             segments = segments["segments"]
         if not isinstance(segments, list):
-            return None
+            return False
         # For now, source_id is unknown; pipeline can pass via filename map later
-        chunks = chunk_validated_segments(segments, source_id=None)
-        out_dir = Path(OUTPUT_PATH) / run_tag
-        out_path = write_chunks_json(out_dir, path.stem, chunks)
-        # Embed and upsert to Qdrant
-        emb_res = embed_and_upsert(chunks)
-        # Optional DB rows
-        maybe_write_db(chunks, model=EMBED_MODEL, dim=emb_res.dim)
-        idx[h] = {"in": str(path), "chunks": str(out_path), "count": len(chunks), "dim": emb_res.dim, "run_tag": run_tag}
-        save_index(idx)
-        # notify success
-        try:
-            requests.post(f"{PIPELINE_API}/status/update", json={
-                "file_id": file_id,
-                "stage": "embed",
-                "done": True,
-                "error": None,
-                "filename": str(path),
-                "file_type": "document",
-                "run_tag": run_tag,
-            }, timeout=2)
-        except Exception:
-            pass
-        return {"in": str(path), "out": str(out_path), "count": len(chunks), "dim": emb_res.dim}
-    except Exception:
-        return None
+        store = open_store(SEGMENT_DEDUP_DB) if open_store and DEDUP_INDEX_MODE != "keep" else None
+        source_key = source_key_for(path, in_root)
+        out_stem = source_key.replace("/", "__")
+        chunks = chunk_validated_segments(
+            segments,
+            source_id=None,
+            source_key=source_key,
+            dedup_store=store,
+            dedup_stats=dedup_stats,
+        )
+        file_ids = {str(c["chunk_id"]) for c in chunks}
+        near_dup = _near_dup_index()
+        alias_updates: Dict[str, List[Dict[str, Any]]] = {}
+        if near_dup is not None:
+            # Only canonical chunks are stored and embedded; duplicates become aliases
+            nd = near_dup.assign(chunks)
+            chunks = nd.kept
+            alias_updates = {cid: near_dup.aliases_of(cid) for cid in set(nd.aliases) | set(nd.dropped)}
+            totals["near_dups"] = totals.get("near_dups", 0) + nd.duplicates
+        if CHUNK_STORE_FORMAT == "arrow" and write_chunk_store is not None:
+            out_path = write_chunk_store(Path(OUTPUT_PATH), run_tag, out_stem, chunks)
+        else:
+            out_path = write_chunks_json(Path(OUTPUT_PATH) / run_tag, out_stem, chunks)
+        pipeline.add(str(path), chunks, on_done=on_done, on_error=on_error)
+    except Exception as exc:
+        on_error(exc)
+        return False
+    return True
 
 
 def main():
@@ -184,20 +272,49 @@ def main():
         print("No validated transcripts found.")
         return
 
-    total_chunks = 0
+    idx = load_index()
+    totals = {"chunks": 0, "encoded": 0, "deleted": 0, "near_dups": 0}
+    dedup = DedupStats() if DedupStats else None
+    pipeline = EmbedPipeline()
+    db_writer = ChunkDBWriter(DB_URL, batch_rows=DB_COPY_BATCH) if DB_URL else None
+    requeue: List[Path] = []
     for f in tqdm(files, desc="Chunk+Embed"):
-        res = process_file(f, run_tag)
-        if res:
-            total_chunks += int(res.get("count", 0))
+        process_file(
+            f, run_tag, pipeline, idx, totals,
+            dedup_stats=dedup, db_writer=db_writer, in_root=in_root, requeue=requeue,
+        )
+    # Sources whose aliases lost their canonical (a re-chunked file) are indexed again
+    pipeline.flush()
+    seen = set()
+    while requeue:
+        batch = [f for f in dict.fromkeys(requeue) if f not in seen and f.exists()]
+        requeue.clear()
+        for f in batch:
+            seen.add(f)
+            process_file(
+                f, run_tag, pipeline, idx, totals,
+                dedup_stats=dedup, db_writer=db_writer, in_root=in_root, requeue=requeue,
+            )
+        pipeline.flush()
+    pipeline.close()
+    if totals["encoded"] or totals["deleted"] or totals["near_dups"]:
+        bump_corpus_generation(pipeline.client, pipeline.collection)
+    if db_writer is not None:
+        db_writer.close()
 
     print(json.dumps({
         "run_tag": run_tag,
         "files": len(files),
-        "chunks": total_chunks,
+        "chunks": totals["chunks"],
+        "encoded": totals["encoded"],
+        "deleted": totals["deleted"],
+        "near_dups": totals["near_dups"],
         "embed_model": EMBED_MODEL,
         "batch": EMBED_BATCH_SIZE,
         "qdrant": QDRANT_URL,
-        "collection": QDRANT_COLLECTION
+        "collection": QDRANT_COLLECTION,
+        "dedup_mode": DEDUP_INDEX_MODE,
+        **(dedup.as_dict() if dedup else {}),
     }, indent=2))
 
 
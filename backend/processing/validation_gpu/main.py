@@ -25,8 +25,17 @@ from config import (
     VALIDATED_INDEX,
     USE_GPU,
     MAX_FILES,
+    SEGMENT_DEDUP_DB,
 )
 
+try:
+    from common.dedup_store import DedupStats, open_store, result_key, text_key
+except ImportError:  # backend/common not mounted into this image
+    DedupStats = open_store = result_key = text_key = None
+
+# Bump when extraction, flagging or confidence logic changes so stored results are recomputed
+VALIDATOR_VERSION = "1"
+
 _nlp = None
 _negex = None
 _tok_model = None
@@ -150,6 +159,19 @@ def load_units():
     return _ureg
 
 
+def validator_version() -> str:
+    """Version tag for stored validation results: the validator logic plus the NLP
+    pipeline actually loaded (a run without spaCy or negex yields different entities)."""
+    nlp = load_nlp()
+    if nlp is None:
+        model = "none"
+    else:
+        meta = getattr(nlp, "meta", {}) or {}
+        model = f"{meta.get('lang', '')}_{meta.get('name', '')}-{meta.get('version', '')}"
+    negex = "negex" if _negex is not None else "nonegex"
+    return f"v{VALIDATOR_VERSION}:{model}:{negex}:{VALIDATION_MODEL}"
+
+
 def extract_entities(text: str) -> List[Dict[str, Any]]:
     """Lightweight entity extraction with optional negation flags.
     Falls back gracefully if spaCy/scispaCy unavailable.
@@ -230,22 +252,51 @@ def contextual_confidence(text_orig: str, text_val: str) -> float:
     return 0.9
 
 
-def validate_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def validate_segments(
+    segments: List[Dict[str, Any]],
+    source: Optional[str] = None,
+    store=None,
+    stats=None,
+) -> List[Dict[str, Any]]:
+    """Validate segments; exact text already validated by this validator version reuses
+    the result stored in the dedup `store`."""
     # Ensure optional processors are initialized
     load_negex()
+    version = validator_version()
     out = []
     for s in segments:
         txt = s.get("text", "")
         validated = simple_corrections(txt)
-        entities = extract_entities(validated)
-        flags = numeric_quality_flags(validated)
-
-        # Confidence adjustments: increase with non-negated medical entities, decrease with flags
-        c_med = heuristic_medical_conf(validated)
-        non_neg_ents = sum(1 for e in entities if not e.get("negated"))
-        c_med = min(1.0, c_med + 0.02 * non_neg_ents)
-        if flags:
-            c_med = max(0.0, c_med - 0.1)
+        key = text_key(txt) if text_key else None
+        rkey = result_key(txt, version) if result_key else None
+        cached = None
+        if store is not None and key:
+            if source:
+                store.record_source(key, source)
+            cached = store.get_result(rkey)
+
+        if cached is not None:
+            entities = cached.get("entities", [])
+            flags = cached.get("quality_flags", [])
+            c_med = float(cached.get("confidence_medical", heuristic_medical_conf(validated)))
+            if stats is not None:
+                stats.add(len(txt.split()))
+        else:
+            entities = extract_entities(validated)
+            flags = numeric_quality_flags(validated)
+
+            # Confidence adjustments: increase with non-negated medical entities, decrease with flags
+            c_med = heuristic_medical_conf(validated)
+            non_neg_ents = sum(1 for e in entities if not e.get("negated"))
+            c_med = min(1.0, c_med + 0.02 * non_neg_ents)
+            if flags:
+                c_med = max(0.0, c_med - 0.1)
+            if store is not None and key:
+                store.put_result(
+                    rkey,
+                    {"entities": entities, "quality_flags": flags, "confidence_medical": c_med},
+                    tokens=len(txt.split()),
+                )
 
         c_ctx = contextual_confidence(txt, validated)
 
@@ -259,6 +310,7 @@ def validate_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             "confidence_contextual": float(c_ctx),
             "entities": entities,
             "quality_flags": flags,
+            "text_hash": key,
         })
     return out
 
@@ -304,7 +356,7 @@ def maybe_write_db(validated: List[Dict[str, Any]], source_id: Optional[str] = N
         return False
 
 
-def process_sidecar(path: Path, run_tag: str, source_id: Optional[str]) -> Optional[Dict[str, Any]]:
+def process_sidecar(path: Path, run_tag: str, source_id: Optional[str], stats=None) -> Optional[Dict[str, Any]]:
     idx = load_index()
     h = file_hash(path)
     if idx.get(h):
@@ -327,7 +379,8 @@ def process_sidecar(path: Path, run_tag: str, source_id: Optional[str]) -> Optio
             pass
         data = json.loads(path.read_text(encoding="utf-8"))
         segments = data.get("segments") or []
-        validated = validate_segments(segments)
+        store = open_store(SEGMENT_DEDUP_DB) if open_store else None
+        validated = validate_segments(segments, source=path.stem, store=store, stats=stats)
         media_kind = detect_media_kind(path)
         out_path = write_output(Path(OUTPUT_PATH), media_kind, run_tag, path.stem, validated)
         maybe_write_db(validated, source_id)
@@ -375,8 +428,9 @@ def main():
 
     total_segments = 0
     corrected = 0
+    dedup = DedupStats() if DedupStats else None
     for f in tqdm(files, desc="Validating"):
-        res = process_sidecar(f, run_tag, args.source_id)
+        res = process_sidecar(f, run_tag, args.source_id, stats=dedup)
         if res:
             try:
                 data = json.loads(Path(res["out"]).read_text(encoding="utf-8"))
@@ -389,7 +443,8 @@ def main():
         "run_tag": run_tag,
         "files": len(files),
         "segments": total_segments,
-        "corrected_segments": corrected
+        "corrected_segments": corrected,
+        **(dedup.as_dict() if dedup else {}),
     }, indent=2))
 
 
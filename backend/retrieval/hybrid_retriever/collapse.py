@@ -0,0 +1,136 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+# Post-fusion collapsing. Chunks overlap by CHUNK_OVERLAP_TOKENS, so a good passage
+# usually comes back as several adjacent hits from one source. A hit's source is its
+# source_key (the chunk file's path under the input root), falling back to source_id
+# for chunks written without one. Hits of the same source
+# and speaker whose time ranges (or pages) overlap are merged into one span (a panel's
+# back-and-forth stays as separate, attributable hits): the earliest-ranked
+# member keeps its position and chunk_id, the score is the members' max and the text
+# is stitched in time order without repeating the shared overlap. A per-source cap then
+# keeps one talk from filling the whole prompt.
+
+# Longest word overlap looked for when stitching two adjacent chunk texts
+_MAX_STITCH_WORDS = 256
+
+
+def _interval(hit: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    start, end = hit.get("start_time"), hit.get("end_time")
+    if start is None and end is None:
+        return None
+    start = float(start if start is not None else end)
+    end = float(end if end is not None else start)
+    # Zero-length and inverted ranges become a point at their start
+    return (start, max(start, end))
+
+
+def _source(hit: Dict[str, Any]) -> Any:
+    return hit.get("source_key") or hit.get("source_id")
+
+
+def _overlaps(a: Dict[str, Any], b: Dict[str, Any], gap: float) -> bool:
+    if a.get("speaker") and b.get("speaker") and a["speaker"] != b["speaker"]:
+        return False
+    if a.get("page") is not None and a.get("page") == b.get("page"):
+        return True
+    ia, ib = _interval(a), _interval(b)
+    if ia is None or ib is None:
+        return False
+    return ia[0] <= ib[1] + gap and ib[0] <= ia[1] + gap
+
+
+def stitch(first: str, second: str) -> str:
+    """Join two texts, dropping the longest suffix of `first` that prefixes `second`."""
+    a, b = first.split(), second.split()
+    if not a:
+        return second
+    if not b:
+        return first
+    # Already covered (a chunk nested inside a longer neighbour)
+    if f" {' '.join(b)} " in f" {' '.join(a)} ":
+        return first
+    for k in range(min(len(a), len(b), _MAX_STITCH_WORDS), 0, -1):
+        if a[-k:] == b[:k]:
+            return " ".join(a + b[k:])
+    return " ".join(a + b)
+
+
+def _union(lists: List[List[Any]]) -> List[Any]:
+    out: List[Any] = []
+    for values in lists:
+        for v in values or []:
+            if v not in out:
+                out.append(v)
+    return out
+
+
+def _merge(members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One span from `members` (rank order); the first member is the representative."""
+    head = members[0]
+    if len(members) == 1:
+        return head
+    timed = sorted(members, key=lambda h: (_interval(h) or (0.0, 0.0)))
+    text = ""
+    for h in timed:
+        text = stitch(text, h.get("text") or "")
+    starts = [i[0] for i in map(_interval, members) if i is not None]
+    ends = [i[1] for i in map(_interval, members) if i is not None]
+    scores = [h["score"] for h in members if h.get("score") is not None]
+    return {
+        **head,
+        "text": text,
+        "score": max(scores) if scores else head.get("score"),
+        "start_time": min(starts) if starts else head.get("start_time"),
+        "end_time": max(ends) if ends else head.get("end_time"),
+        "entities": _union([h.get("entities") for h in timed]),
+        "topic_tags": _union([h.get("topic_tags") for h in timed]),
+        "aliases": _union([h.get("aliases") for h in timed]),
+        "chunk_ids": [h.get("chunk_id") for h in timed],
+    }
+
+
+def collapse_overlaps(
+    results: List[Dict[str, Any]],
+    max_per_source: int = 0,
+    gap_seconds: float = 0.0,
+    merge: bool = True,
+) -> List[Dict[str, Any]]:
+    """Merge overlapping same-source, same-speaker hits of a ranked list and cap hits per source.
+
+    `gap_seconds` also merges hits separated by at most that much silence;
+    `max_per_source` <= 0 disables the cap and `merge=False` applies only the cap.
+    Hits without a source are kept as-is; hits of different speakers are never merged.
+    """
+    spans: List[List[Dict[str, Any]]] = []
+    by_source: Dict[Any, List[int]] = {}
+    for hit in results:
+        source = _source(hit)
+        if source is None or not merge:
+            spans.append([hit])
+            continue
+        owned = by_source.setdefault(source, [])
+        touching = [i for i in owned if any(_overlaps(hit, m, gap_seconds) for m in spans[i])]
+        if not touching:
+            owned.append(len(spans))
+            spans.append([hit])
+            continue
+        # A hit can bridge earlier spans; fold them all into the best-ranked one
+        keep = touching[0]
+        for i in touching[1:]:
+            spans[keep].extend(spans[i])
+            spans[i] = []
+            owned.remove(i)
+        spans[keep].append(hit)
+
+    out: List[Dict[str, Any]] = []
+    per_source: Dict[Any, int] = {}
+    for members in spans:
+        if not members:
+            continue
+        source = _source(members[0])
+        if source is not None and max_per_source > 0:
+            if per_source.get(source, 0) >= max_per_source:
+                continue
+            per_source[source] = per_source.get(source, 0) + 1
+        out.append(_merge(members))
+    return out
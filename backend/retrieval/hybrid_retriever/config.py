@@ -6,15 +6,76 @@ load_dotenv()
 QDRANT_URL = os.getenv("QDRANT_URL", "http://qdrant:6333")
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "cirs_chunks_v1")
+# Provisioning profile reconciled at startup (default|compact|large|binary; empty skips,
+# unknown names are reported in /health and leave the collection untouched)
+QDRANT_PROFILE = os.getenv("QDRANT_PROFILE", "default")
+# Search on the profile's quantized vectors (int8/binary); oversampling and rescore
+# override the profile's values when set, false searches the full-precision originals
+QDRANT_QUANTIZED_SEARCH = os.getenv("QDRANT_QUANTIZED_SEARCH", "true").lower() == "true"
+QDRANT_OVERSAMPLING = os.getenv("QDRANT_OVERSAMPLING", "")
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "")
+# Vector backend: qdrant | local (in-process index only) | auto (Qdrant, failing over
+# to the local index while Qdrant health checks fail)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "/data/index/vectors")
+# After a Qdrant failure, how long to stay on the local index before probing again
+QDRANT_RETRY_SECONDS = float(os.getenv("QDRANT_RETRY_SECONDS", "15"))
 
 BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", "/data/index/bm25")
+# How often searchers check for index commits made by other processes
+BM25_REFRESH_SECONDS = float(os.getenv("BM25_REFRESH_SECONDS", "5"))
+# Lexical engine: whoosh | sparse (in-process CSR BM25, see sparse_bm25.py)
+LEXICAL_ENGINE = os.getenv("LEXICAL_ENGINE", "whoosh").lower()
+SPARSE_BM25_PATH = os.getenv("SPARSE_BM25_PATH", "/data/index/bm25_sparse")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
 
 EMBED_MODEL = os.getenv("EMBED_MODEL", "BAAI/bge-large-en-v1.5")
 USE_GPU = os.getenv("USE_GPU", "true").lower() == "true"
 
+# In-process embedding backend: torch | onnx | onnx-int8 (see common/embedding_backends.py)
+EMBED_BACKEND = os.getenv("EMBED_BACKEND", "torch")
+EMBED_ONNX_DIR = os.getenv("EMBED_ONNX_DIR", "/data/models/onnx")
+EMBED_ONNX_THREADS = int(os.getenv("EMBED_ONNX_THREADS", "0"))  # 0 = all cores
+
+# Persistent embedding cache shared across services (empty dir disables)
+EMBED_MODEL_REVISION = os.getenv("EMBED_MODEL_REVISION", "main")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "/data/cache/embeddings")
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "4096"))
+
+# Shared embedding service (backend/embedding_service); empty = encode in-process
+EMBED_SERVICE_URL = os.getenv("EMBED_SERVICE_URL", "")
+
+# In-memory LRU of normalized query -> embedding; optional warm file of recent queries
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "3600"))
+QUERY_CACHE_WARM_FILE = os.getenv("QUERY_CACHE_WARM_FILE", "")
+
+# Fused /search results keyed by query + corpus version; Redis URL shares it across replicas
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "600"))
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "")
+# How often the corpus version (Qdrant count/generation, BM25 generation) is re-read
+RESULT_CACHE_VERSION_SECONDS = float(os.getenv("RESULT_CACHE_VERSION_SECONDS", "5"))
+
 VECTOR_WEIGHT = float(os.getenv("VECTOR_WEIGHT", "0.6"))
 LEXICAL_WEIGHT = float(os.getenv("LEXICAL_WEIGHT", "0.4"))
 TOP_K_VECTOR = int(os.getenv("TOP_K_VECTOR", "20"))
 TOP_K_LEXICAL = int(os.getenv("TOP_K_LEXICAL", "20"))
+# Threads shared by the vector and lexical legs of concurrent searches
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "8"))
+# Upper bound on queries accepted by one POST /search/batch
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "256"))
+# Merge overlapping hits of one source and speaker into a single span after fusion (see
+# collapse.py); opt-in, as merged spans change the /search result shape. The gap also
+# joins hits separated by a short pause, 0 = only overlapping/touching hits
+COLLAPSE_OVERLAPS = os.getenv("COLLAPSE_OVERLAPS", "false").lower() == "true"
+COLLAPSE_GAP_SECONDS = float(os.getenv("COLLAPSE_GAP_SECONDS", "0"))
+# Diversity cap on results per source (source_key, else source_id) after collapsing (0 = no cap, the default)
+MAX_PER_SOURCE = int(os.getenv("MAX_PER_SOURCE", "0"))
 
 CHUNKS_ROOT = os.getenv("CHUNKS_ROOT", "/data/chunks")
+
+# Add a Server-Timing header (encode, vector_search, lexical, fusion, total) to every
+# search response; debug=true requests always get it
+SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"
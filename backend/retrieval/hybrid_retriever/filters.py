@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+# Structured /search filters, translated for each engine so top-k is taken inside the
+# filtered set: a Qdrant payload filter (served by the profile's payload indexes), a
+# Whoosh filter query, and a document mask for the in-process indexes (sparse BM25 and
+# the local vector index).
+# Values within one field are OR-ed; fields are AND-ed. The time window keeps chunks
+# that overlap [time_from, time_to] (seconds).
+
+
+class SearchFilters(BaseModel):
+    source_id: Optional[List[str]] = None
+    speaker: Optional[List[str]] = None
+    topic_tags: Optional[List[str]] = None
+    parent_type: Optional[List[str]] = None
+    time_from: Optional[float] = None
+    time_to: Optional[float] = None
+
+    def is_empty(self) -> bool:
+        return not any(v not in (None, []) for v in self.model_dump().values())
+
+    def cache_params(self) -> Dict[str, Any]:
+        """Normalised form for result-cache keys (order of values does not matter)."""
+        out: Dict[str, Any] = {}
+        for name, value in self.model_dump().items():
+            if value in (None, []):
+                continue
+            out[name] = sorted(value) if isinstance(value, list) else value
+        return out
+
+    def _keyword_fields(self) -> Dict[str, List[str]]:
+        return {
+            name: values
+            for name, values in (
+                ("source_id", self.source_id),
+                ("speaker", self.speaker),
+                ("topic_tags", self.topic_tags),
+                ("parent_type", self.parent_type),
+            )
+            if values
+        }
+
+    def to_qdrant(self):
+        if self.is_empty():
+            return None
+        from qdrant_client import models
+
+        must: List[Any] = [
+            models.FieldCondition(key=name, match=models.MatchAny(any=values))
+            for name, values in self._keyword_fields().items()
+        ]
+        if self.time_from is not None:
+            must.append(models.FieldCondition(key="end_time", range=models.Range(gte=self.time_from)))
+        if self.time_to is not None:
+            must.append(models.FieldCondition(key="start_time", range=models.Range(lte=self.time_to)))
+        return models.Filter(must=must)
+
+    def to_whoosh(self):
+        if self.is_empty():
+            return None
+        from whoosh import query
+
+        clauses: List[Any] = [
+            query.Or([query.Term(name, v) for v in values])
+            for name, values in self._keyword_fields().items()
+        ]
+        if self.time_from is not None:
+            clauses.append(query.NumericRange("end_time", self.time_from, None))
+        if self.time_to is not None:
+            clauses.append(query.NumericRange("start_time", None, self.time_to))
+        return query.And(clauses)
+
+
+class FilterableDocs:
+    """Per-document fields of an in-process index (an Arrow table, one row per document
+    ordinal) with boolean masks for SearchFilters."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.n_docs = docs.num_rows
+        self._tags: Optional[Dict[str, np.ndarray]] = None
+
+    def tag_docs(self, tag: str) -> np.ndarray:
+        """Document ordinals carrying `tag`; the tag postings are built on first use."""
+        if self._tags is None:
+            postings: Dict[str, List[int]] = {}
+            for i, raw in enumerate(self.docs.column("topic_tags").to_pylist()):
+                for t in json.loads(raw or "[]"):
+                    postings.setdefault(str(t), []).append(i)
+            self._tags = {t: np.asarray(ids, dtype=np.int64) for t, ids in postings.items()}
+        return self._tags.get(tag, np.zeros(0, dtype=np.int64))
+
+    def mask(self, filters: SearchFilters) -> np.ndarray:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        keep = np.ones(self.n_docs, dtype=bool)
+        for name in ("source_id", "speaker", "parent_type"):
+            values = getattr(filters, name)
+            if values:
+                hit = pc.is_in(self.docs.column(name), value_set=pa.array(values, type=pa.string()))
+                keep &= pc.fill_null(hit, False).to_numpy(zero_copy_only=False)
+        if filters.topic_tags:
+            tagged = np.zeros(self.n_docs, dtype=bool)
+            for tag in filters.topic_tags:
+                tagged[self.tag_docs(tag)] = True
+            keep &= tagged
+        # Missing times count as 0.0, as in the Whoosh index
+        if filters.time_from is not None:
+            end = pc.fill_null(self.docs.column("end_time"), 0.0).to_numpy()
+            keep &= end >= filters.time_from
+        if filters.time_to is not None:
+            start = pc.fill_null(self.docs.column("start_time"), 0.0).to_numpy()
+            keep &= start <= filters.time_to
+        return keep
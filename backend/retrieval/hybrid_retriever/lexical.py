@@ -1,8 +1,40 @@
+import hashlib
+import os
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any
 import json
 
-from config import BM25_INDEX_PATH, CHUNKS_ROOT, TOP_K_LEXICAL
+from config import (
+    BM25_B,
+    BM25_INDEX_PATH,
+    BM25_K1,
+    BM25_REFRESH_SECONDS,
+    CHUNKS_ROOT,
+    LEXICAL_ENGINE,
+    SPARSE_BM25_PATH,
+    TOP_K_LEXICAL,
+)
+from metrics import stage
+from sparse_bm25 import DOC_COLUMNS as SPARSE_COLUMNS, SparseBM25Index, build_index as build_sparse_index
+
+try:
+    from common.chunk_store import read_records
+except ImportError:  # backend/common not mounted into this image
+    read_records = None
+
+# Columns the BM25 index needs (the store never decodes hashes or confidences).
+# parent_type is read when a file has it; chunks without one, which is everything the
+# chunking service writes today, are indexed as "transcript".
+INDEX_COLUMNS = (
+    "chunk_id", "text", "source_id", "source_key", "speaker", "parent_type", "start_time", "end_time", "entities", "topic_tags",
+)
+# Per-file size/mtime/hash and chunk IDs already in the index
+MANIFEST_NAME = "manifest.json"
+# Serialises index writers in this process (rebuilds and background merges)
+_write_lock = threading.Lock()
 
 
 SCHEMA_FIELDS = {
@@ -15,72 +47,274 @@ SCHEMA_FIELDS = {
 
 
 def _schema():
-    from whoosh.fields import Schema, ID, TEXT, STORED, NUMERIC
+    from whoosh.fields import Schema, ID, TEXT, STORED, NUMERIC, KEYWORD
     return Schema(
         chunk_id=ID(stored=True, unique=True),
         text=TEXT(stored=True),
         source_id=ID(stored=True),
+        # Collapse key (see collapse.py); stored through the payload
+        source_key=ID,
+        # Filter-only fields (see filters.SearchFilters.to_whoosh)
+        speaker=ID,
+        parent_type=ID,
+        topic_tags=KEYWORD(commas=True),
         start_time=NUMERIC(float, stored=True),
         end_time=NUMERIC(float, stored=True),
         payload=STORED,
     )
 
 
-def rebuild_index(index_dir: Path = Path(BM25_INDEX_PATH), chunks_root: Path = Path(CHUNKS_ROOT)) -> int:
-    index_dir.mkdir(parents=True, exist_ok=True)
-    from whoosh import index
+def _chunk_files(chunks_root: Path) -> List[Path]:
+    """Arrow chunk-store files plus legacy per-file JSON dumps."""
+    files = sorted(chunks_root.rglob("*.arrow")) if read_records is not None else []
+    return files + sorted(chunks_root.rglob("*.json"))
 
-    if index.exists_in(str(index_dir)):
-        ix = index.open_dir(str(index_dir))
-        writer = ix.writer(limitmb=256)
-    else:
-        ix = index.create_in(str(index_dir), _schema())
-        writer = ix.writer(limitmb=256)
 
-    added = 0
-    for p in chunks_root.rglob("*.json"):
+def _read_chunks(path: Path) -> List[Dict[str, Any]]:
+    if path.suffix == ".arrow":
+        return read_records(path, INDEX_COLUMNS)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if not isinstance(data, list):
+        return []
+    return [c for c in data if isinstance(c, dict)]
+
+
+def _file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _load_manifest(index_dir: Path) -> Dict[str, Any]:
+    p = index_dir / MANIFEST_NAME
+    if p.exists():
         try:
-            data = json.loads(p.read_text(encoding="utf-8"))
-            if not isinstance(data, list):
-                continue
-            for c in data:
-                chunk_id = c.get("chunk_id")
-                text = c.get("text", "")
-                payload = {
-                    "chunk_id": chunk_id,
-                    "source_id": c.get("source_id"),
-                    "text": text,
-                    "start_time": c.get("start_time"),
-                    "end_time": c.get("end_time"),
-                    "entities": c.get("entities", []),
-                    "topic_tags": c.get("topic_tags", []),
-                }
-                writer.update_document(
-                    chunk_id=str(chunk_id),
-                    text=text,
-                    source_id=str(c.get("source_id")) if c.get("source_id") else "",
-                    start_time=float(c.get("start_time") or 0.0),
-                    end_time=float(c.get("end_time") or 0.0),
-                    payload=payload,
-                )
-                added += 1
+            return json.loads(p.read_text(encoding="utf-8"))
         except Exception:
-            continue
-    writer.commit()
-    return added
+            return {}
+    return {}
+
 
+def _save_manifest(index_dir: Path, manifest: Dict[str, Any]):
+    p = index_dir / MANIFEST_NAME
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, p)
 
-def lexical_search(query: str, top_k: int = TOP_K_LEXICAL, index_dir: Path = Path(BM25_INDEX_PATH)) -> List[Dict[str, Any]]:
+
+def _add_document(writer, c: Dict[str, Any]):
+    chunk_id = c.get("chunk_id")
+    text = c.get("text", "")
+    # Text is already a stored field; keeping it out of the payload halves stored bytes
+    payload = {
+        "chunk_id": chunk_id,
+        "source_id": c.get("source_id"),
+        "source_key": c.get("source_key"),
+        "speaker": c.get("speaker"),
+        "start_time": c.get("start_time"),
+        "end_time": c.get("end_time"),
+        "entities": c.get("entities", []),
+        "topic_tags": c.get("topic_tags", []),
+    }
+    writer.update_document(
+        chunk_id=str(chunk_id),
+        text=text,
+        source_id=str(c.get("source_id")) if c.get("source_id") else "",
+        source_key=str(c.get("source_key")) if c.get("source_key") else "",
+        speaker=str(c.get("speaker")) if c.get("speaker") else "",
+        parent_type=c.get("parent_type") or "transcript",
+        topic_tags=",".join(str(t) for t in c.get("topic_tags") or []),
+        start_time=float(c.get("start_time") or 0.0),
+        end_time=float(c.get("end_time") or 0.0),
+        payload=payload,
+    )
+
+
+def _merge_segments(index_dir: Path):
+    """Merge the small segments left by incremental commits, off the request path."""
     from whoosh import index
-    from whoosh.qparser import MultifieldParser
 
-    if not index.exists_in(str(index_dir)):
-        return []
-    ix = index.open_dir(str(index_dir))
-    with ix.searcher() as searcher:
-        parser = MultifieldParser(["text"], schema=ix.schema)
-        q = parser.parse(query)
-        results = searcher.search(q, limit=top_k)
+    with _write_lock:
+        try:
+            ix = index.open_dir(str(index_dir))
+            ix.writer(limitmb=256).commit(merge=True)
+        except Exception:
+            return
+    get_index(index_dir).invalidate()
+
+
+def rebuild_index(
+    index_dir: Path = Path(BM25_INDEX_PATH),
+    chunks_root: Path = Path(CHUNKS_ROOT),
+    full: bool = False,
+) -> Dict[str, int]:
+    """Bring the BM25 index in line with the chunk files under `chunks_root`.
+
+    A manifest in the index directory records each file's size, mtime, content hash and
+    chunk IDs. Unchanged files are skipped without being read, changed files have their
+    chunks re-added, and chunks of changed or removed files that no longer exist
+    anywhere are deleted. The commit skips merging; segments are merged in a background
+    thread so the rebuild returns as soon as new documents are searchable.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    from whoosh import index
+
+    with _write_lock:
+        ix = index.open_dir(str(index_dir)) if index.exists_in(str(index_dir)) else None
+        # Indexes written before a schema change (e.g. the filter fields) are rebuilt
+        if full or ix is None or set(_schema().names()) - set(ix.schema.names()):
+            ix = index.create_in(str(index_dir), _schema())
+            manifest: Dict[str, Any] = {}
+        else:
+            manifest = _load_manifest(index_dir)
+
+        stats = {"added": 0, "deleted": 0, "files_changed": 0, "files_skipped": 0, "files_removed": 0}
+        current: Dict[str, Any] = {}
+        changed: Dict[str, List[Dict[str, Any]]] = {}
+        for path in _chunk_files(chunks_root):
+            rel = str(path.relative_to(chunks_root))
+            st = path.stat()
+            entry = manifest.get(rel)
+            if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+                current[rel] = entry
+                stats["files_skipped"] += 1
+                continue
+            digest = _file_hash(path)
+            if entry and entry.get("hash") == digest:
+                current[rel] = {**entry, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                stats["files_skipped"] += 1
+                continue
+            try:
+                chunks = _read_chunks(path)
+            except Exception:
+                continue
+            changed[rel] = chunks
+            current[rel] = {
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "hash": digest,
+                "chunk_ids": [str(c.get("chunk_id")) for c in chunks],
+            }
+
+        # Chunk IDs are content-derived, so the same ID can live in several run_tags;
+        # only delete IDs that no current file still contains
+        dropped = set()
+        for rel, entry in manifest.items():
+            if rel not in current:
+                stats["files_removed"] += 1
+                dropped.update(entry.get("chunk_ids", []))
+            elif rel in changed:
+                dropped.update(entry.get("chunk_ids", []))
+        if dropped:
+            live = set()
+            for entry in current.values():
+                live.update(entry.get("chunk_ids", []))
+            dropped -= live
+
+        if not changed and not dropped:
+            _save_manifest(index_dir, current)
+            return stats
+
+        writer = ix.writer(limitmb=256)
+        for cid in dropped:
+            writer.delete_by_term("chunk_id", cid)
+        for chunks in changed.values():
+            for c in chunks:
+                _add_document(writer, c)
+        writer.commit(merge=False)
+        stats["deleted"] = len(dropped)
+        stats["added"] = sum(len(c) for c in changed.values())
+        stats["files_changed"] = len(changed)
+        _save_manifest(index_dir, current)
+
+    get_index(index_dir).invalidate()
+    threading.Thread(target=_merge_segments, args=(index_dir,), daemon=True).start()
+    return stats
+
+
+class LexicalIndex:
+    """Long-lived handle on one Whoosh index.
+
+    The index and query parser are opened once; each thread keeps its own searcher and
+    refreshes it only when the index generation moves (after `/rebuild-index` in this
+    process, or at most every `refresh_seconds` for writers elsewhere). Parsed queries
+    are memoised so repeated terms skip the parser entirely.
+    """
+
+    def __init__(self, index_dir: Path, refresh_seconds: float = BM25_REFRESH_SECONDS, parse_cache: int = 1024):
+        self.index_dir = Path(index_dir)
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._ix = None
+        self._parser = None
+        self._generation = -1
+        self._checked = 0.0
+        self._local = threading.local()
+        self._parse = lru_cache(maxsize=parse_cache)(self._parse_uncached)
+
+    def _open(self):
+        if self._ix is not None:
+            return self._ix
+        from whoosh import index
+        from whoosh.qparser import MultifieldParser
+
+        with self._lock:
+            if self._ix is None and index.exists_in(str(self.index_dir)):
+                ix = index.open_dir(str(self.index_dir))
+                self._parser = MultifieldParser(["text"], schema=ix.schema)
+                self._generation = ix.latest_generation()
+                self._checked = time.monotonic()
+                self._ix = ix
+        return self._ix
+
+    def _parse_uncached(self, query: str):
+        return self._parser.parse(query)
+
+    def generation(self) -> int:
+        if self._open() is None:
+            return -1
+        now = time.monotonic()
+        if now - self._checked >= self.refresh_seconds:
+            self._checked = now
+            try:
+                self._generation = self._ix.latest_generation()
+            except Exception:
+                pass
+        return self._generation
+
+    def invalidate(self):
+        """Force the next search to re-check the generation (call after a rebuild)."""
+        self._checked = 0.0
+
+    def searcher(self):
+        ix = self._open()
+        if ix is None:
+            return None
+        gen = self.generation()
+        local = self._local
+        s = getattr(local, "searcher", None)
+        if s is None:
+            local.searcher, local.generation = ix.searcher(), gen
+        elif local.generation != gen:
+            local.searcher, local.generation = s.refresh(), gen
+        return local.searcher
+
+    def search(self, query: str, top_k: int = TOP_K_LEXICAL, filters=None) -> List[Dict[str, Any]]:
+        return self.search_many([query], top_k=top_k, filters=filters)[0]
+
+    def search_many(self, queries: List[str], top_k: int = TOP_K_LEXICAL, filters=None) -> List[List[Dict[str, Any]]]:
+        """Search `queries` on one searcher, checking the generation once."""
+        searcher = self.searcher()
+        if searcher is None:
+            return [[] for _ in queries]
+        # The filter restricts collection itself, so top-k is exact within the filtered set
+        restrict = filters.to_whoosh() if filters is not None else None
+        return [self._search_on(searcher, q, top_k, restrict) for q in queries]
+
+    def _search_on(self, searcher, query: str, top_k: int, restrict) -> List[Dict[str, Any]]:
+        results = searcher.search(self._parse(query), limit=top_k, filter=restrict)
         out: List[Dict[str, Any]] = []
         for r in results:
             payload = r.get("payload") or {}
@@ -88,6 +322,8 @@ def lexical_search(query: str, top_k: int = TOP_K_LEXICAL, index_dir: Path = Pat
                 "chunk_id": payload.get("chunk_id") or r["chunk_id"],
                 "score": float(r.score) if r.score is not None else None,
                 "source_id": payload.get("source_id"),
+                "source_key": payload.get("source_key"),
+                "speaker": payload.get("speaker"),
                 "text": payload.get("text") or r.get("text", ""),
                 "start_time": payload.get("start_time"),
                 "end_time": payload.get("end_time"),
@@ -96,3 +332,105 @@ def lexical_search(query: str, top_k: int = TOP_K_LEXICAL, index_dir: Path = Pat
                 "provenance": "bm25",
             })
         return out
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(index_dir: Path = Path(BM25_INDEX_PATH)) -> LexicalIndex:
+    key = str(index_dir)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = LexicalIndex(index_dir)
+        return _indexes[key]
+
+
+def _fingerprint(chunks_root: Path) -> str:
+    # The column list is included so a layout change forces a rebuild
+    h = hashlib.sha256(",".join(SPARSE_COLUMNS).encode("utf-8"))
+    for path in _chunk_files(chunks_root):
+        st = path.stat()
+        h.update(f"{path.relative_to(chunks_root)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def rebuild_sparse_index(
+    index_dir: Path = Path(SPARSE_BM25_PATH),
+    chunks_root: Path = Path(CHUNKS_ROOT),
+    full: bool = False,
+) -> Dict[str, Any]:
+    """Rebuild the CSR index when the chunk files changed since the last build.
+
+    The matrix is rebuilt as a whole (IDF and average length move with every change);
+    a file-list fingerprint makes a rebuild with nothing new a no-op.
+    """
+    index_dir.mkdir(parents=True, exist_ok=True)
+    fingerprint = _fingerprint(chunks_root)
+    marker = index_dir / "fingerprint"
+    with _write_lock:
+        if not full and marker.exists() and marker.read_text(encoding="utf-8") == fingerprint:
+            return {"engine": "sparse", "skipped": True}
+
+        def chunks():
+            for path in _chunk_files(chunks_root):
+                try:
+                    yield from _read_chunks(path)
+                except Exception:
+                    continue
+
+        stats = build_sparse_index(index_dir, chunks(), k1=BM25_K1, b=BM25_B)
+        marker.write_text(fingerprint, encoding="utf-8")
+    get_sparse_index(index_dir).invalidate()
+    return {"engine": "sparse", "skipped": False, **stats}
+
+
+_sparse: Dict[str, SparseBM25Index] = {}
+
+
+def get_sparse_index(index_dir: Path = Path(SPARSE_BM25_PATH)) -> SparseBM25Index:
+    key = str(index_dir)
+    with _indexes_lock:
+        if key not in _sparse:
+            _sparse[key] = SparseBM25Index(index_dir, refresh_seconds=BM25_REFRESH_SECONDS)
+        return _sparse[key]
+
+
+def rebuild_lexical(full: bool = False) -> Dict[str, Any]:
+    """Rebuild whichever engine LEXICAL_ENGINE selects."""
+    if LEXICAL_ENGINE == "sparse":
+        return rebuild_sparse_index(Path(SPARSE_BM25_PATH), Path(CHUNKS_ROOT), full)
+    return rebuild_index(Path(BM25_INDEX_PATH), Path(CHUNKS_ROOT), full)
+
+
+def lexical_generation():
+    if LEXICAL_ENGINE == "sparse":
+        return get_sparse_index().generation()
+    return get_index().generation()
+
+
+def _engine(index_dir: Path = None):
+    if LEXICAL_ENGINE == "sparse":
+        return get_sparse_index(index_dir or Path(SPARSE_BM25_PATH))
+    return get_index(index_dir or Path(BM25_INDEX_PATH))
+
+
+def lexical_search(
+    query: str,
+    top_k: int = TOP_K_LEXICAL,
+    index_dir: Path = None,
+    filters=None,
+) -> List[Dict[str, Any]]:
+    with stage("lexical"):
+        return _engine(index_dir).search(query, top_k=top_k, filters=filters)
+
+
+def lexical_search_batch(
+    queries: List[str],
+    top_k: int = TOP_K_LEXICAL,
+    index_dir: Path = None,
+    filters=None,
+) -> List[List[Dict[str, Any]]]:
+    """Run `queries` back to back on this thread's searcher (one generation check)."""
+    with stage("lexical"):
+        return _engine(index_dir).search_many(queries, top_k=top_k, filters=filters)
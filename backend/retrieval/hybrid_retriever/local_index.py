@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from filters import FilterableDocs
+
+try:
+    from common.chunk_store import chunk_files, read_table
+except ImportError:  # backend/common not mounted into this image
+    chunk_files = read_table = None
+
+# In-process vector index for running without Qdrant (laptops, CI) and for failover.
+# One version directory per build, switched through an atomic CURRENT pointer:
+#   vectors.npy  (N, dim) float32, L2-normalised, memory-mapped at load
+#   docs.arrow   one row per vector ordinal (chunk fields returned with hits)
+#   hnsw.bin     optional hnswlib graph for corpora above `hnsw_min` points
+# Small corpora are searched exactly with one mat-vec over the mapped array.
+
+CURRENT = "CURRENT"
+DOC_COLUMNS = (
+    "chunk_id", "text", "source_id", "source_key", "speaker", "parent_type", "start_time", "end_time",
+    "entities", "topic_tags", "aliases",
+)
+# Below this many (candidate) points exact search is fast enough and needs no graph
+EXACT_MAX = 50000
+_STORE_COLUMNS = (
+    "chunk_id", "text", "source_id", "source_key", "speaker", "parent_type", "start_time", "end_time", "entities", "topic_tags",
+)
+
+
+def _iter_store(chunks_root: Path) -> Iterator[Dict[str, Any]]:
+    """Chunks from the Arrow and JSON files under `chunks_root`."""
+    root = Path(chunks_root)
+    if chunk_files is not None:
+        for path in chunk_files(root):
+            try:
+                table = read_table(path, _STORE_COLUMNS)
+            except Exception:
+                continue
+            for row in table.to_pylist():
+                for name in ("entities", "topic_tags"):
+                    if isinstance(row.get(name), str):
+                        row[name] = json.loads(row[name])
+                yield row
+    for path in sorted(root.rglob("*.json")) if root.exists() else []:
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            continue
+        for c in data if isinstance(data, list) else []:
+            if isinstance(c, dict):
+                yield c
+
+
+def fingerprint(chunks_root: Path) -> str:
+    root = Path(chunks_root)
+    h = hashlib.sha256(",".join(DOC_COLUMNS).encode("utf-8"))
+    paths = (chunk_files(root) if chunk_files is not None else []) + (sorted(root.rglob("*.json")) if root.exists() else [])
+    for path in paths:
+        st = path.stat()
+        h.update(f"{path.relative_to(root)}\0{st.st_size}\0{st.st_mtime_ns}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_index(
+    out_root: Path,
+    chunks_root: Path,
+    qdrant=None,
+    collection: Optional[str] = None,
+    encode: Optional[Callable[[List[str]], Any]] = None,
+    hnsw_min: int = EXACT_MAX,
+    batch_size: int = 256,
+) -> Dict[str, Any]:
+    """Build a new version from the chunk store and make it current.
+
+    Vectors come from a Qdrant scroll (if a client is given), and the rest are encoded
+    with `encode`, which in the retriever goes through the shared embedding cache that
+    chunking populated.
+    """
+    import pyarrow as pa
+
+    out_root = Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    docs: Dict[str, List[Any]] = {c: [] for c in DOC_COLUMNS}
+    position: Dict[str, int] = {}
+    for c in _iter_store(chunks_root):
+        cid = str(c.get("chunk_id"))
+        if cid in position:
+            continue
+        position[cid] = len(position)
+        docs["chunk_id"].append(cid)
+        docs["text"].append(c.get("text") or "")
+        docs["source_id"].append(str(c["source_id"]) if c.get("source_id") else None)
+        docs["source_key"].append(str(c["source_key"]) if c.get("source_key") else None)
+        docs["speaker"].append(str(c["speaker"]) if c.get("speaker") else None)
+        docs["parent_type"].append(c.get("parent_type") or "transcript")
+        docs["start_time"].append(c.get("start_time"))
+        docs["end_time"].append(c.get("end_time"))
+        docs["entities"].append(json.dumps(c.get("entities", [])))
+        docs["topic_tags"].append(json.dumps(c.get("topic_tags", [])))
+        docs["aliases"].append("[]")
+
+    n = len(position)
+    dim = None
+    if qdrant is not None and collection:
+        try:
+            dim = qdrant.get_collection(collection).config.params.vectors.size
+        except Exception:
+            qdrant = None
+    if dim is None and n and encode is not None:
+        dim = int(np.asarray(encode([docs["text"][0]])[0]).shape[-1])
+    if dim is None:
+        dim = 0
+
+    version = f"v{time.time_ns()}"
+    vdir = out_root / version
+    vdir.mkdir()
+    vectors = np.lib.format.open_memmap(vdir / "vectors.npy", mode="w+", dtype=np.float32, shape=(n, dim))
+    filled = np.zeros(n, dtype=bool)
+    counts = {"qdrant": 0, "encoded": 0}
+
+    if qdrant is not None and collection and not filled.all():
+        offset = None
+        while True:
+            points, offset = qdrant.scroll(
+                collection_name=collection, limit=batch_size, offset=offset,
+                with_payload=["chunk_id", "aliases"], with_vectors=True,
+            )
+            for p in points:
+                i = position.get(str((p.payload or {}).get("chunk_id") or p.id))
+                if i is None:
+                    continue
+                if not filled[i]:
+                    vectors[i] = p.vector
+                    filled[i] = True
+                    counts["qdrant"] += 1
+                docs["aliases"][i] = json.dumps((p.payload or {}).get("aliases") or [])
+            if offset is None:
+                break
+
+    missing = np.flatnonzero(~filled)
+    if len(missing) and encode is None:
+        raise RuntimeError(f"{len(missing)} chunks have no vector and no encoder was given")
+    for start in range(0, len(missing), batch_size):
+        idx = missing[start:start + batch_size]
+        vectors[idx] = np.asarray(encode([docs["text"][i] for i in idx]), dtype=np.float32)
+        counts["encoded"] += len(idx)
+
+    for start in range(0, n, 65536):
+        block = vectors[start:start + 65536]
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block /= np.where(norms > 0, norms, 1.0)
+    vectors.flush()
+
+    hnsw = False
+    if n >= hnsw_min and dim:
+        try:
+            import hnswlib
+            graph = hnswlib.Index(space="ip", dim=dim)
+            graph.init_index(max_elements=n, ef_construction=200, M=16)
+            for start in range(0, n, 65536):
+                graph.add_items(np.asarray(vectors[start:start + 65536]), np.arange(start, min(n, start + 65536)))
+            graph.save_index(str(vdir / "hnsw.bin"))
+            hnsw = True
+        except ImportError:
+            pass
+    del vectors
+
+    table = pa.table({
+        "chunk_id": pa.array(docs["chunk_id"], type=pa.string()),
+        "text": pa.array(docs["text"], type=pa.large_string()),
+        "source_id": pa.array(docs["source_id"], type=pa.string()),
+        "source_key": pa.array(docs["source_key"], type=pa.string()),
+        "speaker": pa.array(docs["speaker"], type=pa.string()),
+        "parent_type": pa.array(docs["parent_type"], type=pa.string()),
+        "start_time": pa.array(docs["start_time"], type=pa.float64()),
+        "end_time": pa.array(docs["end_time"], type=pa.float64()),
+        "entities": pa.array(docs["entities"], type=pa.string()),
+        "topic_tags": pa.array(docs["topic_tags"], type=pa.string()),
+        "aliases": pa.array(docs["aliases"], type=pa.string()),
+    })
+    with pa.OSFile(str(vdir / "docs.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    meta = {"points": n, "dim": dim, "hnsw": hnsw, "vectors_from": counts}
+    (vdir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    tmp = out_root / f"{CURRENT}.tmp"
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, out_root / CURRENT)
+    versions = sorted(p for p in out_root.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for old in versions[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+    return {"version": version, **meta}
+
+
+class _Loaded:
+    def __init__(self, vdir: Path):
+        import pyarrow as pa
+
+        self.version = vdir.name
+        self.meta = json.loads((vdir / "meta.json").read_text(encoding="utf-8"))
+        self.vectors = np.load(vdir / "vectors.npy", mmap_mode="r")
+        with pa.memory_map(str(vdir / "docs.arrow"), "r") as source:
+            self.docs = pa.ipc.open_file(source).read_all()
+        self.filterable = FilterableDocs(self.docs)
+        self.graph = None
+        if self.meta.get("hnsw") and (vdir / "hnsw.bin").exists():
+            try:
+                import hnswlib
+                graph = hnswlib.Index(space="ip", dim=self.meta["dim"])
+                graph.load_index(str(vdir / "hnsw.bin"), max_elements=self.meta["points"])
+                graph.set_ef(128)
+                self.graph = graph
+            except ImportError:
+                pass
+
+
+class LocalVectorIndex:
+    """Reader for the current version; reloads when CURRENT changes."""
+
+    def __init__(self, root: Path, refresh_seconds: float = 5.0, provenance: str = "local"):
+        self.root = Path(root)
+        self.refresh_seconds = refresh_seconds
+        self.provenance = provenance
+        self._loaded: Optional[_Loaded] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _get(self) -> Optional[_Loaded]:
+        now = time.monotonic()
+        if self._loaded is not None and now - self._checked < self.refresh_seconds:
+            return self._loaded
+        with self._lock:
+            self._checked = now
+            try:
+                version = (self.root / CURRENT).read_text(encoding="utf-8").strip()
+            except OSError:
+                version = None
+            if version and (self._loaded is None or self._loaded.version != version):
+                try:
+                    self._loaded = _Loaded(self.root / version)
+                except Exception:
+                    pass
+        return self._loaded
+
+    def invalidate(self):
+        self._checked = 0.0
+
+    def available(self) -> bool:
+        ix = self._get()
+        return ix is not None and ix.meta.get("points", 0) > 0
+
+    def info(self) -> Dict[str, Any]:
+        ix = self._get()
+        return {"version": ix.version, **ix.meta} if ix is not None else {}
+
+    def _exact(self, ix: _Loaded, qvec: np.ndarray, top_k: int, mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        if mask is None:
+            ids = None
+            scores = ix.vectors @ qvec
+        else:
+            ids = np.flatnonzero(mask)
+            scores = ix.vectors[ids] @ qvec
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return (ids[top] if ids is not None else top), scores[top]
+
+    def search(self, qvec, top_k: int = 20, filters=None) -> List[Dict[str, Any]]:
+        ix = self._get()
+        if ix is None or not ix.meta.get("points"):
+            return []
+        q = np.asarray(qvec, dtype=np.float32).reshape(-1)
+        q = q / (np.linalg.norm(q) or 1.0)
+        mask = ix.filterable.mask(filters) if filters is not None and not filters.is_empty() else None
+        if ix.graph is not None and (mask is None or mask.sum() > EXACT_MAX):
+            k = min(top_k, ix.meta["points"])
+            keep = (lambda i: bool(mask[i])) if mask is not None else None
+            labels, distances = ix.graph.knn_query(q, k=k, filter=keep)
+            ids, scores = labels[0].astype(np.int64), 1.0 - distances[0]
+        else:
+            # Exact over the mapped vectors; also used for selective filters, where the
+            # masked subset is small and exact search beats a filtered graph walk
+            ids, scores = self._exact(ix, q, top_k, mask)
+
+        rows = ix.docs.take(ids).to_pylist()
+        out: List[Dict[str, Any]] = []
+        for score, row in zip(scores, rows):
+            out.append({
+                "chunk_id": row["chunk_id"],
+                "score": float(score),
+                "source_id": row["source_id"],
+                # Versions built before these columns existed lack them
+                "source_key": row.get("source_key"),
+                "speaker": row.get("speaker"),
+                "text": row["text"] or "",
+                "start_time": row["start_time"],
+                "end_time": row["end_time"],
+                "entities": json.loads(row["entities"] or "[]"),
+                "topic_tags": json.loads(row["topic_tags"] or "[]"),
+                "aliases": json.loads(row["aliases"] or "[]"),
+                "provenance": self.provenance,
+            })
+        return out
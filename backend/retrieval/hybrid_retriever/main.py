@@ -1,6 +1,15 @@
-from typing import List, Dict, Any
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, Query
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 from dotenv import load_dotenv
 import os
 from pathlib import Path
@@ -9,18 +18,124 @@ load_dotenv()
 
 from config import (
     VECTOR_WEIGHT, LEXICAL_WEIGHT, TOP_K_VECTOR, TOP_K_LEXICAL,
-    BM25_INDEX_PATH, CHUNKS_ROOT
+    BM25_INDEX_PATH, SPARSE_BM25_PATH, LEXICAL_ENGINE, SEARCH_WORKERS, SEARCH_BATCH_MAX, VECTOR_BACKEND,
+    COLLAPSE_OVERLAPS, COLLAPSE_GAP_SECONDS, MAX_PER_SOURCE,
+    RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_REDIS_URL, RESULT_CACHE_VERSION_SECONDS,
+    SERVER_TIMING,
+)
+from vector import (
+    vector_search, vector_search_batch, provision_collection, rebuild_local_index, warmup, prewarm_query_cache, query_cache, collection_version,
+    status as vector_status,
+)
+from lexical import lexical_search, lexical_search_batch, rebuild_lexical, lexical_generation
+from result_cache import ResultCache, make_backend
+from filters import SearchFilters
+from collapse import collapse_overlaps
+from metrics import (
+    begin_request, observe_results, record, registry, retrieval_latency, server_timing, stage,
 )
-from vector import vector_search
-from lexical import lexical_search, rebuild_index
 
 app = FastAPI(title="CIRS Hybrid Retriever", version="0.1.0")
+logger = logging.getLogger(__name__)
+
+
+def _corpus_version() -> Dict[str, Any]:
+    return {**collection_version(), "bm25": lexical_generation()}
+
+
+result_cache = ResultCache(
+    make_backend(RESULT_CACHE_REDIS_URL, RESULT_CACHE_SIZE, RESULT_CACHE_TTL_SECONDS),
+    _corpus_version,
+    version_ttl_seconds=RESULT_CACHE_VERSION_SECONDS,
+)
+
+
+class _QueryCacheCollector:
+    """Reads the query-embedding cache counters at scrape time."""
+
+    def collect(self):
+        hits = CounterMetricFamily("retriever_query_cache_hits", "Query embeddings served from the LRU")
+        hits.add_metric([], query_cache.hits)
+        misses = CounterMetricFamily("retriever_query_cache_misses", "Query embeddings that had to be computed")
+        misses.add_metric([], query_cache.misses)
+        size = GaugeMetricFamily("retriever_query_cache_entries", "Entries currently in the query LRU")
+        size.add_metric([], len(query_cache))
+        r_hits = CounterMetricFamily("retriever_result_cache_hits", "Searches answered from the result cache")
+        r_hits.add_metric([], result_cache.hits)
+        r_misses = CounterMetricFamily("retriever_result_cache_misses", "Searches computed and stored in the result cache")
+        r_misses.add_metric([], result_cache.misses)
+        yield from (hits, misses, size, r_hits, r_misses)
+
+
+registry.register(_QueryCacheCollector())
+
+_provisioning: Dict[str, Any] = {}
+# Blocking retrieval legs run here so the event loop keeps serving other requests
+_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+# Result-cache writes happen after the response is built; a slow or down Redis must not
+# hold up the search workers
+_cache_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="result-cache")
 
 
 class SearchResponse(BaseModel):
     query: str
     mode: str
     results: List[Dict[str, Any]]
+    timings: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    mode: str = Field("hybrid", pattern="^(vector|lexical|hybrid)$")
+    filters: Optional[SearchFilters] = None
+    collapse: bool = COLLAPSE_OVERLAPS
+    max_per_source: int = Field(MAX_PER_SOURCE, ge=0)
+    debug: bool = False
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResponse]
+    timings: Optional[Dict[str, Any]] = None
+
+
+def _submit(loop, fn, *args, **kwargs):
+    """Run `fn` on the search executor inside a copy of the request context, so stage
+    timings recorded in the worker thread land in this request's breakdown."""
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return loop.run_in_executor(_executor, call)
+
+
+def _store_results(entries: List[tuple]):
+    """Write (key, ranked) pairs to the result cache in the background, logging failures."""
+
+    def put_all():
+        for key, ranked in entries:
+            result_cache.put(key, ranked)
+
+    def done(future):
+        if future.exception() is not None:
+            logger.warning("result cache write of %d entries failed", len(entries), exc_info=future.exception())
+
+    if entries:
+        _cache_writer.submit(put_all).add_done_callback(done)
+
+
+def _finish(start: float, endpoint_total: bool = True) -> float:
+    total = (time.perf_counter() - start) * 1000.0
+    record("total", total)
+    if endpoint_total:
+        retrieval_latency.labels(service="hybrid_retriever").observe(total)
+    return total
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, (time.perf_counter() - start) * 1000.0
+
+
+async def _none():
+    return [], 0.0
 
 
 def _rrf(results: List[Dict[str, Any]]) -> Dict[str, float]:
@@ -55,35 +170,237 @@ def _weighted_merge(vec: List[Dict[str, Any]], lex: List[Dict[str, Any]], alpha:
     return [{**payload[i], "score": by_id[i]} for i in ranked]
 
 
-@app.get("/search", response_model=SearchResponse)
-async def search(q: str = Query(..., min_length=1), mode: str = Query("hybrid", pattern="^(vector|lexical|hybrid)$")):
-    vec_res: List[Dict[str, Any]] = []
-    lex_res: List[Dict[str, Any]] = []
-
-    if mode in ("vector", "hybrid"):
-        vec_res = vector_search(q, top_k=TOP_K_VECTOR)
-    if mode in ("lexical", "hybrid"):
-        lex_res = lexical_search(q, top_k=TOP_K_LEXICAL)
-
+def _fuse(
+    mode: str,
+    vec: List[Dict[str, Any]],
+    lex: List[Dict[str, Any]],
+    collapse: bool = COLLAPSE_OVERLAPS,
+    max_per_source: int = MAX_PER_SOURCE,
+) -> List[Dict[str, Any]]:
     if mode == "vector":
-        ranked = vec_res
+        ranked = vec
     elif mode == "lexical":
-        ranked = lex_res
+        ranked = lex
     else:
-        ranked = _weighted_merge(vec_res, lex_res, alpha=VECTOR_WEIGHT)
+        ranked = _weighted_merge(vec, lex, alpha=VECTOR_WEIGHT)
+    if collapse or max_per_source > 0:
+        ranked = collapse_overlaps(
+            ranked, max_per_source=max_per_source, gap_seconds=COLLAPSE_GAP_SECONDS, merge=collapse
+        )
+    return ranked
+
+
+def _cache_lookup(
+    q: str,
+    mode: str,
+    filters: Optional[SearchFilters] = None,
+    collapse: bool = COLLAPSE_OVERLAPS,
+    max_per_source: int = MAX_PER_SOURCE,
+):
+    key = result_cache.key(
+        q, mode=mode, vw=VECTOR_WEIGHT, lw=LEXICAL_WEIGHT, kv=TOP_K_VECTOR, kl=TOP_K_LEXICAL,
+        filters=filters.cache_params() if filters is not None else None,
+        collapse=[collapse, max_per_source, COLLAPSE_GAP_SECONDS],
+    )
+    return key, result_cache.get(key)
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    mode: str = Query("hybrid", pattern="^(vector|lexical|hybrid)$"),
+    source_id: Optional[List[str]] = Query(None),
+    speaker: Optional[List[str]] = Query(None),
+    topic_tags: Optional[List[str]] = Query(None),
+    parent_type: Optional[List[str]] = Query(None),
+    time_from: Optional[float] = Query(None, description="Keep chunks ending at or after this (seconds)"),
+    time_to: Optional[float] = Query(None, description="Keep chunks starting at or before this (seconds)"),
+    collapse: bool = Query(COLLAPSE_OVERLAPS, description="Merge overlapping hits of one source and speaker into one span"),
+    max_per_source: int = Query(MAX_PER_SOURCE, ge=0, description="Cap on results per source (0 = none)"),
+    debug: bool = Query(False),
+):
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    breakdown = begin_request("search")
+    filters = SearchFilters(
+        source_id=source_id, speaker=speaker, topic_tags=topic_tags, parent_type=parent_type,
+        time_from=time_from, time_to=time_to,
+    )
+    filters = None if filters.is_empty() else filters
+    # Key computation may re-read the corpus version (a Qdrant call), so keep it off the loop
+    cache_key, cached = await loop.run_in_executor(_executor, _cache_lookup, q, mode, filters, collapse, max_per_source)
+    if cached is not None:
+        total = _finish(start)
+        observe_results(mode, cached, cached=True)
+        if SERVER_TIMING or debug:
+            response.headers["Server-Timing"] = server_timing(breakdown, cached=True)
+        timings = {"cache_hit": True, "total_ms": round(total, 3)} if debug else None
+        return SearchResponse(query=q, mode=mode, results=cached, timings=timings)
+
+    vec_leg = (
+        _submit(loop, _timed, vector_search, q, top_k=TOP_K_VECTOR, filters=filters)
+        if mode in ("vector", "hybrid") else _none()
+    )
+    lex_leg = (
+        _submit(loop, _timed, lexical_search, q, top_k=TOP_K_LEXICAL, filters=filters)
+        if mode in ("lexical", "hybrid") else _none()
+    )
+    (vec_res, vec_ms), (lex_res, lex_ms) = await asyncio.gather(vec_leg, lex_leg)
+
+    merge_start = time.perf_counter()
+    with stage("fusion"):
+        ranked = _fuse(mode, vec_res, lex_res, collapse, max_per_source)
+    merge_end = time.perf_counter()
+    total = _finish(start)
+    observe_results(mode, ranked, cached=False)
+    if SERVER_TIMING or debug:
+        response.headers["Server-Timing"] = server_timing(breakdown)
+    _store_results([(cache_key, ranked)])
+
+    timings = None
+    if debug:
+        timings = {
+            "vector_ms": round(vec_ms, 3),
+            "lexical_ms": round(lex_ms, 3),
+            "merge_ms": round((merge_end - merge_start) * 1000.0, 3),
+            "total_ms": round(total, 3),
+            "stages": {name: round(ms, 3) for name, ms in breakdown.items()},
+        }
+    return SearchResponse(query=q, mode=mode, results=ranked, timings=timings)
+
+
+@app.post("/search/batch", response_model=BatchSearchResponse)
+async def search_batch(req: BatchSearchRequest, response: Response):
+    """Many queries in one call: cached ones are answered directly, the rest share one
+    encoder call, one Qdrant batch request and one lexical searcher, and each query is
+    fused independently exactly as /search would."""
+    if len(req.queries) > SEARCH_BATCH_MAX:
+        return JSONResponse(
+            status_code=413, content={"detail": f"at most {SEARCH_BATCH_MAX} queries per batch"}
+        )
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    breakdown = begin_request("batch")
+    mode = req.mode
+    filters = None if req.filters is None or req.filters.is_empty() else req.filters
 
-    return SearchResponse(query=q, mode=mode, results=ranked)
+    def lookups():
+        return [_cache_lookup(q, mode, filters, req.collapse, req.max_per_source) for q in req.queries]
+
+    cached = await loop.run_in_executor(_executor, lookups)
+    misses = [i for i, (_, hit) in enumerate(cached) if hit is None]
+    pending = list(dict.fromkeys(req.queries[i] for i in misses))
+
+    vec_leg = (
+        _submit(loop, _timed, vector_search_batch, pending, top_k=TOP_K_VECTOR, filters=filters)
+        if pending and mode in ("vector", "hybrid") else _none()
+    )
+    lex_leg = (
+        _submit(loop, _timed, lexical_search_batch, pending, top_k=TOP_K_LEXICAL, filters=filters)
+        if pending and mode in ("lexical", "hybrid") else _none()
+    )
+    (vec_res, vec_ms), (lex_res, lex_ms) = await asyncio.gather(vec_leg, lex_leg)
+
+    merge_start = time.perf_counter()
+    fused: Dict[str, List[Dict[str, Any]]] = {}
+    with stage("fusion"):
+        for j, q in enumerate(pending):
+            fused[q] = _fuse(
+                mode, vec_res[j] if vec_res else [], lex_res[j] if lex_res else [], req.collapse, req.max_per_source
+            )
+    merge_end = time.perf_counter()
+    results = []
+    fresh = []
+    for i, q in enumerate(req.queries):
+        key, hit = cached[i]
+        ranked = hit if hit is not None else fused[q]
+        if hit is None:
+            fresh.append((key, ranked))
+        observe_results(mode, ranked, cached=hit is not None)
+        results.append(SearchResponse(query=q, mode=mode, results=ranked))
+    # Per-batch total; retrieval_latency_ms stays a per-query (/search) distribution
+    total = _finish(start, endpoint_total=False)
+    if SERVER_TIMING or req.debug:
+        response.headers["Server-Timing"] = server_timing(breakdown)
+    _store_results(fresh)
+
+    timings = None
+    if req.debug:
+        timings = {
+            "queries": len(req.queries),
+            "cache_hits": len(req.queries) - len(misses),
+            "vector_ms": round(vec_ms, 3),
+            "lexical_ms": round(lex_ms, 3),
+            "merge_ms": round((merge_end - merge_start) * 1000.0, 3),
+            "total_ms": round(total, 3),
+            "stages": {name: round(ms, 3) for name, ms in breakdown.items()},
+        }
+    return BatchSearchResponse(results=results, timings=timings)
 
 
 @app.post("/rebuild-index")
-async def rebuild():
-    added = rebuild_index(Path(BM25_INDEX_PATH), Path(CHUNKS_ROOT))
-    return {"ok": True, "added": added, "index": BM25_INDEX_PATH}
+async def rebuild(full: bool = Query(False)):
+    loop = asyncio.get_running_loop()
+    stats = await loop.run_in_executor(_executor, rebuild_lexical, full)
+    if VECTOR_BACKEND != "qdrant":
+        stats["local_vectors"] = await loop.run_in_executor(_executor, rebuild_local_index, full)
+    result_cache.invalidate()
+    index = SPARSE_BM25_PATH if LEXICAL_ENGINE == "sparse" else BM25_INDEX_PATH
+    return {"ok": True, **stats, "index": index}
+
+
+def _startup_sync():
+    # Qdrant may still be starting; a failed reconcile must not keep search down
+    try:
+        _provisioning.update(provision_collection())
+    except Exception as e:
+        _provisioning.update({"error": str(e)})
+    # Local-only deployments (laptops, CI) search nothing else, so build before warmup
+    if VECTOR_BACKEND == "local":
+        _sync_local_index()
+    warmup()
+    try:
+        prewarm_query_cache()
+    except Exception:
+        pass
+    # Auto mode fails over to the local index; build it once Qdrant search is warm
+    if VECTOR_BACKEND == "auto":
+        _sync_local_index()
+
+
+def _sync_local_index():
+    """Build or refresh the local vector index (skipped when the chunk store is unchanged)."""
+    try:
+        rebuild_local_index()
+    except Exception as e:
+        _provisioning.update({"local_index_error": str(e)})
+
+
+@app.on_event("startup")
+async def startup():
+    # Load and warm in the background so /health answers while the model loads
+    loop = asyncio.get_running_loop()
+    app.state.warmup = loop.run_in_executor(None, _startup_sync)
 
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {"ok": True, "vector": vector_status(), "provisioning": _provisioning}
+
+
+@app.get("/metrics")
+async def metrics():
+    data = generate_latest(registry)
+    return Response(content=data, media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/ready")
+async def ready():
+    st = vector_status()
+    if not st.get("ready"):
+        return JSONResponse(status_code=503, content={"ready": False, "error": st.get("error")})
+    return {"ready": True}
 
 
 if __name__ == "__main__":
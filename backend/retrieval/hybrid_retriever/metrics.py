@@ -0,0 +1,73 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+# Retriever metrics, served on /metrics. Stage timings go both to Prometheus and, via a
+# context variable, to the current request's breakdown (debug timings and the optional
+# Server-Timing header). Work submitted to the search executor must run in a copy of
+# the request context (see main._submit) for its stages to reach the breakdown.
+
+registry = CollectorRegistry()
+
+_LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+stage_latency = Histogram(
+    "retriever_stage_latency_ms",
+    "Retriever stage latency in milliseconds (encode, vector_search, lexical, fusion, total)",
+    ["endpoint", "stage"],
+    buckets=_LATENCY_BUCKETS_MS,
+    registry=registry,
+)
+# Same metric the monitoring service defines, so existing dashboards pick the retriever up
+retrieval_latency = Histogram(
+    "retrieval_latency_ms", "Retrieval latency in milliseconds", ["service"],
+    buckets=_LATENCY_BUCKETS_MS, registry=registry,
+)
+searches = Counter("retriever_searches", "Queries served", ["endpoint", "mode", "cache"], registry=registry)
+results_returned = Counter("retriever_results_returned", "Results returned across queries", ["mode"], registry=registry)
+empty_results = Counter("retriever_empty_results", "Queries that returned no results", ["mode"], registry=registry)
+
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("retriever_timings", default=None)
+_endpoint: ContextVar[str] = ContextVar("retriever_endpoint", default="search")
+
+
+def begin_request(endpoint: str) -> Dict[str, float]:
+    """Start collecting stage timings for the current request; returns the breakdown."""
+    timings: Dict[str, float] = {}
+    _timings.set(timings)
+    _endpoint.set(endpoint)
+    return timings
+
+
+def record(name: str, ms: float):
+    stage_latency.labels(endpoint=_endpoint.get(), stage=name).observe(ms)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + ms
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - start) * 1000.0)
+
+
+def observe_results(mode: str, results: List[Any], cached: bool):
+    searches.labels(endpoint=_endpoint.get(), mode=mode, cache="hit" if cached else "miss").inc()
+    results_returned.labels(mode=mode).inc(len(results))
+    if not results:
+        empty_results.labels(mode=mode).inc()
+
+
+def server_timing(timings: Dict[str, float], cached: bool = False) -> str:
+    """Server-Timing header value, e.g. `encode;dur=3.1, vector_search;dur=8.0, total;dur=14.2`."""
+    parts = [f"{name};dur={ms:.1f}" for name, ms in timings.items()]
+    if cached:
+        parts.insert(0, 'cache;desc="hit"')
+    return ", ".join(parts)
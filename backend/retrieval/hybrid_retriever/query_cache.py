@@ -0,0 +1,80 @@
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used as cache key and as the text actually encoded."""
+    return _WS.sub(" ", unicodedata.normalize("NFKC", query or "")).strip()
+
+
+class TTLCache:
+    """Thread-safe LRU with a per-entry time-to-live and hit/miss counters."""
+
+    def __init__(self, maxsize: int = 2048, ttl_seconds: float = 3600.0, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl_seconds
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = self._clock()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and (self.ttl <= 0 or now - item[0] < self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (self._clock(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def load_warm_queries(path: str, limit: int) -> List[str]:
+    """Queries from a warm file: one per line, or JSON lines with a "q"/"query" field."""
+    out: List[str] = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                try:
+                    obj = json.loads(line)
+                    line = obj.get("q") or obj.get("query") or ""
+                except Exception:
+                    continue
+            q = normalize_query(line)
+            if q and q not in seen:
+                seen.add(q)
+                out.append(q)
+            if len(out) >= limit:
+                break
+    return out
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from query_cache import TTLCache, normalize_query
+
+# Cache of fused /search responses. Keys embed a corpus version built from the Qdrant
+# point count, the collection's corpus_generation metadata (bumped by chunking runs),
+# the BM25 index generation and a rebuild epoch, so any reindex makes old entries
+# unreachable instead of requiring explicit deletes.
+
+EPOCH_KEY = "retriever:result_cache:epoch"
+
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self._cache = TTLCache(maxsize, ttl_seconds)
+        self._epoch = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._cache.get(key)
+
+    def put(self, key: str, value: Any):
+        self._cache.put(key, value)
+
+    def epoch(self) -> int:
+        return self._epoch
+
+    def bump_epoch(self):
+        self._epoch += 1
+        self._cache.clear()
+
+
+def _plain(value: Any) -> Any:
+    """JSON fallback for NumPy scalars in result payloads."""
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class RedisBackend:
+    """Shared across retriever replicas; the rebuild epoch lives in Redis too."""
+
+    def __init__(self, url: str, ttl_seconds: float, prefix: str = "retriever:result:"):
+        import redis
+        self._r = redis.Redis.from_url(url, socket_timeout=0.25)
+        self._r.ping()
+        self.ttl = int(ttl_seconds) if ttl_seconds > 0 else None
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self._r.get(self.prefix + key)
+        if raw is None:
+            return None
+        # JSON, never pickle: anyone who can write this key prefix must not get code execution
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def put(self, key: str, value: Any):
+        self._r.set(self.prefix + key, json.dumps(value, default=_plain), ex=self.ttl)
+
+    def epoch(self) -> int:
+        return int(self._r.get(EPOCH_KEY) or 0)
+
+    def bump_epoch(self):
+        self._r.incr(EPOCH_KEY)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        backend,
+        version_parts: Callable[[], Dict[str, Any]],
+        version_ttl_seconds: float = 5.0,
+    ):
+        self.backend = backend
+        self._version_parts = version_parts
+        self.version_ttl = version_ttl_seconds
+        self._version: Optional[str] = None
+        self._version_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self) -> str:
+        """Corpus version, recomputed at most every `version_ttl` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._version is None or now - self._version_at >= self.version_ttl:
+                parts = dict(self._version_parts())
+                try:
+                    parts["epoch"] = self.backend.epoch()
+                except Exception:
+                    parts["epoch"] = None
+                self._version = json.dumps(parts, sort_keys=True, default=str)
+                self._version_at = now
+            return self._version
+
+    def key(self, query: str, **params: Any) -> str:
+        body = json.dumps({"q": normalize_query(query), "v": self.version(), **params}, sort_keys=True, default=str)
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any):
+        """Store `value`; backend errors (e.g. Redis down) propagate to the caller."""
+        self.backend.put(key, value)
+
+    def invalidate(self):
+        """Called after /rebuild-index: bump the epoch and force a version recompute."""
+        try:
+            self.backend.bump_epoch()
+        except Exception:
+            pass
+        with self._lock:
+            self._version = None
+
+
+def make_backend(redis_url: str, maxsize: int, ttl_seconds: float):
+    if redis_url:
+        try:
+            return RedisBackend(redis_url, ttl_seconds)
+        except Exception:
+            # Shared cache unavailable; fall back to this replica's memory
+            pass
+    return MemoryBackend(maxsize, ttl_seconds)
@@ -0,0 +1,257 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from filters import FilterableDocs
+
+# In-process BM25 over a term-major CSR matrix with precomputed BM25 weights.
+#   indptr.npy  (V+1,) int64   row offsets per term
+#   indices.npy (nnz,) int32   document ordinals
+#   data.npy    (nnz,) float32 idf * saturated tf for (term, doc)
+#   vocab.json  term -> row, docs.arrow  one row per document (text stored once)
+# A query is the sum of its terms' rows (one bincount over the concatenated slices) and
+# top-k comes from argpartition. Builds go to a fresh version directory and CURRENT is
+# swapped atomically, so readers keep serving the old arrays until they notice.
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+# Same stop list as Whoosh's StandardAnalyzer, so both engines agree on term sets
+STOP_WORDS = frozenset((
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "have", "if", "in", "is", "it",
+    "may", "not", "of", "on", "or", "tbd", "that", "the", "this", "to", "us", "we", "when", "will", "with",
+    "yet", "you", "your",
+))
+CURRENT = "CURRENT"
+DOC_COLUMNS = (
+    "chunk_id", "text", "source_id", "source_key", "speaker", "parent_type", "start_time", "end_time", "entities", "topic_tags",
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+def build_index(
+    out_root: Path,
+    chunks: Iterable[Dict[str, Any]],
+    k1: float = 1.2,
+    b: float = 0.75,
+) -> Dict[str, Any]:
+    """Build a new index version under `out_root` from `chunks` and make it current."""
+    import pyarrow as pa
+
+    out_root = Path(out_root)
+    out_root.mkdir(parents=True, exist_ok=True)
+    vocab: Dict[str, int] = {}
+    term_ids: List[np.ndarray] = []
+    tfs: List[np.ndarray] = []
+    doc_lens: List[int] = []
+    docs: Dict[str, List[Any]] = {c: [] for c in DOC_COLUMNS}
+    seen = set()
+
+    for c in chunks:
+        cid = str(c.get("chunk_id"))
+        if cid in seen:
+            continue
+        seen.add(cid)
+        toks = tokenize(c.get("text") or "")
+        counts = Counter(toks)
+        term_ids.append(np.fromiter((vocab.setdefault(t, len(vocab)) for t in counts), dtype=np.int32, count=len(counts)))
+        tfs.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        doc_lens.append(len(toks))
+        docs["chunk_id"].append(cid)
+        docs["text"].append(c.get("text") or "")
+        docs["source_id"].append(str(c["source_id"]) if c.get("source_id") else None)
+        docs["source_key"].append(str(c["source_key"]) if c.get("source_key") else None)
+        docs["speaker"].append(str(c["speaker"]) if c.get("speaker") else None)
+        docs["parent_type"].append(c.get("parent_type") or "transcript")
+        docs["start_time"].append(c.get("start_time"))
+        docs["end_time"].append(c.get("end_time"))
+        docs["entities"].append(json.dumps(c.get("entities", [])))
+        docs["topic_tags"].append(json.dumps(c.get("topic_tags", [])))
+
+    n_docs, n_terms = len(doc_lens), len(vocab)
+    lens = np.asarray(doc_lens, dtype=np.float32)
+    nnz_per_doc = np.fromiter((len(t) for t in term_ids), dtype=np.int64, count=n_docs)
+    rows = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int32)
+    tf = np.concatenate(tfs) if tfs else np.zeros(0, dtype=np.float32)
+    cols = np.repeat(np.arange(n_docs, dtype=np.int32), nnz_per_doc)
+
+    avgdl = float(lens.mean()) if n_docs else 0.0
+    df = np.bincount(rows, minlength=n_terms).astype(np.float32)
+    # Same idf as Whoosh's BM25F so both engines rank multi-term queries alike
+    idf = np.log(n_docs / (df + 1.0)) + 1.0
+    norm = k1 * (1.0 - b + b * (lens[cols] / avgdl)) if avgdl > 0 else np.full(len(cols), k1, dtype=np.float32)
+    weights = (idf[rows] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(n_terms + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n_terms), out=indptr[1:])
+
+    version = f"v{time.time_ns()}"
+    vdir = out_root / version
+    vdir.mkdir()
+    np.save(vdir / "indptr.npy", indptr)
+    np.save(vdir / "indices.npy", cols[order].astype(np.int32))
+    np.save(vdir / "data.npy", weights[order])
+    (vdir / "vocab.json").write_text(json.dumps(vocab), encoding="utf-8")
+    table = pa.table({
+        "chunk_id": pa.array(docs["chunk_id"], type=pa.string()),
+        "text": pa.array(docs["text"], type=pa.large_string()),
+        "source_id": pa.array(docs["source_id"], type=pa.string()),
+        "source_key": pa.array(docs["source_key"], type=pa.string()),
+        "speaker": pa.array(docs["speaker"], type=pa.string()),
+        "parent_type": pa.array(docs["parent_type"], type=pa.string()),
+        "start_time": pa.array(docs["start_time"], type=pa.float64()),
+        "end_time": pa.array(docs["end_time"], type=pa.float64()),
+        "entities": pa.array(docs["entities"], type=pa.string()),
+        "topic_tags": pa.array(docs["topic_tags"], type=pa.string()),
+    })
+    with pa.OSFile(str(vdir / "docs.arrow"), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    meta = {"docs": n_docs, "terms": n_terms, "nnz": int(len(weights)), "avgdl": avgdl, "k1": k1, "b": b}
+    (vdir / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+
+    tmp = out_root / f"{CURRENT}.tmp"
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, out_root / CURRENT)
+    # Keep the previous version for readers that have not switched yet
+    versions = sorted(p for p in out_root.iterdir() if p.is_dir() and p.name.startswith("v"))
+    for old in versions[:-2]:
+        shutil.rmtree(old, ignore_errors=True)
+    return {"version": version, **meta}
+
+
+class _Loaded:
+    def __init__(self, vdir: Path):
+        import pyarrow as pa
+
+        self.version = vdir.name
+        self.indptr = np.load(vdir / "indptr.npy", mmap_mode="r")
+        self.indices = np.load(vdir / "indices.npy", mmap_mode="r")
+        self.data = np.load(vdir / "data.npy", mmap_mode="r")
+        self.vocab: Dict[str, int] = json.loads((vdir / "vocab.json").read_text(encoding="utf-8"))
+        with pa.memory_map(str(vdir / "docs.arrow"), "r") as source:
+            self.docs = pa.ipc.open_file(source).read_all()
+        self.n_docs = self.docs.num_rows
+        self.filterable = FilterableDocs(self.docs)
+
+
+class SparseBM25Index:
+    """Reader for the current index version; reloads when CURRENT changes.
+
+    `conjunctive` mirrors the Whoosh query parser's default AND grouping: a document
+    must contain every query term to score.
+    """
+
+    def __init__(self, root: Path, refresh_seconds: float = 5.0, conjunctive: bool = True):
+        self.root = Path(root)
+        self.refresh_seconds = refresh_seconds
+        self.conjunctive = conjunctive
+        self._loaded: Optional[_Loaded] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self) -> Optional[str]:
+        try:
+            return (self.root / CURRENT).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+
+    def _get(self) -> Optional[_Loaded]:
+        now = time.monotonic()
+        if self._loaded is not None and now - self._checked < self.refresh_seconds:
+            return self._loaded
+        with self._lock:
+            self._checked = now
+            version = self._current()
+            if version and (self._loaded is None or self._loaded.version != version):
+                try:
+                    self._loaded = _Loaded(self.root / version)
+                except Exception:
+                    pass
+        return self._loaded
+
+    def invalidate(self):
+        self._checked = 0.0
+
+    def generation(self) -> str:
+        loaded = self._get()
+        return loaded.version if loaded else ""
+
+    @staticmethod
+    def _mask(ix: _Loaded, filters) -> Optional[np.ndarray]:
+        if filters is None or filters.is_empty():
+            return None
+        return ix.filterable.mask(filters)
+
+    def _scores(self, ix: _Loaded, query: str, mask: Optional[np.ndarray]) -> Optional[np.ndarray]:
+        terms = set(tokenize(query))
+        rows = {ix.vocab[t] for t in terms if t in ix.vocab}
+        if not rows or (self.conjunctive and len(rows) < len(terms)):
+            return None
+        slices = [slice(int(ix.indptr[r]), int(ix.indptr[r + 1])) for r in rows]
+        docs = np.concatenate([ix.indices[s] for s in slices])
+        weights = np.concatenate([ix.data[s] for s in slices])
+        scores = np.bincount(docs, weights=weights, minlength=ix.n_docs)
+        if self.conjunctive and len(rows) > 1:
+            scores[np.bincount(docs, minlength=ix.n_docs) < len(rows)] = 0.0
+        if mask is not None:
+            scores[~mask] = 0.0
+        return scores
+
+    def scores(self, query: str, filters=None) -> Optional[np.ndarray]:
+        ix = self._get()
+        if ix is None or ix.n_docs == 0:
+            return None
+        return self._scores(ix, query, self._mask(ix, filters))
+
+    def search(self, query: str, top_k: int = 20, filters=None) -> List[Dict[str, Any]]:
+        return self.search_many([query], top_k=top_k, filters=filters)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 20, filters=None) -> List[List[Dict[str, Any]]]:
+        """Search `queries` against one loaded version, building the filter mask once."""
+        ix = self._get()
+        if ix is None or ix.n_docs == 0:
+            return [[] for _ in queries]
+        mask = self._mask(ix, filters)
+        return [self._top(ix, self._scores(ix, q, mask), top_k) for q in queries]
+
+    @staticmethod
+    def _top(ix: _Loaded, scores: Optional[np.ndarray], top_k: int) -> List[Dict[str, Any]]:
+        if scores is None:
+            return []
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return []
+        # Take everything tied with the k-th score, then order by score and doc ordinal so
+        # ties break the same way on every call (and as Whoosh does, by insertion order)
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        cand = np.flatnonzero(scores >= kth)
+        top = cand[np.lexsort((cand, -scores[cand]))][:k]
+        rows = ix.docs.take(top).to_pylist()
+        out: List[Dict[str, Any]] = []
+        for doc_idx, row in zip(top, rows):
+            out.append({
+                "chunk_id": row["chunk_id"],
+                "score": float(scores[doc_idx]),
+                "source_id": row["source_id"],
+                # Versions built before these columns existed lack them
+                "source_key": row.get("source_key"),
+                "speaker": row.get("speaker"),
+                "text": row["text"] or "",
+                "start_time": row["start_time"],
+                "end_time": row["end_time"],
+                "entities": json.loads(row["entities"] or "[]"),
+                "topic_tags": json.loads(row["topic_tags"] or "[]"),
+                "provenance": "bm25",
+            })
+        return out
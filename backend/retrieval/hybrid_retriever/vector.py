@@ -1,6 +1,60 @@
+import threading
+import time
+from pathlib import Path
 from typing import List, Dict, Any
 
-from config import EMBED_MODEL, USE_GPU, QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION, TOP_K_VECTOR
+from config import (
+    EMBED_MODEL, USE_GPU, QDRANT_URL, QDRANT_API_KEY, QDRANT_COLLECTION, TOP_K_VECTOR,
+    EMBED_MODEL_REVISION, EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB, EMBED_SERVICE_URL, QDRANT_PROFILE,
+    EMBED_BACKEND, EMBED_ONNX_DIR, EMBED_ONNX_THREADS,
+    QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS, QUERY_CACHE_WARM_FILE,
+    QDRANT_QUANTIZED_SEARCH, QDRANT_OVERSAMPLING, QDRANT_RESCORE,
+    VECTOR_BACKEND, LOCAL_INDEX_PATH, QDRANT_RETRY_SECONDS, CHUNKS_ROOT, BM25_REFRESH_SECONDS,
+)
+from metrics import stage
+from local_index import LocalVectorIndex, build_index as build_local_index, fingerprint as store_fingerprint
+from query_cache import TTLCache, load_warm_queries, normalize_query
+
+try:
+    from common.embedding_cache import cache_namespace, cached_encode, open_cache
+except ImportError:  # backend/common not mounted into this image
+    cache_namespace = cached_encode = open_cache = None
+
+try:
+    from common.embedding_client import EmbeddingClient
+except ImportError:
+    EmbeddingClient = None
+
+try:
+    from common.embedding_backends import load_backend
+except ImportError:
+    load_backend = None
+
+try:
+    from common.qdrant_provisioning import ensure_collection, get_profile, search_params
+except ImportError:
+    ensure_collection = get_profile = search_params = None
+
+_client = None
+_model = None
+_qdrant = None
+_load_lock = threading.Lock()
+# Hot queries skip both the encoder and the on-disk embedding cache
+query_cache = TTLCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL_SECONDS)
+# Startup/warmup details surfaced on /health and gating /ready
+_state: Dict[str, Any] = {
+    "ready": False,
+    "device": None,
+    "encoder": None,
+    "model_load_seconds": None,
+    "warmup_seconds": None,
+    "error": None,
+}
+local_index = LocalVectorIndex(Path(LOCAL_INDEX_PATH), refresh_seconds=BM25_REFRESH_SECONDS)
+# Qdrant circuit state for VECTOR_BACKEND=auto
+_qdrant_health: Dict[str, Any] = {"healthy": True, "checked": 0.0, "failovers": 0, "last_error": None}
+# Searches run on executor threads; every read-modify-write of _qdrant_health holds this
+_health_lock = threading.Lock()
 
 
 def _device() -> str:
@@ -14,36 +68,320 @@ def _device() -> str:
 
 
 def _load_embedder():
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(EMBED_MODEL, device=_device())
-    return model
+    """Load the embedding model once per process; concurrent first calls share the load."""
+    global _model
+    if _model is not None:
+        return _model
+    with _load_lock:
+        if _model is None:
+            start = time.perf_counter()
+            device = _device()
+            if load_backend is not None:
+                model = load_backend(
+                    EMBED_MODEL, EMBED_BACKEND, device=device, onnx_dir=EMBED_ONNX_DIR, threads=EMBED_ONNX_THREADS
+                )
+            else:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(EMBED_MODEL, device=device)
+            _state["device"] = getattr(model, "device", device)
+            _state["model_load_seconds"] = round(time.perf_counter() - start, 3)
+            _model = model
+    return _model
+
 
+def get_qdrant():
+    global _qdrant
+    if _qdrant is None:
+        from qdrant_client import QdrantClient
+        _qdrant = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
+    return _qdrant
 
-def vector_search(query: str, top_k: int = TOP_K_VECTOR) -> List[Dict[str, Any]]:
-    from qdrant_client import QdrantClient
-    client = QdrantClient(url=QDRANT_URL, api_key=QDRANT_API_KEY)
 
+def _encode_local(texts: List[str], normalize: bool = True):
     model = _load_embedder()
-    qvec = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)[0]
+    return model.encode(texts, convert_to_numpy=True, normalize_embeddings=normalize)
+
+
+def _get_client():
+    global _client
+    if EmbeddingClient is None:
+        return None
+    if _client is None:
+        _client = EmbeddingClient(EMBED_SERVICE_URL, EMBED_MODEL, fallback=_encode_local, fallback_backend=EMBED_BACKEND)
+    return _client
+
+
+def _encode(texts: List[str]):
+    """Encode through the shared embedding service, falling back to the local model."""
+    client = _get_client()
+    if client is None:
+        return _encode_local(texts)
+    return client.encode(texts, normalize=True)
+
+
+def _namespace(backend: str) -> str:
+    return cache_namespace(EMBED_MODEL, EMBED_MODEL_REVISION, normalize=True, backend=backend)
+
 
-    res = client.search(
-        collection_name=QDRANT_COLLECTION,
-        query_vector=qvec.tolist(),
-        limit=top_k,
-        with_payload=True,
+def _embed_many(queries: List[str]):
+    if open_cache is None:
+        return _encode(queries)
+    cache = open_cache(EMBED_CACHE_DIR, EMBED_CACHE_MAX_MB)
+    client = _get_client()
+    if client is None:
+        return cached_encode(cache, _namespace(EMBED_BACKEND), queries, _encode)
+    # Cache under the backend that produced the vectors: the service's or the fallback's
+    return cached_encode(
+        cache, _namespace(client.backend), queries, _encode, store_namespace=lambda: _namespace(client.last_backend)
     )
+
+
+def embed_query(query: str):
+    q = normalize_query(query)
+    vec = query_cache.get(q)
+    if vec is None:
+        vec = _embed_many([q])[0]
+        query_cache.put(q, vec)
+    return vec
+
+
+def embed_queries(queries: List[str]) -> List[Any]:
+    """Embed many queries; LRU misses are encoded together in one model call."""
+    normalized = [normalize_query(q) for q in queries]
+    vecs = [query_cache.get(q) for q in normalized]
+    missing = list(dict.fromkeys(q for q, v in zip(normalized, vecs) if v is None))
+    if missing:
+        encoded = dict(zip(missing, _embed_many(missing)))
+        for q, vec in encoded.items():
+            query_cache.put(q, vec)
+        vecs = [v if v is not None else encoded[q] for q, v in zip(normalized, vecs)]
+    return vecs
+
+
+def prewarm_query_cache(path: str = QUERY_CACHE_WARM_FILE, batch_size: int = 64) -> int:
+    """Encode recent queries from `path` into the query cache; returns how many were loaded."""
+    if not path:
+        return 0
+    try:
+        queries = load_warm_queries(path, limit=QUERY_CACHE_SIZE)
+    except OSError:
+        return 0
+    for i in range(0, len(queries), batch_size):
+        batch = queries[i:i + batch_size]
+        for q, vec in zip(batch, _embed_many(batch)):
+            query_cache.put(q, vec)
+    return len(queries)
+
+
+def _search_params():
+    """SearchParams for the provisioned profile: quantized candidates plus rescoring."""
+    if search_params is None or not QDRANT_PROFILE:
+        return None
+    try:
+        profile = get_profile(QDRANT_PROFILE)
+    except ValueError:
+        # Reported once by provision_collection at startup; search with Qdrant's defaults
+        return None
+    if profile.quantization is None:
+        return None
+    if not QDRANT_QUANTIZED_SEARCH:
+        from qdrant_client import models
+        return models.SearchParams(quantization=models.QuantizationSearchParams(ignore=True))
+    return search_params(
+        profile,
+        oversampling=float(QDRANT_OVERSAMPLING) if QDRANT_OVERSAMPLING else None,
+        rescore=QDRANT_RESCORE.lower() == "true" if QDRANT_RESCORE else None,
+    )
+
+
+def _qdrant_available() -> bool:
+    """Whether to send this search to Qdrant.
+
+    In auto mode a failure opens the circuit; after QDRANT_RETRY_SECONDS a cheap
+    get_collections() probe decides whether to go back to Qdrant.
+    """
+    if VECTOR_BACKEND == "local":
+        return False
+    if VECTOR_BACKEND != "auto":
+        return True
+    with _health_lock:
+        if _qdrant_health["healthy"]:
+            return True
+        now = time.monotonic()
+        if now - _qdrant_health["checked"] < QDRANT_RETRY_SECONDS:
+            return False
+        # Claim this probe so concurrent searches keep using the local index meanwhile
+        _qdrant_health["checked"] = now
+    try:
+        get_qdrant().get_collections()
+    except Exception as e:
+        with _health_lock:
+            _qdrant_health["last_error"] = str(e)
+        return False
+    with _health_lock:
+        _qdrant_health["healthy"] = True
+    return True
+
+
+def _health_snapshot() -> Dict[str, Any]:
+    with _health_lock:
+        return dict(_qdrant_health)
+
+
+def _failover(e: Exception) -> bool:
+    """Record a Qdrant failure; True when the local index can take the search."""
+    if VECTOR_BACKEND != "auto" or not local_index.available():
+        return False
+    with _health_lock:
+        _qdrant_health.update(healthy=False, checked=time.monotonic(), last_error=str(e))
+        _qdrant_health["failovers"] += 1
+    return True
+
+
+def rebuild_local_index(full: bool = False) -> Dict[str, Any]:
+    """Rebuild the in-process vector index from the chunk store when it changed.
+
+    Vectors are scrolled from Qdrant when it is reachable; anything else is encoded
+    through the persistent embedding cache.
+    """
+    root = Path(LOCAL_INDEX_PATH)
+    marker = root / "fingerprint"
+    fp = store_fingerprint(Path(CHUNKS_ROOT))
+    if not full and marker.exists() and marker.read_text(encoding="utf-8") == fp:
+        return {"skipped": True}
+    qdrant = get_qdrant() if VECTOR_BACKEND != "local" and _qdrant_available() else None
+    stats = build_local_index(root, Path(CHUNKS_ROOT), qdrant=qdrant, collection=QDRANT_COLLECTION, encode=_embed_many)
+    marker.write_text(fp, encoding="utf-8")
+    local_index.invalidate()
+    return {"skipped": False, **stats}
+
+
+def provision_collection() -> Dict[str, Any]:
+    """Reconcile the existing collection to QDRANT_PROFILE; creation is left to chunking."""
+    if ensure_collection is None or not QDRANT_PROFILE or VECTOR_BACKEND == "local":
+        return {}
+    return ensure_collection(get_qdrant(), QDRANT_COLLECTION, None, get_profile(QDRANT_PROFILE))
+
+
+def warmup(query: str = "warmup query") -> Dict[str, Any]:
+    """Load the encoder and Qdrant client and run one dummy search end to end.
+
+    With a shared embedding service the local model stays a lazy fallback and the
+    warmup goes through the service instead.
+    """
+    start = time.perf_counter()
+    try:
+        remote = EmbeddingClient is not None and bool(EMBED_SERVICE_URL)
+        _state["encoder"] = "service" if remote else "local"
+        if not remote:
+            _load_embedder()
+        qvec = _encode([query])[0]
+        try:
+            if VECTOR_BACKEND == "local":
+                local_index.search(qvec, top_k=1)
+            else:
+                get_qdrant().query_points(collection_name=QDRANT_COLLECTION, query=qvec.tolist(), limit=1)
+        except Exception:
+            # An empty deployment has no collection yet; the client itself is ready
+            pass
+        _state["error"] = None
+        _state["ready"] = True
+    except Exception as e:
+        _state["error"] = str(e)
+    _state["warmup_seconds"] = round(time.perf_counter() - start, 3)
+    return dict(_state)
+
+
+def collection_version() -> Dict[str, Any]:
+    """Point count and the corpus_generation that chunking runs stamp on the collection."""
+    if not _qdrant_available():
+        info = local_index.info()
+        return {"points": info.get("points"), "generation": info.get("version")}
+    try:
+        info = get_qdrant().get_collection(QDRANT_COLLECTION)
+        meta = getattr(info.config, "metadata", None) or {}
+        return {"points": info.points_count, "generation": meta.get("corpus_generation")}
+    except Exception:
+        return {"points": None, "generation": None}
+
+
+def status() -> Dict[str, Any]:
+    params = _search_params()
+    return {
+        "model": EMBED_MODEL,
+        "backend": EMBED_BACKEND,
+        "quantized_search": params.quantization.model_dump() if params is not None else None,
+        "vector_backend": VECTOR_BACKEND,
+        "qdrant_health": _health_snapshot(),
+        "local_index": local_index.info(),
+        **_state,
+        "query_cache": {"size": len(query_cache), "hits": query_cache.hits, "misses": query_cache.misses},
+    }
+
+
+def _to_results(points) -> List[Dict[str, Any]]:
     out: List[Dict[str, Any]] = []
-    for r in res:
+    for r in points:
         payload = r.payload or {}
         out.append({
             "chunk_id": payload.get("chunk_id") or r.id,
             "score": float(r.score) if r.score is not None else None,
             "source_id": payload.get("source_id"),
+            "source_key": payload.get("source_key"),
+            "speaker": payload.get("speaker"),
+            "page": payload.get("page"),
             "text": payload.get("text") or "",
             "start_time": payload.get("start_time"),
             "end_time": payload.get("end_time"),
             "entities": payload.get("entities", []),
             "topic_tags": payload.get("topic_tags", []),
+            "aliases": payload.get("aliases", []),
             "provenance": QDRANT_COLLECTION,
         })
     return out
+
+
+def vector_search(query: str, top_k: int = TOP_K_VECTOR, filters=None) -> List[Dict[str, Any]]:
+    with stage("encode"):
+        qvec = embed_query(query)
+    with stage("vector_search"):
+        if _qdrant_available():
+            try:
+                res = get_qdrant().query_points(
+                    collection_name=QDRANT_COLLECTION,
+                    query=qvec.tolist(),
+                    query_filter=filters.to_qdrant() if filters is not None else None,
+                    search_params=_search_params(),
+                    limit=top_k,
+                    with_payload=True,
+                ).points
+                return _to_results(res)
+            except Exception as e:
+                if not _failover(e):
+                    raise
+        return local_index.search(qvec, top_k=top_k, filters=filters)
+
+
+def vector_search_batch(queries: List[str], top_k: int = TOP_K_VECTOR, filters=None) -> List[List[Dict[str, Any]]]:
+    """One encoder call and one Qdrant batch request for all `queries`."""
+    if not queries:
+        return []
+    from qdrant_client.models import QueryRequest
+
+    with stage("encode"):
+        vecs = embed_queries(queries)
+    with stage("vector_search"):
+        if _qdrant_available():
+            query_filter = filters.to_qdrant() if filters is not None else None
+            params = _search_params()
+            requests = [
+                QueryRequest(query=vec.tolist(), filter=query_filter, params=params, limit=top_k, with_payload=True)
+                for vec in vecs
+            ]
+            try:
+                responses = get_qdrant().query_batch_points(collection_name=QDRANT_COLLECTION, requests=requests)
+                return [_to_results(r.points) for r in responses]
+            except Exception as e:
+                if not _failover(e):
+                    raise
+        return [local_index.search(vec, top_k=top_k, filters=filters) for vec in vecs]
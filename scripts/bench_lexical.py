@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Compare the Whoosh and sparse-CSR BM25 engines of the hybrid retriever.
+
+Generates a synthetic chunk store (Zipf-distributed vocabulary, transcript-sized
+chunks), builds both indexes over it and reports build time, index size and query
+latency percentiles. The default corpus is 1M chunks; use --chunks for a quick run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List
+
+import numpy as np
+
+
+def _repo_root() -> Path:
+    return Path(__file__).resolve().parent.parent
+
+
+def _dir_size(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _generate(chunks_root: Path, n_chunks: int, vocab_size: int, words_per_chunk: int, shard: int, seed: int) -> List[str]:
+    from common.chunk_store import write_chunks
+
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i:06d}" for i in range(vocab_size)])
+    # Zipf ranks give a realistic mix of very common and rare terms
+    weights = 1.0 / np.arange(1, vocab_size + 1) ** 1.1
+    weights /= weights.sum()
+    for start in range(0, n_chunks, shard):
+        count = min(shard, n_chunks - start)
+        words = vocab[rng.choice(vocab_size, size=(count, words_per_chunk), p=weights)]
+        chunks = [
+            {
+                "chunk_id": f"c{start + i:08d}",
+                "source_id": f"s{(start + i) // 200:06d}",
+                "start_time": float((start + i) % 200) * 30.0,
+                "end_time": float((start + i) % 200) * 30.0 + 30.0,
+                "text": " ".join(row),
+            }
+            for i, row in enumerate(words)
+        ]
+        write_chunks(chunks_root, "bench", f"shard{start // shard:05d}", chunks)
+    # Queries of 1-4 terms drawn from the mid-frequency band
+    return [" ".join(vocab[rng.integers(10, min(vocab_size, 5000), size=rng.integers(1, 5))]) for _ in range(200)]
+
+
+def _latency(fn, queries: List[str], top_k: int) -> Dict[str, float]:
+    for q in queries[:10]:
+        fn(q, top_k=top_k)
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q, top_k=top_k)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    arr = np.asarray(samples)
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3), "p95_ms": round(float(np.percentile(arr, 95)), 3)}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--words", type=int, default=80, help="Words per chunk")
+    parser.add_argument("--shard", type=int, default=10_000, help="Chunks per Arrow file")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--engines", default="whoosh,sparse")
+    parser.add_argument("--workdir", default=None, help="Keep data here instead of a temp dir")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    root = _repo_root()
+    sys.path[:0] = [str(root / "backend"), str(root / "backend" / "retrieval" / "hybrid_retriever")]
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench_lexical_"))
+    chunks_root = workdir / "chunks"
+    os.environ["CHUNKS_ROOT"] = str(chunks_root)
+
+    t0 = time.perf_counter()
+    queries = _generate(chunks_root, args.chunks, args.vocab, args.words, args.shard, args.seed)
+    report: Dict[str, Any] = {"chunks": args.chunks, "generate_s": round(time.perf_counter() - t0, 2), "engines": {}}
+
+    import lexical
+
+    for engine in [e.strip() for e in args.engines.split(",") if e.strip()]:
+        index_dir = workdir / f"index_{engine}"
+        shutil.rmtree(index_dir, ignore_errors=True)
+        t0 = time.perf_counter()
+        if engine == "sparse":
+            lexical.rebuild_sparse_index(index_dir, chunks_root, full=True)
+            search = lexical.get_sparse_index(index_dir).search
+        else:
+            lexical.rebuild_index(index_dir, chunks_root, full=True)
+            search = lexical.get_index(index_dir).search
+        build_s = time.perf_counter() - t0
+        report["engines"][engine] = {
+            "build_s": round(build_s, 2),
+            "index_mb": round(_dir_size(index_dir) / 1e6, 1),
+            **_latency(search, queries, args.top_k),
+        }
+
+    print(json.dumps(report, indent=2))
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
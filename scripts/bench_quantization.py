@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""Measure recall@k and latency of quantized vs full-precision Qdrant search.
+
+Ground truth is an exact (brute-force) search over the original vectors. Each variant
+is compared against it on the same held-out queries:
+
+  full             HNSW over the original vectors (quantization ignored)
+  quant xN         quantized candidates, oversampling N, rescored with originals
+  quant x1 norescore  raw quantized scores, no rescoring
+
+Queries are either real query texts (--queries, one per line or JSON lines with "q",
+encoded with the deployment's model) or vectors of stored points sampled from the
+collection (--sample), with the point itself excluded from its own results.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def _repo_root() -> Path:
+    return Path(__file__).resolve().parent.parent
+
+
+def _sample_points(client, collection: str, n: int, pool: int, seed: int) -> List[Tuple[Any, List[float]]]:
+    points, offset = [], None
+    while len(points) < pool:
+        batch, offset = client.scroll(
+            collection_name=collection, limit=min(256, pool - len(points)), offset=offset,
+            with_payload=False, with_vectors=True,
+        )
+        points.extend(batch)
+        if offset is None:
+            break
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(points), size=min(n, len(points)), replace=False)
+    return [(points[i].id, points[i].vector) for i in picked]
+
+
+def _encode_queries(path: str, model: str, backend: str, onnx_dir: str) -> List[Tuple[Any, List[float]]]:
+    sys.path.insert(0, str(_repo_root() / "backend"))
+    from common.embedding_backends import load_backend
+
+    texts = [line.strip() for line in open(path, encoding="utf-8") if line.strip()]
+    texts = [json.loads(t).get("q", "") if t.startswith("{") else t for t in texts]
+    encoder = load_backend(model, backend, device="cpu", onnx_dir=onnx_dir)
+    vectors = encoder.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return [(None, v.tolist()) for v in vectors]
+
+
+def _run(client, collection: str, queries, k: int, params) -> Tuple[List[List[Any]], List[float]]:
+    ids, latencies = [], []
+    for exclude, vec in queries:
+        t0 = time.perf_counter()
+        res = client.query_points(
+            collection_name=collection, query=vec, limit=k + (exclude is not None), search_params=params,
+            with_payload=False,
+        ).points
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        ids.append([p.id for p in res if p.id != exclude][:k])
+    return ids, latencies
+
+
+def _recall(truth: List[List[Any]], got: List[List[Any]]) -> float:
+    scores = [len(set(t) & set(g)) / len(t) for t, g in zip(truth, got) if t]
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def _summary(truth, got, latencies) -> Dict[str, float]:
+    arr = np.asarray(latencies)
+    return {
+        "recall": round(_recall(truth, got), 4),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:6333")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--collection", default="cirs_chunks_v1")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversampling", default="1,2,4", help="Comma-separated factors to try")
+    parser.add_argument("--queries", default=None, help="Held-out query texts (needs the embedding model)")
+    parser.add_argument("--model", default="BAAI/bge-large-en-v1.5")
+    parser.add_argument("--backend", default="torch")
+    parser.add_argument("--onnx-dir", default="/data/models/onnx")
+    parser.add_argument("--sample", type=int, default=200, help="Stored points used as queries without --queries")
+    parser.add_argument("--pool", type=int, default=20000, help="Points scrolled to sample from")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args(argv)
+
+    from qdrant_client import QdrantClient, models
+
+    client = QdrantClient(url=args.url, api_key=args.api_key)
+    info = client.get_collection(args.collection)
+    if args.queries:
+        queries = _encode_queries(args.queries, args.model, args.backend, args.onnx_dir)
+    else:
+        queries = _sample_points(client, args.collection, args.sample, args.pool, args.seed)
+
+    exact = models.SearchParams(exact=True, quantization=models.QuantizationSearchParams(ignore=True))
+    truth, _ = _run(client, args.collection, queries, args.k, exact)
+
+    variants: Dict[str, Any] = {
+        "full": models.SearchParams(quantization=models.QuantizationSearchParams(ignore=True)),
+    }
+    if info.config.quantization_config is not None:
+        for factor in [float(f) for f in args.oversampling.split(",") if f.strip()]:
+            variants[f"quant x{factor:g}"] = models.SearchParams(
+                quantization=models.QuantizationSearchParams(rescore=True, oversampling=factor)
+            )
+        variants["quant x1 norescore"] = models.SearchParams(
+            quantization=models.QuantizationSearchParams(rescore=False, oversampling=1.0)
+        )
+
+    report: Dict[str, Any] = {
+        "collection": args.collection,
+        "points": info.points_count,
+        "quantization": type(info.config.quantization_config).__name__ if info.config.quantization_config else None,
+        "queries": len(queries),
+        "k": args.k,
+        "variants": {},
+    }
+    for name, params in variants.items():
+        _run(client, args.collection, queries[:10], args.k, params)  # warm caches
+        got, latencies = _run(client, args.collection, queries, args.k, params)
+        report["variants"][name] = _summary(truth, got, latencies)
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
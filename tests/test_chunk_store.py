@@ -0,0 +1,44 @@
+"""Arrow chunk store: projected scans over memory-mapped files."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+from common.chunk_store import iter_records, read_table, write_chunks  # noqa: E402
+
+
+def _chunks(n, source="talk"):
+    return [
+        {
+            "chunk_id": f"{source}-{i}",
+            "source_key": source,
+            "start_time": float(i),
+            "end_time": float(i + 1),
+            "speaker": "A",
+            "text": f"chunk {i}\twith a tab",
+            "topic_tags": ["mold"] if i % 2 else [],
+            "entities": [],
+        }
+        for i in range(n)
+    ]
+
+
+def test_projected_scan(tmp_path):
+    write_chunks(tmp_path, "run1", "talk", _chunks(3))
+    write_chunks(tmp_path, "run1", "book", _chunks(2, source="book"))
+
+    rows = list(iter_records(tmp_path, ["chunk_id", "text", "topic_tags"]))
+    assert {r["chunk_id"] for r in rows} == {"talk-0", "talk-1", "talk-2", "book-0", "book-1"}
+    assert all(set(r) == {"chunk_id", "text", "topic_tags"} for r in rows)
+    assert next(r for r in rows if r["chunk_id"] == "talk-1")["topic_tags"] == ["mold"]
+
+    table = read_table(tmp_path / "run1" / "book.arrow", ["chunk_id", "start_time"])
+    assert table.column("chunk_id").to_pylist() == ["book-0", "book-1"]
+    assert table.column("start_time").to_pylist() == [0.0, 1.0]
@@ -0,0 +1,117 @@
+"""Chunker: overlap windows, oversized-segment splitting, speaker boundaries and chunk IDs."""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+CHUNKING = ROOT / "backend" / "processing" / "chunking_embeddings_gpu"
+
+# Count whitespace tokens so windows do not depend on a downloaded tokenizer
+os.environ.setdefault("CHUNK_TOKENIZER", "whitespace")
+# The service imports a flat `config`; load it without shadowing other services' config
+_config = sys.modules.pop("config", None)
+sys.path.insert(0, str(CHUNKING))
+try:
+    import chunker  # noqa: E402
+finally:
+    sys.path.remove(str(CHUNKING))
+    sys.modules.pop("config", None)
+    if _config is not None:
+        sys.modules["config"] = _config
+
+
+@pytest.fixture
+def small_windows(monkeypatch):
+    monkeypatch.setattr(chunker, "CHUNK_SIZE_TOKENS", 10)
+    monkeypatch.setattr(chunker, "CHUNK_OVERLAP_TOKENS", 3)
+
+
+def _seg(text, start, end, speaker="SPEAKER_00"):
+    return {"text_validated": text, "start_time": start, "end_time": end, "speaker": speaker}
+
+
+def _words(n, prefix="w"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_overlap_windows(small_windows):
+    segments = [_seg(_words(4, f"s{k}_"), k * 4.0, k * 4.0 + 4.0) for k in range(6)]
+    chunks = chunker.chunk_validated_segments(segments, source_key="talks/a")
+    assert all(len(c["text"].split()) <= 10 for c in chunks)
+    # Each window steps one segment forward and repeats the previous window's tail
+    assert [(c["start_time"], c["end_time"]) for c in chunks] == [(k * 4.0, k * 4.0 + 8.0) for k in range(5)]
+    for prev, nxt in zip(chunks, chunks[1:]):
+        tail = prev["text"].split()[-4:]
+        assert nxt["text"].split()[:4] == tail
+    covered = {w for c in chunks for w in c["text"].split()}
+    assert covered == {w for s in segments for w in s["text_validated"].split()}
+
+
+def test_oversized_segment_splits_on_sentences(small_windows):
+    sentences = ["Mold makes people sick in many ways.", "Binders help clear the toxins out fast.",
+                 "Testing the home always comes first here."]
+    assert [len(s.split()) for s in sentences] == [7, 7, 7]
+    chunks = chunker.chunk_validated_segments([_seg(" ".join(sentences), 0.0, 21.0)], source_key="talks/a")
+    assert [c["text"] for c in chunks] == sentences
+    # Times are interpolated over the segment by token position
+    assert [(c["start_time"], c["end_time"]) for c in chunks] == [(0.0, 7.0), (7.0, 14.0), (14.0, 21.0)]
+
+
+def test_unpunctuated_oversized_segment_is_cut_at_the_limit(small_windows):
+    text = _words(25)
+    chunks = chunker.chunk_validated_segments([_seg(text, 0.0, 25.0)], source_key="talks/a")
+    assert [len(c["text"].split()) for c in chunks] == [10, 10, 5]
+    assert " ".join(c["text"] for c in chunks) == text
+
+
+def test_windows_never_cross_a_speaker_change(small_windows):
+    segments = [
+        _seg(_words(3, "a"), 0.0, 3.0, "SPEAKER_00"),
+        _seg(_words(3, "b"), 3.0, 6.0, "SPEAKER_00"),
+        _seg(_words(3, "c"), 6.0, 9.0, "SPEAKER_01"),
+        _seg(_words(3, "d"), 9.0, 12.0, "SPEAKER_01"),
+    ]
+    chunks = chunker.chunk_validated_segments(segments, source_key="talks/a")
+    assert [(c["speaker"], c["start_time"], c["end_time"]) for c in chunks] == [
+        ("SPEAKER_00", 0.0, 6.0), ("SPEAKER_01", 6.0, 12.0),
+    ]
+    # No overlap is carried into the other speaker's window
+    assert not any(w.startswith(("a", "b")) for w in chunks[1]["text"].split())
+
+
+def test_chunk_ids_are_deterministic(small_windows):
+    segments = [_seg(_words(4, f"s{k}_"), k * 4.0, k * 4.0 + 4.0) for k in range(3)]
+    first = [c["chunk_id"] for c in chunker.chunk_validated_segments(segments, source_key="talks/a")]
+    again = [c["chunk_id"] for c in chunker.chunk_validated_segments([dict(s) for s in segments], source_key="talks/a")]
+    assert first == again and len(set(first)) == len(first)
+    # Another source with the same text gets its own IDs
+    other = [c["chunk_id"] for c in chunker.chunk_validated_segments(segments, source_key="talks/b")]
+    assert not set(first) & set(other)
+
+
+def test_chunk_ids_change_with_text_span_and_signature(small_windows, monkeypatch):
+    segments = [_seg(_words(4, f"s{k}_"), k * 4.0, k * 4.0 + 4.0) for k in range(3)]
+    base = [c["chunk_id"] for c in chunker.chunk_validated_segments(segments, source_key="talks/a")]
+
+    edited = [dict(s) for s in segments]
+    edited[0]["text_validated"] = "an edited first segment"
+    ids = [c["chunk_id"] for c in chunker.chunk_validated_segments(edited, source_key="talks/a")]
+    # Only the windows containing the edited segment get new IDs
+    assert ids[0] != base[0] and ids[1:] == base[1:]
+
+    args = ("talks/a", (0, 2), 0.0, 8.0, "hash")
+    base_id = chunker.chunk_id_for(*args)
+    assert chunker.chunk_id_for(*args) == base_id
+    assert chunker.chunk_id_for("talks/a", (1, 3), 0.0, 8.0, "hash") != base_id
+    assert chunker.chunk_id_for("talks/a", (0, 2), 0.0, 9.0, "hash") != base_id
+
+    # Any setting that moves chunk boundaries changes the signature and so every ID
+    for name, value in (("CHUNK_SIZE_TOKENS", 11), ("CHUNK_OVERLAP_TOKENS", 2), ("CHUNKER_VERSION", "next")):
+        with monkeypatch.context() as m:
+            m.setattr(chunker, name, value)
+            assert chunker.chunk_id_for(*args) != base_id
+            changed = [c["chunk_id"] for c in chunker.chunk_validated_segments(segments, source_key="talks/a")]
+            assert not set(changed) & set(base)
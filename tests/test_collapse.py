@@ -0,0 +1,120 @@
+"""Post-fusion collapsing: overlap merging, text stitching and the per-source cap."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT / "backend" / "retrieval" / "hybrid_retriever",):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from collapse import collapse_overlaps, stitch  # noqa: E402
+
+
+def _vector_hit(chunk_id, source_key, start=None, end=None, score=1.0, text="", speaker="SPEAKER_00", page=None):
+    # Shaped like vector._to_results: the chunking service writes no source_id
+    return {
+        "chunk_id": chunk_id, "score": score, "source_id": None, "source_key": source_key, "speaker": speaker,
+        "page": page, "text": text, "start_time": start, "end_time": end, "entities": [], "topic_tags": [],
+        "aliases": [], "provenance": "cirs_chunks_v1",
+    }
+
+
+def _bm25_hit(chunk_id, source_key, start=None, end=None, score=1.0, text="", speaker="SPEAKER_00"):
+    # Shaped like lexical._search_on / sparse_bm25._top (no page, no aliases)
+    return {
+        "chunk_id": chunk_id, "score": score, "source_id": None, "source_key": source_key, "speaker": speaker,
+        "text": text, "start_time": start, "end_time": end, "entities": [], "topic_tags": [], "provenance": "bm25",
+    }
+
+
+def test_stitch_drops_the_shared_overlap():
+    assert stitch("mold exposure and binders", "and binders help") == "mold exposure and binders help"
+    assert stitch("a b c d", "b c") == "a b c d"
+    assert stitch("", "x y") == "x y"
+    assert stitch("x y", "z") == "x y z"
+
+
+def test_overlapping_hits_merge_into_one_span():
+    out = collapse_overlaps([
+        _vector_hit("b", "talks/a", 5.0, 12.0, score=0.9, text="and binders help sleep"),
+        _bm25_hit("a", "talks/a", 0.0, 6.0, score=0.7, text="mold exposure and binders"),
+        _vector_hit("c", "talks/b", 0.0, 4.0, score=0.5, text="vision"),
+    ])
+    assert [h["chunk_id"] for h in out] == ["b", "c"]
+    span = out[0]
+    assert span["chunk_ids"] == ["a", "b"]
+    assert (span["start_time"], span["end_time"]) == (0.0, 12.0)
+    assert span["score"] == 0.9
+    assert span["text"] == "mold exposure and binders help sleep"
+
+
+def test_source_id_is_the_fallback_key():
+    hits = [_vector_hit("a", None, 0.0, 6.0), _vector_hit("b", None, 5.0, 9.0)]
+    assert len(collapse_overlaps(hits)) == 2
+    for h in hits:
+        h["source_id"] = "s1"
+    assert len(collapse_overlaps(hits)) == 1
+
+
+def test_a_hit_bridges_earlier_spans():
+    hits = [_vector_hit("a", "talks/a", 0.0, 5.0, score=0.9), _bm25_hit("c", "talks/a", 10.0, 15.0, score=0.8),
+            _vector_hit("b", "talks/a", 4.0, 11.0, score=0.7)]
+    out = collapse_overlaps(hits)
+    assert len(out) == 1
+    assert out[0]["chunk_id"] == "a" and out[0]["chunk_ids"] == ["a", "b", "c"]
+    # A pause within the gap joins, a longer one does not
+    apart = [_vector_hit("a", "talks/a", 0.0, 5.0), _vector_hit("b", "talks/a", 7.0, 9.0)]
+    assert len(collapse_overlaps(apart)) == 2
+    assert len(collapse_overlaps(apart, gap_seconds=2.0)) == 1
+
+
+def test_different_speakers_are_not_merged():
+    hits = [_vector_hit("a", "talks/a", 0.0, 6.0, speaker="SPEAKER_00"),
+            _bm25_hit("b", "talks/a", 5.0, 9.0, speaker="SPEAKER_01"),
+            _vector_hit("c", "talks/a", 8.0, 12.0, speaker="SPEAKER_01")]
+    out = collapse_overlaps(hits)
+    assert [h["chunk_id"] for h in out] == ["a", "b"]
+    assert out[1]["chunk_ids"] == ["b", "c"] and "chunk_ids" not in out[0]
+
+
+def test_untimed_hits_are_kept_and_pages_merge():
+    hits = [_vector_hit("a", "docs/x"), _bm25_hit("b", "docs/x"), _vector_hit("c", "docs/x", page=3),
+            _vector_hit("d", "docs/x", page=3), _vector_hit("e", None, 0.0, 1.0)]
+    out = collapse_overlaps(hits)
+    assert [h["chunk_id"] for h in out] == ["a", "b", "c", "e"]
+    assert out[2]["chunk_ids"] == ["c", "d"]
+
+
+def test_per_source_cap():
+    hits = [_vector_hit(str(i), "talks/a", i * 10.0, i * 10.0 + 5.0) for i in range(4)]
+    hits.append(_bm25_hit("x", "talks/b", 0.0, 1.0))
+    assert [h["chunk_id"] for h in collapse_overlaps(hits, max_per_source=2)] == ["0", "1", "x"]
+    assert len(collapse_overlaps(hits, max_per_source=0)) == 5
+    # The cap alone leaves overlapping hits unmerged
+    overlapping = [_vector_hit("a", "talks/a", 0.0, 6.0), _vector_hit("b", "talks/a", 5.0, 9.0),
+                   _vector_hit("c", "talks/a", 8.0, 12.0)]
+    assert [h["chunk_id"] for h in collapse_overlaps(overlapping, max_per_source=2, merge=False)] == ["a", "b"]
+
+
+def test_sparse_leg_hits_collapse(tmp_path):
+    pytest.importorskip("numpy")
+    pytest.importorskip("pyarrow")
+    from sparse_bm25 import SparseBM25Index, build_index
+
+    chunks = [
+        {"chunk_id": "a", "source_id": None, "source_key": "talks/a", "speaker": "SPEAKER_00",
+         "start_time": 0.0, "end_time": 6.0, "text": "mold exposure and binders"},
+        {"chunk_id": "b", "source_id": None, "source_key": "talks/a", "speaker": "SPEAKER_00",
+         "start_time": 5.0, "end_time": 9.0, "text": "binders help mold"},
+        {"chunk_id": "c", "source_id": None, "source_key": "talks/b", "speaker": "SPEAKER_00",
+         "start_time": 0.0, "end_time": 4.0, "text": "mold in homes"},
+    ]
+    build_index(tmp_path, chunks)
+    hits = SparseBM25Index(tmp_path, refresh_seconds=0).search("mold")
+    assert {(h["source_key"], h["speaker"]) for h in hits} == {("talks/a", "SPEAKER_00"), ("talks/b", "SPEAKER_00")}
+    out = collapse_overlaps(hits)
+    assert sorted(h["source_key"] for h in out) == ["talks/a", "talks/b"]
+    assert len(collapse_overlaps(hits, max_per_source=1, merge=False)) == 2
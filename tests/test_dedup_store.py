@@ -0,0 +1,72 @@
+"""Segment dedup store: validation results are reused per text and validator version."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND = ROOT / "backend"
+VALIDATION = BACKEND / "processing" / "validation_gpu"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+from common.dedup_store import DedupStats, SegmentDedupStore, result_key, text_key  # noqa: E402
+
+
+@pytest.fixture
+def validation(monkeypatch):
+    pytest.importorskip("requests")
+    pytest.importorskip("tqdm")
+    # The service imports a flat `config`; load it without shadowing other services' config
+    saved = {name: sys.modules.pop(name, None) for name in ("config", "main")}
+    sys.path.insert(0, str(VALIDATION))
+    try:
+        import main as module
+    finally:
+        sys.path.remove(str(VALIDATION))
+        for name, mod in saved.items():
+            sys.modules.pop(name, None)
+            if mod is not None:
+                sys.modules[name] = mod
+    calls = []
+
+    def extract(text):
+        calls.append(text)
+        return [{"text": "mold", "label": "ENTITY", "negated": False}]
+
+    monkeypatch.setattr(module, "load_nlp", lambda: None)
+    monkeypatch.setattr(module, "load_negex", lambda: None)
+    monkeypatch.setattr(module, "extract_entities", extract)
+    return module, calls
+
+
+def test_results_are_keyed_by_version(tmp_path):
+    store = SegmentDedupStore(str(tmp_path / "segments.sqlite"))
+    store.put_result(result_key("Mold exposure.", "v1"), {"entities": []}, tokens=2)
+    assert store.get_result(result_key("Mold exposure.", "v1")) == {"entities": []}
+    assert store.get_result(result_key("Mold exposure.", "v2")) is None
+    # Source tracking stays on the normalized text
+    assert text_key("Mold exposure.") == text_key("mold   EXPOSURE")
+
+
+def test_validation_reuses_results_until_the_version_changes(tmp_path, validation, monkeypatch):
+    module, calls = validation
+    store = SegmentDedupStore(str(tmp_path / "segments.sqlite"))
+    segments = [{"text": "Mold exposure and 5000 mg of binder.", "start_time": 0.0, "end_time": 2.0}]
+
+    first = module.validate_segments(segments, source="a", store=store)
+    assert len(calls) == 1
+
+    stats = DedupStats()
+    again = module.validate_segments(segments, source="b", store=store, stats=stats)
+    assert len(calls) == 1 and stats.segments == 1
+    assert again[0]["entities"] == first[0]["entities"]
+    assert again[0]["confidence_medical"] == first[0]["confidence_medical"]
+    assert store.source_count(first[0]["text_hash"]) == 2
+
+    monkeypatch.setattr(module, "VALIDATOR_VERSION", str(int(module.VALIDATOR_VERSION) + 1))
+    module.validate_segments(segments, source="a", store=store)
+    assert len(calls) == 2
@@ -0,0 +1,63 @@
+"""ONNX embedding backends: pooling matches ST, and exported vectors match PyTorch."""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+from common.embedding_backends import l2_normalize, load_backend, pool  # noqa: E402
+
+CORPUS = [
+    "Chronic inflammatory response syndrome follows exposure to water-damaged buildings.",
+    "VIP nasal spray is considered once MARCoNS has been cleared.",
+    "Visual contrast sensitivity testing is a cheap screening tool.",
+    "TGF beta-1 and C4a are commonly elevated markers.",
+    "Cholestyramine binds biotoxins in the gut.",
+    "HLA-DR genotypes influence susceptibility.",
+    "Ok.",
+    "The ERMI score summarises mold DNA found in dust samples from the home.",
+]
+
+
+def test_pool_cls_and_mean():
+    hidden = np.arange(2 * 3 * 2, dtype=np.float32).reshape(2, 3, 2)
+    mask = np.array([[1, 1, 0], [1, 1, 1]])
+    assert np.allclose(pool(hidden, mask, "cls"), hidden[:, 0])
+    assert np.allclose(pool(hidden, mask, "mean")[0], hidden[0, :2].mean(axis=0))
+    assert np.allclose(np.linalg.norm(l2_normalize(hidden[:, 0] + 1), axis=1), 1.0)
+
+
+@pytest.mark.parametrize("backend,min_cosine", [("onnx", 0.999), ("onnx-int8", 0.98)])
+def test_onnx_parity_with_torch(tmp_path, backend, min_cosine):
+    pytest.importorskip("torch")
+    pytest.importorskip("sentence_transformers")
+    pytest.importorskip("onnxruntime")
+    model = os.getenv("PARITY_EMBED_MODEL", "BAAI/bge-small-en-v1.5")
+    try:
+        reference = load_backend(model, "torch").encode(CORPUS, normalize_embeddings=True)
+    except OSError as exc:  # model not downloadable in this environment
+        pytest.skip(str(exc))
+    vecs = load_backend(model, backend, onnx_dir=str(tmp_path)).encode(CORPUS, batch_size=3, normalize_embeddings=True)
+    cosines = (reference * vecs).sum(axis=1)
+    assert vecs.shape == reference.shape
+    assert cosines.min() >= min_cosine
+
+
+def test_backend_names_are_normalised_or_rejected():
+    from common.embedding_backends import backend_tag
+    from common.embedding_cache import cache_namespace
+
+    assert backend_tag(None) == backend_tag("") == "torch"
+    assert backend_tag(" ONNX-int8 ") == "onnx-int8"
+    assert cache_namespace("m", backend="ONNX") == cache_namespace("m", backend="onnx")
+    with pytest.raises(ValueError):
+        backend_tag("onxx")
+    with pytest.raises(ValueError):
+        cache_namespace("m", backend="onxx")
@@ -0,0 +1,124 @@
+"""Persistent embedding cache: hits skip the encoder and LRU slots are recycled."""
+
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+from common.embedding_cache import EmbeddingCache, cache_namespace, cached_encode  # noqa: E402
+
+
+def _encoder(calls):
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[len(t), 0.0, 0.0, 1.0] for t in texts], dtype=np.float32)
+    return encode
+
+
+def test_cached_encode_only_encodes_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 8)
+    ns = cache_namespace("model", "rev", normalize=True)
+    calls = []
+    first = cached_encode(cache, ns, ["a", "bb", "a"], _encoder(calls))
+    second = cached_encode(cache, ns, ["bb", "a"], _encoder(calls))
+    assert calls == [["a", "bb"]]
+    assert np.allclose(first[[1, 0]], second)
+    # A different namespace never shares vectors
+    cached_encode(cache, cache_namespace("model", "rev", normalize=False), ["a"], _encoder(calls))
+    assert calls[-1] == ["a"]
+
+
+def test_lru_eviction_and_reopen(tmp_path):
+    ns = cache_namespace("model")
+    cache = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 2)
+    cached_encode(cache, ns, ["a", "bb"], _encoder([]))
+    cache.get_many(ns, ["a"])  # touch "a" so "bb" is least recently used
+    cached_encode(cache, ns, ["ccc"], _encoder([]))
+    hits = [v is not None for v in cache.get_many(ns, ["a", "bb", "ccc"])]
+    assert hits == [True, False, True]
+
+    reopened = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 2)
+    vec = reopened.get_many(ns, ["ccc"])[0]
+    assert vec is not None and vec[0] == 3.0
+
+
+def test_recycled_slot_is_a_miss_not_a_wrong_vector(tmp_path):
+    ns = cache_namespace("model")
+    reader = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 1)
+    writer = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 1)
+    cached_encode(writer, ns, ["a"], _encoder([]))
+    assert reader.get_many(ns, ["a"])[0][0] == 1.0
+    # Simulate another process recycling the slot after the reader's SQLite lookup
+    key = next(iter(reader._conn.execute("SELECT key FROM entries").fetchall()))[0]
+    cached_encode(writer, ns, ["zz"], _encoder([]))
+    assert reader._read(key, 4, 0) is None
+
+
+def test_put_many_beyond_sqlite_variable_limit(tmp_path):
+    ns = cache_namespace("model")
+    cache = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 3000)
+    if hasattr(cache._conn, "setlimit"):
+        # Older SQLite builds cap bound variables at 999
+        cache._conn.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    texts = [f"t{i}" for i in range(2500)]
+    cached_encode(cache, ns, texts, _encoder([]))
+    calls = []
+    cached_encode(cache, ns, texts, _encoder(calls))
+    assert calls == []
+
+
+def test_vectors_cached_under_the_backend_that_produced_them(tmp_path):
+    from common.embedding_client import EmbeddingClient
+
+    cache = EmbeddingCache(str(tmp_path), max_bytes=4 * 4 * 8)
+    # No service URL: every call is served by the local onnx-int8 fallback
+    client = EmbeddingClient(None, "model", fallback=lambda texts, normalize: _encoder([])(texts),
+                             fallback_backend="onnx-int8")
+    ns = lambda backend: cache_namespace("model", backend=backend)  # noqa: E731
+    client.service_backend = "torch"
+    cached_encode(cache, ns("torch"), ["a"], client.encode, store_namespace=lambda: ns(client.last_backend))
+    assert client.last_backend == "onnx-int8"
+    assert cache.get_many(ns("torch"), ["a"]) == [None]
+    assert cache.get_many(ns("onnx-int8"), ["a"])[0] is not None
+
+
+def test_service_backend_is_read_before_the_first_lookup(tmp_path):
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    from common.embedding_client import EmbeddingClient
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps({"ok": True, "backend": "onnx"}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = EmbeddingClient(f"http://127.0.0.1:{server.server_port}", "model", fallback=lambda t, n: None)
+        assert client.service_backend is None
+        # The namespace for the lookup comes from the service, not a torch default
+        assert client.backend == "onnx"
+        assert cache_namespace("model", backend=client.backend).endswith("|onnx")
+    finally:
+        server.shutdown()
+
+    # An unreachable service is marked down, so the fallback's backend is used
+    down = EmbeddingClient("http://127.0.0.1:9", "model", fallback=lambda t, n: None, fallback_backend="onnx-int8",
+                           timeout=0.5)
+    assert down.backend == "onnx-int8" and down.service_backend is None
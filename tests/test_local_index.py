@@ -0,0 +1,73 @@
+"""Local vector index: exact search with filter masks, store readers and CURRENT swaps."""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT / "backend", ROOT / "backend" / "retrieval" / "hybrid_retriever"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from common.chunk_store import write_chunks  # noqa: E402
+from filters import SearchFilters  # noqa: E402
+from local_index import LocalVectorIndex, build_index, fingerprint  # noqa: E402
+
+WORDS = ("mold", "binders", "sleep", "vision")
+CHUNKS = [
+    {"chunk_id": "a", "source_id": "s1", "speaker": "A", "start_time": 0.0, "end_time": 5.0, "text": "mold exposure"},
+    {"chunk_id": "b", "source_id": "s1", "speaker": "B", "start_time": 5.0, "end_time": 9.0, "text": "mold and binders"},
+    {"chunk_id": "c", "source_id": "s2", "speaker": "A", "start_time": 0.0, "end_time": 4.0, "text": "sleep hygiene",
+     "topic_tags": ["sleep"]},
+]
+
+
+def _encode(texts):
+    return np.array([[float(w in t) for w in WORDS] for t in texts], dtype=np.float32)
+
+
+def _store(root, chunks):
+    # One source as Arrow, the rest as JSON: the index reads both layouts
+    write_chunks(root, "run1", "s1", [c for c in chunks if c["source_id"] == "s1"])
+    (root / "run1" / "s2.json").write_text(json.dumps([c for c in chunks if c["source_id"] != "s1"]))
+
+
+def test_exact_search_filters_and_swap(tmp_path):
+    chunks_root, out = tmp_path / "chunks", tmp_path / "local"
+    _store(chunks_root, CHUNKS)
+    stats = build_index(out, chunks_root, encode=_encode)
+    assert stats["points"] == 3 and stats["dim"] == len(WORDS) and stats["vectors_from"]["encoded"] == 3
+
+    ix = LocalVectorIndex(out, refresh_seconds=0)
+    assert ix.available()
+    hits = ix.search(_encode(["mold"])[0], top_k=2)
+    assert [h["chunk_id"] for h in hits] == ["a", "b"]
+    assert hits[0]["provenance"] == "local" and hits[0]["score"] == pytest.approx(1.0)
+    # The mask is applied before top-k, so a filtered search still fills k
+    assert [h["chunk_id"] for h in ix.search(_encode(["mold"])[0], top_k=1, filters=SearchFilters(speaker=["B"]))] == ["b"]
+    assert [h["chunk_id"] for h in ix.search(_encode(["sleep"])[0], filters=SearchFilters(topic_tags=["sleep"]))] == ["c"]
+    assert ix.search(_encode(["mold"])[0], filters=SearchFilters(source_id=["nope"])) == []
+
+    first, fp = ix.info()["version"], fingerprint(chunks_root)
+    (chunks_root / "run1" / "s2.json").write_text(json.dumps([]))
+    assert fingerprint(chunks_root) != fp
+    build_index(out, chunks_root, encode=_encode)
+    assert ix.info()["version"] != first
+    assert ix.info()["points"] == 2
+    assert {h["chunk_id"] for h in ix.search(_encode(["sleep"])[0])} == {"a", "b"}
+    # Only the two newest versions are kept on disk
+    build_index(out, chunks_root, encode=_encode)
+    assert len([p for p in out.iterdir() if p.is_dir()]) == 2
+
+
+def test_empty_store_is_unavailable(tmp_path):
+    (tmp_path / "chunks").mkdir()
+    build_index(tmp_path / "local", tmp_path / "chunks", encode=_encode)
+    ix = LocalVectorIndex(tmp_path / "local", refresh_seconds=0)
+    assert not ix.available()
+    assert ix.search(np.ones(len(WORDS), dtype=np.float32)) == []
@@ -0,0 +1,78 @@
+"""MinHash LSH near-dup index: reposts collapse onto one canonical chunk, incrementally."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.insert(0, str(BACKEND))
+
+from common.near_dup import NearDupIndex  # noqa: E402
+
+BASE = (
+    "mold illness often presents with fatigue brain fog joint pain and light sensitivity "
+    "and the first step is always removing the patient from the water damaged building "
+    "before starting binders such as cholestyramine or welchol"
+)
+
+
+def _chunk(cid, text, source="a"):
+    return {"chunk_id": cid, "text": text, "source_key": source, "start_time": 0.0, "end_time": 1.0}
+
+
+def test_reposts_become_aliases_across_runs(tmp_path):
+    db = str(tmp_path / "near.sqlite")
+    first = NearDupIndex(db).assign([
+        _chunk("c1", BASE),
+        _chunk("c2", "an unrelated chunk about visual contrast sensitivity testing at home"),
+    ])
+    assert [c["chunk_id"] for c in first.kept] == ["c1", "c2"]
+
+    # A reopened index sees the earlier file without rescanning it
+    index = NearDupIndex(db)
+    second = index.assign([_chunk("r1", BASE.replace("binders", "Binders!"), source="b"), _chunk("c1", BASE)])
+    assert [c["chunk_id"] for c in second.kept] == ["c1"]
+    assert second.duplicates == 1
+    assert [a["chunk_id"] for a in index.aliases_of("c1")] == ["r1"]
+
+    index.forget(["c1"])
+    assert index.aliases_of("c1") == []
+    assert [c["chunk_id"] for c in index.assign([_chunk("r1", BASE, source="b")]).kept] == ["r1"]
+
+
+def test_rechunked_canonical_hands_its_aliases_back(tmp_path):
+    index = NearDupIndex(str(tmp_path / "near.sqlite"))
+    index.assign([_chunk("c1", BASE, source="a")])
+    index.assign([_chunk("r1", BASE, source="b"), _chunk("r2", BASE + " again", source="c")])
+    assert {a["chunk_id"] for a in index.aliases_of("c1")} == {"r1", "r2"}
+
+    # Source "a" is re-chunked: c1 becomes stale and its aliases are returned so their
+    # sources can be indexed again
+    index.assign([_chunk("c1b", "a completely rewritten chunk about something else entirely", source="a")])
+    orphaned = index.forget(["c1"])
+    assert {(a["chunk_id"], a["source_key"]) for a in orphaned} == {("r1", "b"), ("r2", "c")}
+
+    # Re-chunking "b" and "c" promotes one former alias to canonical for the other
+    again = index.assign([_chunk("r1", BASE, source="b"), _chunk("r2", BASE + " again", source="c")])
+    assert [c["chunk_id"] for c in again.kept] == ["r1"]
+    assert [a["chunk_id"] for a in index.aliases_of("r1")] == ["r2"]
+
+
+def test_rechunked_alias_source_drops_its_old_aliases(tmp_path):
+    index = NearDupIndex(str(tmp_path / "near.sqlite"))
+    index.assign([_chunk("c1", BASE, source="a")])
+    index.assign([_chunk("r1", BASE, source="b")])
+    assert [a["chunk_id"] for a in index.aliases_of("c1")] == ["r1"]
+
+    # Re-running "b" unchanged keeps its alias and reports nothing dropped
+    same = index.assign([_chunk("r1", BASE, source="b")])
+    assert same.dropped == {} and [a["chunk_id"] for a in index.aliases_of("c1")] == ["r1"]
+
+    # "b" is re-chunked: the new chunk ID replaces the dead one under c1
+    again = index.assign([_chunk("r1b", BASE + " now", source="b")])
+    assert again.dropped == {"c1": ["r1"]}
+    assert [a["chunk_id"] for a in index.aliases_of("c1")] == ["r1b"]
@@ -0,0 +1,104 @@
+"""Retriever observability: the Server-Timing header on /search and the /metrics exposition."""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("whoosh")
+pytest.importorskip("httpx")
+
+ROOT = Path(__file__).resolve().parents[1]
+RETRIEVER = ROOT / "backend" / "retrieval" / "hybrid_retriever"
+
+CHUNKS = [
+    {"chunk_id": "a", "source_key": "talks/a", "speaker": "SPEAKER_00", "start_time": 0.0, "end_time": 5.0,
+     "text": "mold exposure and binders"},
+    {"chunk_id": "b", "source_key": "talks/b", "speaker": "SPEAKER_00", "start_time": 0.0, "end_time": 4.0,
+     "text": "sleep hygiene after mold remediation"},
+]
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    from fastapi.testclient import TestClient
+
+    tmp = tmp_path_factory.mktemp("retriever")
+    (tmp / "chunks" / "run1").mkdir(parents=True)
+    (tmp / "chunks" / "run1" / "talks__a.json").write_text(json.dumps(CHUNKS))
+    env = {
+        "CHUNKS_ROOT": str(tmp / "chunks"),
+        "BM25_INDEX_PATH": str(tmp / "bm25"),
+        "LOCAL_INDEX_PATH": str(tmp / "vectors"),
+        "EMBED_CACHE_DIR": "",
+        "QDRANT_URL": "http://127.0.0.1:9",
+        "SERVER_TIMING": "false",
+    }
+    saved_env = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    # The service imports a flat `config` and `main`; load them without shadowing other services'
+    saved = {name: sys.modules.pop(name, None) for name in ("config", "main")}
+    for path in (ROOT / "backend", RETRIEVER):
+        sys.path.insert(0, str(path))
+    try:
+        import lexical
+        import main
+
+        lexical.rebuild_lexical(full=True)
+        # No `with`: the startup hook would load the embedding model
+        yield TestClient(main.app)
+    finally:
+        for path in (ROOT / "backend", RETRIEVER):
+            sys.path.remove(str(path))
+        for name, mod in saved.items():
+            sys.modules.pop(name, None)
+            if mod is not None:
+                sys.modules[name] = mod
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _entries(header):
+    return [part.strip().split(";")[0] for part in header.split(",")]
+
+
+def test_server_timing_header(client):
+    r = client.get("/search", params={"q": "mold", "mode": "lexical"})
+    assert r.status_code == 200 and "server-timing" not in r.headers
+
+    r = client.get("/search", params={"q": "binders", "mode": "lexical", "debug": "true"})
+    header = r.headers["server-timing"]
+    names = _entries(header)
+    assert "lexical" in names and "fusion" in names and names[-1] == "total"
+    for part in header.split(","):
+        name, dur = part.strip().split(";")
+        assert dur.startswith("dur=") and float(dur[4:]) >= 0.0
+    assert r.json()["timings"]["stages"].keys() >= {"lexical", "fusion", "total"}
+
+    # A result-cache hit is marked as such
+    cached = client.get("/search", params={"q": "binders", "mode": "lexical", "debug": "true"})
+    assert cached.headers["server-timing"].startswith('cache;desc="hit"')
+
+
+def test_metrics_exposition(client):
+    client.get("/search", params={"q": "sleep", "mode": "lexical"})
+    client.post("/search/batch", json={"queries": ["mold", "zzzq"], "mode": "lexical"})
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    for line in (
+        'retriever_stage_latency_ms_count{endpoint="search",stage="lexical"}',
+        'retriever_stage_latency_ms_count{endpoint="batch",stage="fusion"}',
+        'retrieval_latency_ms_count{service="hybrid_retriever"}',
+        'retriever_searches_total{cache="miss",endpoint="batch",mode="lexical"}',
+        'retriever_results_returned_total{mode="lexical"}',
+        'retriever_empty_results_total{mode="lexical"}',
+        "retriever_query_cache_hits_total",
+        "retriever_result_cache_misses_total",
+    ):
+        assert line in body, line
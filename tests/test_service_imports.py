@@ -21,6 +21,7 @@ SERVICE_MODULES = [
     "backend.monitoring.main",
     "backend.security_guardrails.main",
     "backend.license_audit.main",
+    "backend.embedding_service.main",
 ]
 
 
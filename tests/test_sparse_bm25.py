@@ -0,0 +1,44 @@
+"""Sparse CSR BM25: AND-semantics ranking, filter masks and atomic version swaps."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pyarrow")
+
+RETRIEVER = Path(__file__).resolve().parents[1] / "backend" / "retrieval" / "hybrid_retriever"
+if str(RETRIEVER) not in sys.path:
+    sys.path.insert(0, str(RETRIEVER))
+
+from filters import SearchFilters  # noqa: E402
+from sparse_bm25 import SparseBM25Index, build_index  # noqa: E402
+
+CHUNKS = [
+    {"chunk_id": "a", "source_id": "s1", "start_time": 0.0, "end_time": 5.0, "text": "mold exposure and fatigue"},
+    {"chunk_id": "b", "source_id": "s1", "start_time": 5.0, "end_time": 9.0, "text": "mold mold mold toxins", "topic_tags": ["mold"]},
+    {"chunk_id": "c", "source_id": "s2", "start_time": 0.0, "end_time": 4.0, "text": "binders such as cholestyramine"},
+]
+
+
+def test_search_and_swap(tmp_path):
+    build_index(tmp_path, CHUNKS)
+    ix = SparseBM25Index(tmp_path, refresh_seconds=0)
+
+    hits = ix.search("Mold", top_k=5)
+    assert [h["chunk_id"] for h in hits] == ["b", "a"]
+    assert hits[0]["topic_tags"] == ["mold"] and hits[0]["text"] == "mold mold mold toxins"
+    # Every term must match, like the Whoosh parser's default AND grouping
+    assert [h["chunk_id"] for h in ix.search("mold fatigue")] == ["a"]
+    assert ix.search("mold unknownterm") == []
+    assert ix.search("the and of") == []
+    # Filters mask documents before top-k is taken
+    assert [h["chunk_id"] for h in ix.search("mold", filters=SearchFilters(topic_tags=["mold"]))] == ["b"]
+    assert [h["chunk_id"] for h in ix.search("mold", filters=SearchFilters(time_to=4.0))] == ["a"]
+
+    first = ix.generation()
+    build_index(tmp_path, CHUNKS[2:])
+    assert ix.generation() != first
+    assert ix.search("mold") == []
+    assert [h["chunk_id"] for h in ix.search("cholestyramine")] == ["c"]